@@ -0,0 +1,39 @@
+import streamlit as st
+
+
+def render():
+    # review the content
+    st.title("Our Initiative of Monitoring and Prediction of drug usage in Finland")
+
+    st.header("Who is it for?")
+    st.write("""
+    This dashboard is designed for key stakeholders responsible for addressing and mitigating drug usage in Finland.\n
+    It provides critical insights into drug-related deaths, offenses, price trends, regional usage patterns, and rehabilitation needs.
+    """)
+
+    st.header("Who benefits from the dashboard?")
+    st.write("""
+    The primary beneficiaries of this dashboard are:
+    - **Policymakers**: To make informed decisions and create effective policies to combat drug usage.
+    - **Healthcare Professionals**: To understand the trends and allocate resources efficiently.
+    - **Researchers**: To analyze data and identify patterns for further studies.
+    - **General Public**: To stay informed about the drug usage trends and their impact on society.
+    """)
+
+    st.header("Recommendations")
+    st.write("""
+    Based on the data presented in this dashboard, the following recommendations can be made:
+    - **Increase Awareness Programs**: Implement educational campaigns to raise awareness about the dangers of drug usage.
+    - **Enhance Support Services**: Provide better support and rehabilitation services for individuals struggling with drug addiction.
+    - **Strengthen Law Enforcement**: Increase efforts to curb the illegal drug trade and reduce drug-related crimes.
+    - **Policy Reforms**: Develop and implement policies that address the root causes of drug usage and provide long-term solutions.
+    """)
+
+    st.header("Data Sources")
+    st.write("""
+    [12d9 -- Drug-related deaths (B-classification) by underlying cause of death, by age and sex, 2006-2023](https://pxdata.stat.fi/PxWeb/pxweb/fi/StatFin/StatFin__ksyyt/statfin_ksyyt_pxt_12d9.px/)
+    \n
+    [13ex -- Reported crimes and their investigation by crime group, by crime type and year of reporting, 1980-2023 (translated from Finnish to English)](https://pxdata.stat.fi/PxWeb/pxweb/fi/StatFin/StatFin__rpk/statfin_rpk_pxt_13ex.px/)
+    \n
+    [Rehabilitation and other data are available at Sotkanet.fi](https://sotkanet.fi/sotkanet/en/haku?g=340#)
+    """)
@@ -0,0 +1,90 @@
+import streamlit as st
+import streamlit.components.v1 as components
+
+from utils.animated_map import build_animated_map
+from utils.charts import deaths_by_age_figure, drug_price_figure, kpi_trend_figure
+from utils.debug_panel import traced_fragment
+from utils.data_loader import load_dataset
+from utils.figure_cache import cached_figure
+from utils.kpi_cube import cube_version, kpi_cube
+from utils.spans import span
+
+
+def render():
+    # Title of the dashboard
+    st.title("Monitoring Drug Usage in Finland")
+
+    # Creating a grid with three columns for the top section
+    col1, col2 = st.columns([1, 1])
+
+    # Chart 1: Number of deaths
+    with col1:
+        st.subheader("Number of deaths by Age Group")
+        fig1 = cached_figure("deaths_by_age", (), ["deaths"],
+                             lambda: deaths_by_age_figure(load_dataset("deaths")))
+        st.plotly_chart(fig1, use_container_width=True)
+
+    with col2:
+        drug_price_panel()
+
+
+    with st.container():
+        st.subheader("Trends by regions")
+
+        # # Mode selection
+        # mode = st.radio("Select Mode", options=["View in dynamic mode", "Examine in static mode"])
+
+        # if mode == "View in dynamic mode":
+        cont_col1, cont_col2 = st.columns(2)
+
+        with cont_col1:
+            # Animated choropleth: geometry and yearly values are sent once, the
+            # year slider and KPI switch run in the browser. It sits outside the
+            # fragments, so changing a widget never sends it again.
+            html = build_animated_map()
+            with span("components.html", bytes=len(html)):
+                components.html(html, height=660)
+
+        with cont_col2:
+            trends_panel()
+
+        # elif mode == "Examine in static mode":
+        #     df = pd.read_csv("./data/clean/Reported_drug_usage_by_regions.csv")
+
+        #     # Select year
+        #     year = st.selectbox("Select Year", options=df["year"].unique(), index=43)
+
+        #     # Create and display the map
+        #     m = create_folium_map(year)
+        #     folium_static(m, width=800, height=900)
+
+
+# Panels with their own widgets are fragments: changing one of their widgets reruns
+# only that panel, and each loads just the data it draws.
+
+@traced_fragment("Monitoring")
+def drug_price_panel():
+    st.subheader("Drug Price Trends")
+    plot_option = st.selectbox("Select plot option:", ["All types of drugs", "Commonly used drugs"], index=1)
+
+    fig2 = cached_figure("drug_prices", (plot_option,), ["drug_prices"],
+                         lambda: drug_price_figure(load_dataset("drug_prices"), plot_option))
+    st.plotly_chart(fig2, use_container_width=True)
+
+
+@traced_fragment("Monitoring")
+def trends_panel():
+    ## line plots
+    kpi_options = ["arrests", "offences", "rehab", "clinic"]
+    selected_kpis = st.multiselect("Select KPI(s):", options=kpi_options, default=["arrests"])
+
+    cube = kpi_cube()
+
+    # Create a selectbox for region filtering.
+    unique_regions = sorted(cube.regions_with("offences"))
+    region_selected = st.selectbox("Select Region:", unique_regions)
+
+    fig = cached_figure("kpi_trends", (region_selected, tuple(selected_kpis), cube_version()), [],
+                        lambda: kpi_trend_figure(cube, region_selected, selected_kpis))
+
+    st.plotly_chart(fig, use_container_width=True)
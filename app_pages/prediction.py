@@ -0,0 +1,183 @@
+import streamlit as st
+import streamlit.components.v1 as components
+
+from utils.map_risk import highrisk_map_html
+from utils.backtest import accuracy_table
+from utils.charts import kpi_forecast_figure, deaths_forecast_figure, deaths_pie_figure, scenario_figure
+from utils.debug_panel import traced_fragment
+from utils.data_loader import load_dataset
+from utils.figure_cache import cached_figure
+from utils.forecasting import stored_forecast
+from utils.kpi_cube import kpi_cube
+from utils.model_registry import forecast_version
+from utils.reconciliation import national_forecast
+from utils.ranking import MEASURE_LABELS, MEASURES, change_ranking
+from utils.scenarios import COVARIATES, scenario_model, simulate
+from utils.spans import span
+
+
+def render():
+    # Streamlit UI
+    st.title("Future Trends in Illegal Drug-Related KPIs in Finland")
+
+    # Create layout with three columns: Left (2), Spacer (0.05), Right (2)
+    col1, col2 = st.columns([2, 2])
+
+    ### ---- LEFT SIDE: Offences & Arrests ---- ###
+    with col1:
+        st.header("Offences and Arrests Forecast")
+        kpi_forecast_panel()
+
+    ### ---- RIGHT SIDE: Deaths Forecast ---- ###
+    with col2:
+        st.header("Drug-Related Deaths Forecast")
+        deaths_forecast_panel()
+
+        # --- Pie Chart for Deaths Forecast in 2025 by Age Group ---
+        # Independent of the age group, so it stays outside that panel's fragment
+        st.subheader("Deaths Forecast Distribution by Age Group (2025)")
+
+        fig_pie = cached_figure("deaths_pie", (2025,), ["deaths_forecast"],
+                                lambda: deaths_pie_figure(load_dataset("deaths_forecast"), 2025))
+
+        st.plotly_chart(fig_pie, use_container_width=True)
+
+    with st.container():
+        high_risk_panel()
+
+    st.header("What-if Scenarios")
+    scenario_panel()
+
+
+# Panels with their own widgets are fragments: changing one of their widgets reruns
+# only that panel, and each loads just the data it draws.
+
+@traced_fragment("Prediction")
+def kpi_forecast_panel():
+    cube = kpi_cube()
+
+    kpi_selected = st.selectbox("Select Forecast KPI:", ["Offences", "Arrests"])
+
+    # Ensure unique region names and keep "Uusimaa" only once
+    unique_regions = sorted(set(cube.regions_with("offences", "prediction")) - {"Uusimaa"})
+    region_selected = st.selectbox("Select a Region:", ["Uusimaa"] + unique_regions)
+
+    kpi_column = "offences" if kpi_selected == "Offences" else "arrests"
+
+    # The region's registry entry is loaded the first time the region is asked for; it
+    # holds the reconciled forecast of the last forecasting run, the same values as the
+    # forecast CSV. Regions without one show the CSV's values from the cube
+    series_key = (kpi_column, region_selected)
+    forecast = stored_forecast(series_key)
+
+    # Create line chart
+    fig1 = cached_figure("kpi_forecast", (kpi_selected, region_selected, forecast_version(series_key)),
+                         ["merged_tsa", f"{kpi_column}_forecast"],
+                         lambda: kpi_forecast_figure(cube, kpi_selected, region_selected, forecast))
+
+    st.plotly_chart(fig1, use_container_width=True)
+
+    table_col, accuracy_col = st.columns(2)
+
+    # Data table
+    with table_col:
+        st.subheader("Forecast Data Table")
+        displayed_df = cube.table(region_selected, kpi_column, forecast)
+        st.dataframe(displayed_df.style.format({"offences": "{:.2f}", "offences_lower":"{:.2f}", "offences_upper":"{:.2f}",
+                                                "arrests": "{:.2f}", "arrests_lower":"{:.2f}", "arrests_upper":"{:.2f}"}), height=200)
+
+    # How past forecasts for this series did, from rolling-origin backtests
+    with accuracy_col:
+        st.subheader("Forecast Accuracy")
+        accuracy_df = accuracy_table(kpi_column, region_selected)
+        st.dataframe(accuracy_df.style.format({"MAE": "{:.1f}", "MAPE (%)": "{:.1f}", "Coverage (%)": "{:.0f}"}),
+                     height=200, hide_index=True)
+        st.caption("Backtests of the candidate forecasting engines, not necessarily of the forecast shown.")
+
+    # The regional forecasts are reconciled to add up to this one, with the cases not assigned to a region
+    st.subheader(f"National {kpi_selected} Forecast (KOKO MAA)")
+    st.dataframe(national_forecast(kpi_column).style.format({kpi_column: "{:.0f}", f"{kpi_column}_lower": "{:.0f}",
+                                                             f"{kpi_column}_upper": "{:.0f}"}),
+                 hide_index=True)
+
+
+@traced_fragment("Prediction")
+def deaths_forecast_panel():
+    deaths_forecast_df = load_dataset("deaths_forecast")
+
+    age_groups = deaths_forecast_df["age_group"].unique()
+    age_selected = st.selectbox("Select Age Group:", age_groups)
+
+    # Create line chart
+    fig2 = cached_figure("deaths_forecast", (age_selected,), ["deaths_forecast", "deaths_history"],
+                         lambda: deaths_forecast_figure(deaths_forecast_df, load_dataset("deaths_history"),
+                                                        age_selected))
+
+    st.plotly_chart(fig2, use_container_width=True)
+
+
+@traced_fragment("Prediction")
+def high_risk_panel():
+    cube = kpi_cube()
+    cont_col1, cont_col2 = st.columns(2)
+
+    with cont_col1:
+        # Regions rising the most between a base year and a forecast year, looked
+        # up in the precomputed ranking table
+        ranking = change_ranking()
+        base_years = cube.years_with("offences")
+        target_years = cube.years_with("offences", "prediction")
+
+        rank_col1, rank_col2, rank_col3 = st.columns(3)
+        base_year = rank_col1.selectbox("Compare from:", base_years, index=len(base_years) - 1)
+        target_year = rank_col2.selectbox("To forecast year:", target_years, index=min(1, len(target_years) - 1))
+        measure = rank_col3.selectbox("Change:", MEASURES, format_func=MEASURE_LABELS.get)
+
+        high_offences_regions = ranking.top_rising('offences', base_year, target_year, measure=measure)
+        high_arrests_regions = ranking.top_rising('arrests', base_year, target_year, measure=measure)
+
+        # Display high increase regions
+        st.subheader(f"Regions with High Increase in Offences ({target_year} vs {base_year})")
+        st.write(high_offences_regions.style.format({"offences": "{:.2f}"}))
+
+        st.subheader(f"Regions with High Increase in Arrests ({target_year} vs {base_year})")
+        st.write(high_arrests_regions.style.format({"arrests": "{:.2f}"}))
+
+    with cont_col2:
+        st.subheader(f"High risk regions ({target_year})")
+
+        # The folium page is rendered once per selection and reused by every session
+        html = highrisk_map_html(base_year, target_year, measure)
+        with span("components.html", map="highrisk", bytes=len(html)):
+            components.html(html, width=800, height=910)
+
+
+# Yearly change sliders of the scenario covariates: (label, min, max, step)
+SCENARIO_SLIDERS = {
+    "unemployment_rate": ("Unemployment rate (points per year)", -2.0, 2.0, 0.1),
+    "forign_count": ("Foreign residents (% per year)", -10.0, 20.0, 1.0),
+    "population": ("Population (% per year)", -5.0, 5.0, 0.5),
+}
+
+
+@traced_fragment("Prediction")
+def scenario_panel():
+    model = scenario_model()
+    region_selected = st.selectbox("Scenario region:", model.regions, key="scenario_region")
+
+    # Each region keeps its own settings in the session (a widget's own state is
+    # dropped while another region is shown), and the simulation covers every
+    # region's settings at once
+    changes = st.session_state.setdefault("scenario_changes", {})
+    region_changes = changes.setdefault(region_selected, {})
+    slider_cols = st.columns(len(COVARIATES))
+    for slider_col, covariate in zip(slider_cols, COVARIATES):
+        label, low, high, step = SCENARIO_SLIDERS[covariate]
+        region_changes[covariate] = slider_col.slider(label, low, high, region_changes.get(covariate, 0.0), step,
+                                                      key=f"scenario_{covariate}_{region_selected}")
+
+    st.caption(f"Covariates change yearly from their {model.last_year} values; "
+               "shaded bands hold 50% and 90% of the simulated paths.")
+
+    bands = simulate(changes)
+    st.plotly_chart(scenario_figure(kpi_cube(), bands, region_selected), use_container_width=True)
@@ -0,0 +1,38 @@
+import os
+
+from benchmarks.harness import benchmark, parametrize
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+# The AppTest prepared by setup for the timed run
+_state = {}
+
+
+def _fresh_app():
+    from streamlit.testing.v1 import AppTest
+
+    _state["app"] = AppTest.from_file(APP_PATH, default_timeout=120)
+
+
+def _app_on_default_page():
+    # The sidebar radio only exists after a first run, so that run is untimed
+    _fresh_app()
+    _state["app"].run()
+
+
+def _check(at, page):
+    if at.exception:
+        raise RuntimeError(f"{page} page raised: {at.exception[0].value}")
+
+
+# Full script runs through Streamlit's AppTest harness, one per page
+@benchmark("app", name="page_run[Monitoring]", setup=_fresh_app, repeat=3)
+def first_run():
+    _state["app"].run()
+    _check(_state["app"], "Monitoring")
+
+
+@parametrize("app", "page_run", ["Prediction", "Impact"], setup=_app_on_default_page, repeat=3)
+def switch_to(page):
+    _state["app"].sidebar.radio[0].set_value(page).run()
+    _check(_state["app"], page)
@@ -0,0 +1,66 @@
+import functools
+
+import numpy as np
+
+from benchmarks.harness import benchmark, parametrize
+from utils import data_loader
+from utils.data_loader import DATASETS, load_dataset
+from utils.kpi_cube import REGION_KPIS, build_kpi_cube, kpi_cube
+from utils.ranking import build_change_ranking, change_ranking
+from utils.reconciliation import METHODS, aggregate, base_forecasts, build_hierarchy, reconcile, reconcile_kpi
+
+
+@parametrize("data", "cold_load", DATASETS, setup=data_loader.clear_cache)
+def cold_load(name):
+    load_dataset(name)
+
+
+@parametrize("data", "warm_load", DATASETS)
+def warm_load(name):
+    load_dataset(name)
+
+
+@benchmark("data")
+def kpi_cube_build():
+    build_kpi_cube(load_dataset("merged_tsa"), load_dataset("drug_usage_by_regions"),
+                   {kpi: load_dataset(name) for kpi, name in REGION_KPIS.items()})
+
+
+@parametrize("data", "kpi_cube_series", ["Uusimaa", "Lappi"])
+def kpi_cube_series(region):
+    cube = kpi_cube()
+    for kpi in cube.kpis:
+        cube.series(region, kpi)
+
+
+@benchmark("data")
+def change_ranking_build():
+    build_change_ranking(kpi_cube())
+
+
+@parametrize("data", "top_rising", ["abs", "pct", "per_capita"])
+def top_rising(measure):
+    ranking = change_ranking()
+    for kpi in ("offences", "arrests"):
+        ranking.top_rising(kpi, 2023, 2025, n=5, measure=measure)
+
+
+@parametrize("data", "reconcile_regions", METHODS)
+def reconcile_regions(method):
+    reconcile_kpi("offences", method)
+
+
+@functools.lru_cache(maxsize=None)
+def _municipality_forecasts():
+    # A made-up third level about the size of Finland's municipalities: 16 per region
+    rng = np.random.default_rng(0)
+    hierarchy = build_hierarchy(("KOKO MAA", f"region {r}", f"municipality {r}-{m}")
+                                for r in range(19) for m in range(16))
+    values = aggregate(hierarchy, rng.poisson(50.0, (len(hierarchy.leaves), 15)).astype(float))
+    return hierarchy, base_forecasts(values)
+
+
+@parametrize("data", "reconcile_municipalities", METHODS)
+def reconcile_municipalities(method):
+    hierarchy, forecasts = _municipality_forecasts()
+    reconcile(hierarchy, *forecasts, method=method)
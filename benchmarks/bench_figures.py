@@ -0,0 +1,67 @@
+import numpy as np
+
+from benchmarks.harness import benchmark, parametrize
+from utils import charts, figure_cache
+from utils.data_loader import load_dataset
+from utils.figure_cache import cached_figure
+from utils.kpi_cube import kpi_cube
+from utils.traces import line_figure, line_trace
+
+
+@benchmark("figures")
+def deaths_by_age():
+    charts.deaths_by_age_figure(load_dataset("deaths"))
+
+
+@parametrize("figures", "drug_prices", ["All types of drugs", "Commonly used drugs"])
+def drug_prices(plot_option):
+    charts.drug_price_figure(load_dataset("drug_prices"), plot_option)
+
+
+@benchmark("figures")
+def kpi_trends_all_kpis():
+    charts.kpi_trend_figure(kpi_cube(), "Uusimaa", ["arrests", "offences", "rehab", "clinic"])
+
+
+@parametrize("figures", "kpi_forecast", ["Offences", "Arrests"])
+def kpi_forecast(kpi_selected):
+    charts.kpi_forecast_figure(kpi_cube(), kpi_selected, "Uusimaa")
+
+
+@benchmark("figures")
+def deaths_forecast():
+    forecast_df = load_dataset("deaths_forecast")
+    charts.deaths_forecast_figure(forecast_df, load_dataset("deaths_history"), forecast_df["age_group"].iloc[0])
+
+
+@benchmark("figures")
+def deaths_pie():
+    charts.deaths_pie_figure(load_dataset("deaths_forecast"), 2025)
+
+
+def _cached_deaths_by_age():
+    return cached_figure("deaths_by_age", (), ["deaths"], lambda: charts.deaths_by_age_figure(load_dataset("deaths")))
+
+
+@benchmark("figures", setup=figure_cache.clear_cache)
+def cached_deaths_by_age_miss():
+    _cached_deaths_by_age()
+
+
+@benchmark("figures")
+def cached_deaths_by_age_hit():
+    _cached_deaths_by_age()
+
+
+# Weekly-resolution stand-ins for the longer series the charts are meant to scale to
+_rng = np.random.default_rng(0)
+LONG_SERIES = {n: (np.datetime64("1990-01-01") + np.arange(n) * np.timedelta64(7, "D"),
+                    _rng.normal(size=(4, n)).cumsum(axis=1))
+               for n in (10_000, 100_000, 500_000)}
+
+
+@parametrize("figures", "long_series", list(LONG_SERIES))
+def long_series(n):
+    x, ys = LONG_SERIES[n]
+    # Four traces, as a full KPI multiselect draws, serialized as st.plotly_chart does
+    line_figure(line_trace(x, y, mode="lines+markers", name=f"series {i}") for i, y in enumerate(ys)).to_json()
@@ -0,0 +1,17 @@
+from benchmarks.harness import benchmark, parametrize
+from utils.data_loader import load_dataset
+from utils.map_risk import create_highrisk_map
+from utils.map_utils import create_folium_map
+
+MAP_YEARS = [int(year) for year in load_dataset("drug_usage_by_regions")["year"]]
+
+
+@parametrize("maps", "create_folium_map", MAP_YEARS)
+def folium_map(year):
+    # Rendering to HTML is part of what folium_static does on every rerun
+    create_folium_map(year).get_root().render()
+
+
+@benchmark("maps")
+def highrisk_map():
+    create_highrisk_map().get_root().render()
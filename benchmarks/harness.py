@@ -0,0 +1,69 @@
+import os
+import platform
+import statistics
+import subprocess
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+Benchmark = namedtuple("Benchmark", ["name", "group", "func", "setup", "repeat"])
+
+# Every benchmark registered by the bench_* modules, in definition order
+REGISTRY = []
+
+
+def benchmark(group, name=None, setup=None, repeat=None):
+    """Registers func as a benchmark; setup() runs untimed before every call."""
+    def decorator(func):
+        REGISTRY.append(Benchmark(name or func.__name__, group, func, setup, repeat))
+        return func
+    return decorator
+
+
+def parametrize(group, name, params, setup=None, repeat=None):
+    """Registers one benchmark per parameter, named name[param]."""
+    def decorator(func):
+        for param in params:
+            REGISTRY.append(Benchmark(f"{name}[{param}]", group,
+                                      lambda param=param: func(param), setup, repeat))
+        return func
+    return decorator
+
+
+def time_benchmark(bench, repeat):
+    """Runs a benchmark `repeat` times and returns its timing summary in seconds."""
+    timings = []
+    for _ in range(bench.repeat or repeat):
+        if bench.setup is not None:
+            bench.setup()
+        start = time.perf_counter()
+        bench.func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "group": bench.group,
+        "repeat": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Describes where the results were measured, stored alongside them."""
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
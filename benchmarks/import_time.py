@@ -0,0 +1,85 @@
+"""Summarises `python -X importtime` for each dashboard page.
+
+Every scenario runs in a fresh interpreter that has already imported streamlit,
+so the numbers show what a page adds on top of the framework a worker always
+loads. The "eager" scenario is the set of imports streamlit_app.py used to do
+at module top before pages were split out.
+
+Usage: python -m benchmarks.import_time [--runs 3] [--top 8] [--json PATH]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "eager": ["matplotlib.pyplot", "seaborn", "pandas", "numpy", "geopandas", "folium", "branca",
+              "streamlit_folium", "plotly.graph_objects", "utils.map_utils", "utils.map_risk"],
+    "monitoring": ["app_pages.monitoring"],
+    "prediction": ["app_pages.prediction"],
+    "impact": ["app_pages.impact"],
+}
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(modules):
+    """Returns (total, {package: cumulative}) in microseconds for importing modules after streamlit."""
+    code = "import streamlit\nimport sys\nsys.stderr.write('--- start\\n')\n" + "".join(
+        f"import {module}\n" for module in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT_DIR,
+                          capture_output=True, text=True, check=True)
+    log = proc.stderr.split("--- start\n", 1)[1]
+
+    total, packages = 0, {}
+    for match in _LINE.finditer(log):
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        # The outermost imports add up to the scenario's total
+        if indent == 1:
+            total += cumulative
+        # A top-level package's own line includes everything it pulled in
+        if "." not in name:
+            packages[name] = cumulative
+    return total, packages
+
+
+def summarise(runs, top):
+    report = {}
+    for scenario, modules in SCENARIOS.items():
+        samples = [measure(modules) for _ in range(runs)]
+        names = set().union(*(packages for _, packages in samples))
+        per_package = {name: statistics.median(packages.get(name, 0) for _, packages in samples) / 1000
+                       for name in names}
+        report[scenario] = {
+            "total_ms": statistics.median(total for total, _ in samples) / 1000,
+            "packages_ms": dict(sorted(per_package.items(), key=lambda item: -item[1])[:top]),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time report per dashboard page.")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per scenario")
+    parser.add_argument("--top", type=int, default=8, help="heaviest packages listed per scenario")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = summarise(args.runs, args.top)
+    for scenario, result in report.items():
+        print(f"{scenario:12} {result['total_ms']:8.1f} ms")
+        for name, ms in result["packages_ms"].items():
+            print(f"    {name:28} {ms:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Load test: many simulated browser sessions against locally launched dashboard workers.
+
+Launches `--workers` Streamlit servers for streamlit_app.py (or targets running
+ones with --url), opens `--sessions` websocket sessions spread over them, and
+has each session speak the browser's protocol: a first run, then interactions
+picked at random from the widgets its last run drew (selectbox and multiselect
+changes, page switches), with a think time in between. Widget changes inside a
+fragment rerun only that fragment, as the browser does.
+
+Reported: p50/p95/p99 rerun latency per interaction kind, reruns per second,
+script errors, and the resident memory of every worker (at start, peak, end).
+
+Usage: python -m benchmarks.load_test [--sessions 50] [--workers 1] [--duration 60]
+                                      [--page Prediction] [--think 1.0] [--output PATH]
+       python -m benchmarks.load_test --url ws://host:8501 [--url ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.asyncio.client import connect
+
+from benchmarks.harness import environment
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+# Widgets a simulated user changes, and the WidgetState field each one reports its value in
+WIDGET_FIELDS = {"selectbox": "string_value", "radio": "string_value", "multiselect": "string_array_value"}
+
+# Label of the sidebar page switch
+PAGE_WIDGET = "Go to"
+
+# Share of interactions that switch page instead of changing a widget on the current one
+PAGE_SWITCH_RATE = 0.15
+
+PERCENTILES = (50, 95, 99)
+
+_FINISHED = ForwardMsg.ScriptFinishedStatus
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch_worker(port):
+    """Starts a headless Streamlit server for the dashboard on port and returns its process."""
+    command = [sys.executable, "-m", "streamlit", "run", APP_PATH,
+               "--server.headless", "true", "--server.port", str(port),
+               # The simulated clients carry no XSRF cookie and send no Origin
+               "--server.enableXsrfProtection", "false", "--server.enableCORS", "false",
+               "--browser.gatherUsageStats", "false"]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_healthy(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.25)
+    raise TimeoutError(f"Streamlit worker on port {port} did not become healthy in {timeout}s")
+
+
+def rss_bytes(pid):
+    """Resident set size of a process, from /proc; None where that is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class Session:
+    """One simulated browser tab: its websocket, widget values and the widgets on screen."""
+
+    def __init__(self, url, rng):
+        self.url = url.rstrip("/") + "/_stcore/stream"
+        self.rng = rng
+        self.ws = None
+        # Widget id -> WidgetState sent with every rerun, as the browser does
+        self.states = {}
+        # Widgets drawn by the last run: label -> (id, kind, options, fragment id)
+        self.widgets = {}
+        self.page = None
+
+    async def open(self):
+        self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=30)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, fragment_id=""):
+        """Sends a rerun with the current widget states; returns (seconds, script errors)."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+
+        errors = 0
+        if not fragment_id:
+            self.widgets = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_kind = element.WhichOneof("type")
+                if element_kind == "exception":
+                    errors += 1
+                elif element_kind in WIDGET_FIELDS:
+                    widget = getattr(element, element_kind)
+                    self.widgets[widget.label] = (widget.id, element_kind, list(widget.options),
+                                                  forward.delta.fragment_id)
+            elif kind == "script_finished":
+                if forward.script_finished == _FINISHED.Value("FINISHED_WITH_COMPILE_ERROR"):
+                    errors += 1
+                if forward.script_finished != _FINISHED.Value("FINISHED_EARLY_FOR_RERUN"):
+                    return time.perf_counter() - start, errors
+
+    def _set(self, widget_id, kind, value):
+        state = self.states.get(widget_id)
+        if state is None:
+            state = self.states[widget_id] = WidgetState(id=widget_id)
+        field = WIDGET_FIELDS[kind]
+        if field == "string_array_value":
+            del state.string_array_value.data[:]
+            state.string_array_value.data.extend(value)
+        else:
+            setattr(state, field, value)
+
+    def switch_page(self, page):
+        widget_id, kind, _, _ = self.widgets[PAGE_WIDGET]
+        self._set(widget_id, kind, page)
+        self.page = page
+
+    def pick_interaction(self):
+        """Changes one widget at random; returns (interaction name, fragment id to rerun)."""
+        others = [label for label in self.widgets if label != PAGE_WIDGET]
+        if PAGE_WIDGET in self.widgets and (not others or self.rng.random() < PAGE_SWITCH_RATE):
+            pages = [page for page in self.widgets[PAGE_WIDGET][2] if page != self.page]
+            self.switch_page(self.rng.choice(pages))
+            return f"page:{self.page}", ""
+
+        label = self.rng.choice(others)
+        widget_id, kind, options, fragment_id = self.widgets[label]
+        if kind == "multiselect":
+            value = self.rng.sample(options, self.rng.randint(1, len(options)))
+        else:
+            value = self.rng.choice(options)
+        self._set(widget_id, kind, value)
+        return f"{self.page}:{label.rstrip(':')}", fragment_id
+
+
+async def run_session(url, seed, start_page, deadline, think, results):
+    rng = random.Random(seed)
+    session = Session(url, rng)
+    try:
+        await session.open()
+        seconds, errors = await session.rerun()
+        session.page = session.widgets.get(PAGE_WIDGET, (None, None, [None]))[2][0]
+        results["first_run"].append(seconds)
+        results["errors"] += errors
+        if start_page and start_page != session.page:
+            session.switch_page(start_page)
+            seconds, errors = await session.rerun()
+            results[f"page:{start_page}"].append(seconds)
+            results["errors"] += errors
+
+        while time.monotonic() < deadline:
+            # Exponential think time, as independent users would produce
+            await asyncio.sleep(rng.expovariate(1 / think) if think > 0 else 0)
+            if time.monotonic() >= deadline:
+                break
+            name, fragment_id = session.pick_interaction()
+            seconds, errors = await session.rerun(fragment_id)
+            results[name].append(seconds)
+            results["errors"] += errors
+    except Exception as err:
+        results["failed_sessions"] += 1
+        results["failures"].append(f"{type(err).__name__}: {err}")
+    finally:
+        await session.close()
+
+
+async def sample_rss(pids, samples, stop):
+    while not stop.is_set():
+        for pid in pids:
+            value = rss_bytes(pid)
+            if value is not None:
+                samples[pid].append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def load_test(urls, pids, sessions, duration, start_page, think, ramp_up, seed):
+    results = defaultdict(list, errors=0, failed_sessions=0)
+    samples = {pid: [] for pid in pids}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pids, samples, stop))
+
+    start = time.monotonic()
+    deadline = start + duration
+    tasks = []
+    for i in range(sessions):
+        # Sessions arrive spread over the ramp-up, like users opening a shared link
+        await asyncio.sleep(ramp_up / sessions if ramp_up else 0)
+        tasks.append(asyncio.create_task(
+            run_session(urls[i % len(urls)], seed + i, start_page, deadline, think, results)))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - start
+    stop.set()
+    await sampler
+    return results, samples, elapsed
+
+
+def summarize(results, samples, elapsed, pids):
+    latencies = {name: values for name, values in results.items() if isinstance(values, list) and name != "failures"}
+    every = [value for values in latencies.values() for value in values]
+
+    def stats(values):
+        values = np.asarray(values) * 1000
+        summary = {"count": len(values), "mean_ms": float(values.mean())}
+        summary.update({f"p{p}_ms": float(np.percentile(values, p)) for p in PERCENTILES})
+        return summary
+
+    return {
+        "environment": environment(),
+        "elapsed_s": elapsed,
+        "reruns": len(every),
+        "reruns_per_s": len(every) / elapsed if elapsed else 0.0,
+        "errors": results["errors"],
+        "failed_sessions": results["failed_sessions"],
+        "failures": sorted(set(results["failures"]))[:10],
+        "latency": {"all": stats(every) if every else None,
+                    **{name: stats(values) for name, values in sorted(latencies.items()) if values}},
+        "workers": [{"pid": pid,
+                     "rss_start_mb": samples[pid][0] / 2 ** 20 if samples[pid] else None,
+                     "rss_peak_mb": max(samples[pid]) / 2 ** 20 if samples[pid] else None,
+                     "rss_end_mb": samples[pid][-1] / 2 ** 20 if samples[pid] else None} for pid in pids],
+    }
+
+
+def print_report(report):
+    print(f"{report['reruns']} reruns in {report['elapsed_s']:.1f}s: {report['reruns_per_s']:.1f} reruns/s, "
+          f"{report['errors']} script errors, {report['failed_sessions']} failed sessions")
+    for failure in report["failures"]:
+        print(f"  {failure}")
+    print(f"{'interaction':45} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in report["latency"].items():
+        if summary:
+            print(f"{name:45} {summary['count']:6d} {summary['p50_ms']:9.1f} "
+                  f"{summary['p95_ms']:9.1f} {summary['p99_ms']:9.1f}")
+    for worker in report["workers"]:
+        if worker["rss_peak_mb"] is not None:
+            print(f"worker {worker['pid']}: RSS {worker['rss_start_mb']:.0f} MB at start, "
+                  f"{worker['rss_peak_mb']:.0f} MB peak, {worker['rss_end_mb']:.0f} MB at end")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive simulated dashboard sessions and report rerun latency.")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent simulated sessions")
+    parser.add_argument("--workers", type=int, default=1, help="Streamlit servers to launch and spread sessions over")
+    parser.add_argument("--url", action="append", help="target a running server instead (repeatable)")
+    parser.add_argument("--pid", type=int, action="append", default=[], help="process id of a --url server, for RSS")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of interactions after ramp-up starts")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which sessions connect")
+    parser.add_argument("--page", default=None, help="page every session opens first, e.g. Prediction")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a session's interactions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    processes = []
+    if args.url:
+        urls, pids = [url.replace("http", "ws", 1) if url.startswith("http") else url for url in args.url], args.pid
+    else:
+        ports = [_free_port() for _ in range(args.workers)]
+        processes = [launch_worker(port) for port in ports]
+        urls, pids = [f"ws://127.0.0.1:{port}" for port in ports], [process.pid for process in processes]
+    try:
+        for url in urls:
+            if not args.url:
+                wait_until_healthy(int(url.rsplit(":", 1)[1]))
+        results, samples, elapsed = asyncio.run(load_test(
+            urls, pids, args.sessions, args.duration, args.page, args.think, args.ramp_up, args.seed))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    report = summarize(results, samples, elapsed, pids)
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Runs the benchmark suite and stores the timings as JSON.
+
+Usage:
+    python -m benchmarks.run [--filter SUBSTRING] [--group GROUP] [--repeat N] [--output PATH]
+    python -m benchmarks.run --compare BASELINE.json CURRENT.json [--threshold 1.2]
+
+Results default to benchmarks/results/<commit>.json so runs on different commits
+can be compared side by side.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+
+from benchmarks.harness import REGISTRY, environment, time_benchmark
+
+MODULES = ["benchmarks.bench_data", "benchmarks.bench_figures", "benchmarks.bench_maps", "benchmarks.bench_app"]
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def run(name_filter=None, groups=None, repeat=5):
+    for module in MODULES:
+        importlib.import_module(module)
+
+    results = {}
+    for bench in REGISTRY:
+        if groups and bench.group not in groups:
+            continue
+        if name_filter and name_filter not in bench.name:
+            continue
+        results[bench.name] = time_benchmark(bench, repeat)
+        print(f"{bench.group:8} {bench.name:45} median {results[bench.name]['median'] * 1000:9.2f} ms")
+    return {"environment": environment(), "results": results}
+
+
+def compare(baseline_path, current_path, threshold):
+    """Prints median ratios between two result files; returns the regressed names."""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+    with open(current_path, encoding="utf-8") as file:
+        current = json.load(file)["results"]
+
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        ratio = current[name]["median"] / baseline[name]["median"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:45} {baseline[name]['median'] * 1000:9.2f} -> {current[name]['median'] * 1000:9.2f} ms"
+              f"  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dashboard performance benchmarks.")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--group", action="append", choices=["data", "figures", "maps", "app"],
+                        help="only run this group (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="median slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    report = run(args.filter, args.group, args.repeat)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['environment']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+        file.write("\n")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
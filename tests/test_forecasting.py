@@ -0,0 +1,49 @@
+"""Registry entries written by `python -m utils.forecasting`, read back the way the app reads them."""
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(cwd, *args):
+    result = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.fixture(scope="module")
+def forecast_run(tmp_path_factory):
+    # A copy of the code and data, so the run writes its CSVs and registry there
+    repo = tmp_path_factory.mktemp("repo")
+    shutil.copytree(os.path.join(ROOT_DIR, "utils"), repo / "utils",
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copytree(os.path.join(ROOT_DIR, "data"), repo / "data",
+                    ignore=shutil.ignore_patterns("models", "tiles", "raw", "map"))
+    run_python(repo, "-m", "utils.forecasting", "--jobs", "2")
+    return repo
+
+
+def test_cli_registry_entry_loads_in_another_process(forecast_run):
+    out = run_python(forecast_run, "-c", (
+        "from utils.model_registry import load_entry\n"
+        "entry = load_entry(('offences', 'Uusimaa'))\n"
+        "print(type(entry['model']).__module__)\n"
+        "print(len(entry['model'].forecast(3)[0]))\n"))
+    assert out.split() == ["utils.forecasting", "3"]
+
+
+def test_stored_forecast_is_the_published_one(forecast_run):
+    out = run_python(forecast_run, "-c", (
+        "import numpy as np\n"
+        "from utils.data_loader import load_dataset\n"
+        "from utils.forecasting import stored_forecast\n"
+        "years, mean, lower, upper = stored_forecast(('offences', 'Uusimaa'))\n"
+        "df = load_dataset('offences_forecast')\n"
+        "rows = df[(df['region'] == 'Uusimaa') & (df['type'] == 'Prediction')]\n"
+        "print(np.array_equal(rows['year'].dt.year, years), np.allclose(rows['offences'], mean),\n"
+        "      np.allclose(rows['offences_upper'], upper))\n"))
+    assert out.split() == ["True", "True", "True"]
@@ -0,0 +1,74 @@
+"""`python -m utils.ingest fetch` against the bundled mock of the PxWeb and Sotkanet APIs."""
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_DIR = os.path.join(ROOT_DIR, "data", "raw")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def mock_url(tmp_path):
+    # Served from a copy, with one made-up year past the last one
+    served = tmp_path / "served"
+    shutil.copytree(RAW_DIR, served)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "utils.ingest", "mock", "--port", str(port),
+                               "--raw-dir", str(served), "--extra-years", "1"],
+                              cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(url, timeout=1)
+                break
+            except urllib.error.HTTPError:
+                break
+            except OSError:
+                time.sleep(0.1)
+        yield url
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def fetch(url, raw_dir, state):
+    result = subprocess.run([sys.executable, "-m", "utils.ingest", "fetch", "--base-url", url,
+                             "--raw-dir", str(raw_dir), "--state", str(state)],
+                            cwd=ROOT_DIR, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return dict(re.findall(r"^(\w+): (.+)$", result.stdout, flags=re.MULTILINE))
+
+
+def test_fetch_appends_new_year_then_reports_unchanged(mock_url, tmp_path):
+    raw_dir, state = tmp_path / "raw", tmp_path / "state.json"
+    shutil.copytree(RAW_DIR, raw_dir)
+    deaths = raw_dir / "Drug_related_Deaths.csv"
+    before = deaths.read_text(encoding="utf-8-sig").splitlines()
+
+    first = fetch(mock_url, raw_dir, state)
+    assert first and all(status.startswith("added ") for status in first.values()), first
+    new_year = first["deaths"].split()[-1]
+    after = deaths.read_text(encoding="utf-8-sig").splitlines()
+    assert f'"{new_year}"' in after[1]
+    # The years already stored are kept as they were, the new one is appended
+    assert after[1].startswith(before[1]) and after[2].startswith(before[2])
+
+    content = {path.name: path.read_bytes() for path in raw_dir.iterdir()}
+    second = fetch(mock_url, raw_dir, state)
+    assert set(second.values()) == {"unchanged"}, second
+    assert {path.name: path.read_bytes() for path in raw_dir.iterdir()} == content
@@ -0,0 +1,175 @@
+import json
+import threading
+
+import numpy as np
+
+from utils.kpi_cube import cube_version, kpi_cube
+from utils.spans import timed
+
+# Every numeric column of merged_TSA.csv the map can be coloured by
+KPI_LABELS = {
+    "arrests": "Arrests",
+    "offences": "Offences",
+    "rehab": "Rehabilitated patients",
+    "clinic": "Youth clinic visits",
+    "population": "Population",
+    "unemployment_rate": "Unemployment rate (%)",
+    "forign_count": "Foreign-born population",
+}
+
+# Same light-to-dark red ramp as the folium choropleths
+COLORS = ["#ffcccc", "#ff6666", "#ff3333", "#cc0000", "#990000"]
+
+# (data version, initial KPI) -> rendered HTML
+_html_cache = {}
+_lock = threading.Lock()
+
+_TEMPLATE = """
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>
+  #map { height: __HEIGHT__px; }
+  .controls { font-family: Arial, sans-serif; font-size: 13px; padding: 6px 0; display: flex; gap: 10px; align-items: center; }
+  .controls input[type=range] { flex: 1; }
+  .legend { background: white; padding: 5px 8px; border-radius: 3px; font: 12px Arial, sans-serif; }
+  .legend .bar { width: 160px; height: 10px; background: linear-gradient(to right, __GRADIENT__); }
+</style>
+<div class="controls">
+  <select id="kpi"></select>
+  <button id="play">&#9654;</button>
+  <input id="year" type="range" min="0" step="1"/>
+  <b id="year-label"></b>
+</div>
+<div id="map"></div>
+<script>
+const payload = __PAYLOAD__;
+const colors = __COLORS__;
+
+const map = L.map("map").setView([64.0, 26.0], __ZOOM__);
+L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
+  attribution: "&copy; OpenStreetMap contributors"
+}).addTo(map);
+
+function hexToRgb(hex) {
+  return [1, 3, 5].map(i => parseInt(hex.slice(i, i + 2), 16));
+}
+const rgb = colors.map(hexToRgb);
+
+function colorFor(value, vmin, vmax) {
+  if (value === null) return "transparent";
+  const t = vmax > vmin ? (value - vmin) / (vmax - vmin) * (rgb.length - 1) : 0;
+  const i = Math.min(Math.floor(t), rgb.length - 2);
+  const f = t - i;
+  const c = rgb[i].map((v, k) => Math.round(v + (rgb[i + 1][k] - v) * f));
+  return `rgb(${c[0]},${c[1]},${c[2]})`;
+}
+
+const kpiSelect = document.getElementById("kpi");
+const slider = document.getElementById("year");
+const yearLabel = document.getElementById("year-label");
+const legend = L.control({position: "bottomright"});
+legend.onAdd = () => L.DomUtil.create("div", "legend");
+legend.addTo(map);
+
+for (const [key, kpi] of Object.entries(payload.kpis)) {
+  kpiSelect.add(new Option(kpi.label, key, false, key === payload.initial));
+}
+
+const layer = L.geoJSON(payload.geometry, {
+  style: () => ({color: "black", weight: 1, fillOpacity: 0.4})
+}).addTo(map);
+
+function render() {
+  const kpi = payload.kpis[kpiSelect.value];
+  const pos = Math.min(+slider.value, kpi.years.length - 1);
+  const values = kpi.values[pos];
+  slider.max = kpi.years.length - 1;
+  yearLabel.textContent = kpi.years[pos];
+  layer.eachLayer(feature => {
+    const value = values[feature.feature.id];
+    feature.setStyle({fillColor: colorFor(value, kpi.min, kpi.max)});
+    feature.bindTooltip(`${feature.feature.properties.name}: ${value === null ? "n/a" : value.toLocaleString()}`);
+  });
+  legend.getContainer().innerHTML =
+    `${kpi.label}<div class="bar"></div>${kpi.min.toLocaleString()} &ndash; ${kpi.max.toLocaleString()}`;
+}
+
+let timer = null;
+document.getElementById("play").onclick = function () {
+  if (timer) {
+    clearInterval(timer);
+    timer = null;
+    this.innerHTML = "&#9654;";
+    return;
+  }
+  this.innerHTML = "&#10074;&#10074;";
+  timer = setInterval(() => {
+    slider.value = (+slider.value + 1) % (+slider.max + 1);
+    render();
+  }, __INTERVAL__);
+};
+kpiSelect.onchange = render;
+slider.oninput = render;
+slider.value = 0;
+render();
+</script>
+"""
+
+
+def kpi_payload(cube, geometry_names, kpi):
+    """Label, years, values[year][feature position], min and max of one KPI for a map client."""
+    matrix = cube.matrix(kpi, geometry_names)
+    # Years x regions, so the client indexes values[year][feature id]
+    values = np.round(matrix.values.T, 2)
+    return {
+        "label": KPI_LABELS[kpi],
+        "years": [int(year) for year in matrix.years],
+        "values": [[None if np.isnan(v) else float(v) for v in row] for row in values],
+        "min": float(np.nanmin(values)),
+        "max": float(np.nanmax(values)),
+    }
+
+
+@timed()
+def build_animated_map(initial_kpi="offences", height=600, interval_ms=800):
+    """Returns self-contained HTML for a year-slider choropleth of the merged_TSA KPIs.
+
+    The region geometry and every KPI's region x year values are embedded once;
+    stepping through years or switching KPI happens entirely in the browser.
+    """
+    key = (cube_version(), initial_kpi, height, interval_ms)
+    with _lock:
+        html = _html_cache.get(key)
+    if html is not None:
+        return html
+
+    # geopandas is only needed on a cache miss, so it is imported here rather
+    # than whenever the Monitoring page loads
+    from utils.geometry import DEFAULT_ZOOM, geometry_for_zoom
+
+    cube = kpi_cube()
+    geo_data = geometry_for_zoom(DEFAULT_ZOOM)
+    geometry_names = list(geo_data["name"])
+
+    # Features carry only their name; values live in the per-year arrays, addressed by id
+    geometry = json.loads(geo_data[["name", "geometry"]].to_json(drop_id=True))
+    for pos, feature in enumerate(geometry["features"]):
+        feature["id"] = pos
+
+    payload = {
+        "geometry": geometry,
+        "kpis": {kpi: kpi_payload(cube, geometry_names, kpi) for kpi in KPI_LABELS},
+        "initial": initial_kpi,
+    }
+
+    html = (_TEMPLATE
+            .replace("__PAYLOAD__", json.dumps(payload, separators=(",", ":")))
+            .replace("__COLORS__", json.dumps(COLORS))
+            .replace("__GRADIENT__", ", ".join(COLORS))
+            .replace("__HEIGHT__", str(height))
+            .replace("__ZOOM__", str(DEFAULT_ZOOM))
+            .replace("__INTERVAL__", str(interval_ms)))
+    with _lock:
+        _html_cache.clear()
+        _html_cache[key] = html
+    return html
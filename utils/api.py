@@ -0,0 +1,341 @@
+"""Read-only JSON API for the KPI series, forecasts and change rankings.
+
+Runs as its own process next to the dashboard and never imports Streamlit:
+
+    GET /api                           KPIs, regions, years and forecast KPIs on offer
+    GET /api/series                    rows of merged_TSA.csv
+        ?region=Uusimaa,Lappi  ?kpi=offences,arrests  ?year=2020  ?from=2015&to=2020
+    GET /api/forecasts/<kpi>           offences, arrests or deaths, with interval bounds
+        ?region=...  (?age_group=... for deaths)  ?type=Actual|Prediction  ?year / ?from / ?to
+    GET /api/rankings/<kpi>            regions by rising KPI, as on the Prediction page
+        ?base=2023&target=2025  ?measure=abs|pct|per_capita  ?n=10
+
+Every response body is serialized and gzipped once and kept in memory, keyed by
+its normalized filters: the unfiltered, per-region and per-KPI responses when the
+data is loaded, any other combination on its first request. Responses carry an
+ETag (If-None-Match gets a 304) and Cache-Control, and are sent gzipped to
+clients that accept it. The data versions are checked every RELOAD_SECONDS and
+everything is rebuilt when a dataset changes.
+
+Usage: python -m utils.api [--port 8000] [--host 127.0.0.1]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import dataset_version, load_dataset
+from utils.kpi_cube import MERGED_KPIS, REGION_KPIS, cube_version, kpi_cube
+from utils.ranking import MEASURES, change_ranking
+
+CACHE_CONTROL = "public, max-age=60"
+RELOAD_SECONDS = 5
+
+# Responses kept per data version; past this, new filter combinations are built per request
+MAX_RESPONSES = 20000
+
+# Forecast KPI -> dataset; deaths are forecast per age group rather than per region
+FORECASTS = dict(REGION_KPIS, deaths="deaths_forecast")
+
+Response = namedtuple("Response", ["body", "gzipped", "etag"])
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def make_response(payload):
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+    return Response(body, gzip.compress(body, 6), hashlib.sha1(body).hexdigest()[:16])
+
+
+def _records(df):
+    # NaN -> None so the JSON has nulls; float32 columns rounded to the digits they hold
+    df = df.astype({col: float for col in df.columns if df[col].dtype.kind == "f"}).round(4)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _forecast_frame(kpi, df):
+    # Uniform columns for every forecast: year, region/age_group, [type], value, lower, upper
+    group = "age_group" if kpi == "deaths" else "region"
+    value = "forecast" if kpi == "deaths" else kpi
+    lower, upper = ("lower", "upper") if kpi == "deaths" else (f"{kpi}_lower", f"{kpi}_upper")
+    out = pd.DataFrame({"year": df["year"].dt.year.astype(int), group: df[group].astype(str)})
+    if "type" in df.columns:
+        out["type"] = df["type"].astype(str)
+    out["value"], out["lower"], out["upper"] = df[value], df[lower], df[upper]
+    return out.reset_index(drop=True)
+
+
+def _split(query, name):
+    values = query.get(name)
+    if not values:
+        return None
+    return tuple(sorted({value for item in values for value in item.split(",") if value}))
+
+
+def _int(query, name):
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        return int(values[-1])
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer") from None
+
+
+def _check(values, known, name):
+    unknown = sorted(set(values or ()) - set(known))
+    if unknown:
+        raise ApiError(400, f"unknown {name}: {', '.join(unknown)}")
+    return values
+
+
+def _year_filters(query):
+    years = _split(query, "year")
+    try:
+        years = tuple(int(year) for year in years) if years else None
+    except ValueError:
+        raise ApiError(400, "year must be an integer") from None
+    return years, _int(query, "from"), _int(query, "to")
+
+
+def _filter_years(df, years, lo, hi):
+    keep = np.ones(len(df), dtype=bool)
+    if years:
+        keep &= df["year"].isin(years).to_numpy()
+    if lo is not None:
+        keep &= (df["year"] >= lo).to_numpy()
+    if hi is not None:
+        keep &= (df["year"] <= hi).to_numpy()
+    return df[keep]
+
+
+class ApiData:
+    """The datasets behind the API for one data version, and every response built from them."""
+
+    def __init__(self, version):
+        self.version = version
+        merged = load_dataset("merged_tsa")
+        # Only the KPI columns: read from the CSV, merged_TSA also has its old index
+        self.kpis = list(MERGED_KPIS)
+        self.series = merged[["year", "region", *MERGED_KPIS]].assign(year=merged["year"].astype(int), region=merged["region"].astype(str))
+        self.regions = sorted(self.series["region"].unique())
+        self.years = sorted(int(year) for year in self.series["year"].unique())
+        self.forecasts = {kpi: _forecast_frame(kpi, load_dataset(name)) for kpi, name in FORECASTS.items()}
+        self.ranking = change_ranking()
+        # Ranking years default as on the Prediction page: last actual year to the first forecast year
+        cube = kpi_cube()
+        self.ranking_years = {kpi: (cube.years_with(kpi)[-1], cube.years_with(kpi, "prediction")[0])
+                              for kpi in self.ranking.kpis
+                              if cube.years_with(kpi) and cube.years_with(kpi, "prediction")}
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def response(self, key, build):
+        """Returns the response for a normalized request key, building it on the first request."""
+        response = self._responses.get(key)
+        if response is None:
+            response = make_response(build())
+            with self._lock:
+                if len(self._responses) < MAX_RESPONSES:
+                    self._responses[key] = response
+        return response
+
+    def precompute(self):
+        """Builds the unfiltered and single-region / single-KPI responses up front."""
+        self.get("/api", {})
+        for region in [None] + self.regions:
+            for kpi in [None] + self.kpis:
+                query = {"region": [region] if region else [], "kpi": [kpi] if kpi else []}
+                self.get("/api/series", query)
+        for kpi, frame in self.forecasts.items():
+            group = "age_group" if kpi == "deaths" else "region"
+            for value in [None] + sorted(frame[group].unique()):
+                self.get(f"/api/forecasts/{kpi}", {group: [value] if value else []})
+        for kpi in self.ranking_years:
+            for measure in MEASURES:
+                self.get(f"/api/rankings/{kpi}", {"measure": [measure]})
+        return len(self._responses)
+
+    def get(self, path, query):
+        """Returns the Response for a request path and its parsed query string."""
+        parts = path.strip("/").split("/")
+        if parts == ["api"]:
+            return self.response(("index",), self._index)
+        if parts == ["api", "series"]:
+            return self._series(query)
+        if len(parts) == 3 and parts[:2] == ["api", "forecasts"]:
+            return self._forecast(parts[2], query)
+        if len(parts) == 3 and parts[:2] == ["api", "rankings"]:
+            return self._ranking(parts[2], query)
+        raise ApiError(404, f"no endpoint {path}")
+
+    def _index(self):
+        return {
+            "kpis": self.kpis,
+            "regions": self.regions,
+            "years": self.years,
+            "forecasts": {kpi: {"years": sorted(map(int, frame["year"].unique()))}
+                          for kpi, frame in self.forecasts.items()},
+            "measures": MEASURES,
+        }
+
+    def _series(self, query):
+        regions = _check(_split(query, "region"), self.regions, "region")
+        kpis = _check(_split(query, "kpi"), self.kpis, "kpi")
+        years, lo, hi = _year_filters(query)
+
+        def build():
+            df = self.series
+            if regions:
+                df = df[df["region"].isin(regions)]
+            df = _filter_years(df, years, lo, hi)
+            columns = ["year", "region"] + [kpi for kpi in self.kpis if not kpis or kpi in kpis]
+            return {"kpis": columns[2:], "rows": _records(df[columns])}
+        return self.response(("series", regions, kpis, years, lo, hi), build)
+
+    def _forecast(self, kpi, query):
+        if kpi not in self.forecasts:
+            raise ApiError(404, f"no forecast for {kpi}")
+        frame = self.forecasts[kpi]
+        group = "age_group" if kpi == "deaths" else "region"
+        groups = _check(_split(query, group), frame[group].unique(), group)
+        types = _check(_split(query, "type"), frame["type"].unique() if "type" in frame else (), "type")
+        years, lo, hi = _year_filters(query)
+
+        def build():
+            df = frame
+            if groups:
+                df = df[df[group].isin(groups)]
+            if types:
+                df = df[df["type"].isin(types)]
+            return {"kpi": kpi, "rows": _records(_filter_years(df, years, lo, hi))}
+        return self.response(("forecast", kpi, groups, types, years, lo, hi), build)
+
+    def _ranking(self, kpi, query):
+        if kpi not in self.ranking.kpis:
+            raise ApiError(404, f"no ranking for {kpi}")
+        measure = (query.get("measure") or ["abs"])[-1]
+        _check((measure,), MEASURES, "measure")
+        base, target = self.ranking_years.get(kpi, (None, None))
+        base = _int(query, "base") or base
+        target = _int(query, "target") or target
+        n = _int(query, "n")
+        if base is None or target is None:
+            raise ApiError(400, "base and target years are required for this KPI")
+
+        def build():
+            try:
+                top = self.ranking.top_rising(kpi, base, target, n, measure)
+            except ValueError as err:
+                raise ApiError(400, str(err)) from None
+            top["rank"] = np.arange(1, len(top) + 1)
+            return {"kpi": kpi, "base_year": base, "target_year": target, "measure": measure,
+                    "rows": _records(top.rename(columns={kpi: "change"}))}
+        return self.response(("ranking", kpi, base, target, measure, n), build)
+
+
+def data_version():
+    return cube_version() + tuple(dataset_version(name) for name in FORECASTS.values())
+
+
+_data = None
+_checked = 0.0
+_data_lock = threading.Lock()
+
+
+def api_data():
+    """Returns the ApiData of the current data version, checked at most every RELOAD_SECONDS."""
+    global _data, _checked
+    now = time.monotonic()
+    if _data is not None and now - _checked < RELOAD_SECONDS:
+        return _data
+    with _data_lock:
+        if _data is None or now - _checked >= RELOAD_SECONDS:
+            version = data_version()
+            if _data is None or _data.version != version:
+                data = ApiData(version)
+                data.precompute()
+                _data = data
+            _checked = time.monotonic()
+        return _data
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client reuses its connection across requests; without Nagle's
+    # algorithm the small responses are not held back waiting for the client's ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            response = api_data().get(url.path, parse_qs(url.query))
+        except ApiError as err:
+            body = json.dumps({"error": str(err)}).encode("utf-8")
+            self._send(err.status, body, {"Cache-Control": "no-store"})
+            return
+
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        # The two encodings are different representations, so they get different tags
+        etag = f'"{response.etag}-gz"' if gzipped else f'"{response.etag}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if etag in self.headers.get("If-None-Match", ""):
+            self._send(304, b"", headers)
+            return
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, response.gzipped if gzipped else response.body, headers)
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8000, host="127.0.0.1"):
+    """Loads and precomputes the responses, then serves the API until interrupted."""
+    start = time.perf_counter()
+    data = api_data()
+    print(f"Precomputed {len(data._responses)} responses in {time.perf_counter() - start:.1f}s")
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    print(f"Serving the JSON API on http://{host}:{port}/api")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve KPIs, forecasts and rankings as a read-only JSON API.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args(argv)
+    serve(args.port, args.host)
+
+
+if __name__ == "__main__":
+    main()
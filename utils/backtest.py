@@ -0,0 +1,266 @@
+"""Rolling-origin backtests of the regional and age-group forecasts.
+
+Every offences/arrests series of merged_TSA.csv and every age group of
+death_df.csv is cut at each origin from MIN_TRAIN observations on: a model is
+fitted on the years before the origin and forecasts up to `horizon` years past
+it, which are scored against what actually happened (MAE, MAPE and the share of
+actuals inside the prediction interval).
+
+All (series, origin) fits of a model run as one batch: the damped-trend filter
+of HoltForecaster steps through time once over a (fit, parameter grid) array,
+with series shorter than the longest simply stopping early. Candidate models
+are restrictions of the same grid, so comparing them is one batch each. Large
+batches are split over a process pool.
+
+Usage: python -m utils.backtest [--horizon 3] [--level 0.95] [--model damped_holt ...] [--jobs N]
+"""
+import argparse
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import dataset_version, load_dataset
+from utils.forecasting import ALPHAS, BETA_RATIOS, PHIS
+from utils.kpi_cube import REGION_KPIS
+from utils.spans import timed
+
+# Candidate models as (alphas, beta / alpha ratios, phis) grids of the damped-trend
+# filter; damped_holt is the engine `python -m utils.forecasting` fits, before its
+# forecasts are reconciled with the national total
+MODELS = {
+    "damped_holt": (ALPHAS, BETA_RATIOS, PHIS),
+    "holt": (ALPHAS, BETA_RATIOS, np.array([1.0])),
+    "ses": (ALPHAS, np.array([0.0]), np.array([1.0])),
+    "naive": (np.array([1.0]), np.array([0.0]), np.array([1.0])),
+}
+DEFAULT_MODEL = "damped_holt"
+
+# Fitted parameters and final state of a batch of models, one entry per row
+BatchFit = namedtuple("BatchFit", ["alpha", "beta", "phi", "level", "trend", "sigma2"])
+
+# Observations a fit needs before its first forecast is scored
+MIN_TRAIN = 5
+
+# (series, origin) fits per process-pool task
+CHUNK_ROWS = 256
+
+_results = {}
+_lock = threading.Lock()
+
+
+def load_series():
+    """Returns (keys, years, values): one (kpi, region / age group) key and padded row per series."""
+    merged = load_dataset("merged_tsa")
+    history = load_dataset("deaths_history")
+
+    keys, years, values = [], [], []
+    for kpi in REGION_KPIS:
+        for region, series in merged.sort_values("year").groupby("region", observed=True, sort=False):
+            keys.append((kpi, str(region)))
+            years.append(series["year"].to_numpy(dtype=int))
+            values.append(series[kpi].to_numpy(dtype=float))
+    for age_group, series in history.sort_values("year").groupby("age_group", observed=True, sort=False):
+        keys.append(("deaths", str(age_group)))
+        years.append(series["year"].dt.year.to_numpy())
+        values.append(series["deaths"].to_numpy(dtype=float))
+
+    # Series x time, NaN past each series' end
+    width = max(len(row) for row in values)
+    padded_years = np.full((len(keys), width), -1)
+    padded_values = np.full((len(keys), width), np.nan)
+    for pos, (row_years, row_values) in enumerate(zip(years, values)):
+        padded_years[pos, :len(row_years)] = row_years
+        padded_values[pos, :len(row_values)] = row_values
+    return keys, padded_years, padded_values
+
+
+def _grid(model):
+    alphas, ratios, phis = MODELS[model]
+    alpha, ratio, phi = np.meshgrid(alphas, ratios, phis, indexing="ij")
+    alpha, phi = alpha.ravel(), phi.ravel()
+    return alpha, alpha * ratio.ravel(), phi
+
+
+def fit_batch(z, lengths, model=DEFAULT_MODEL):
+    """Fits one model per row of z (log1p values) on its first `lengths` points.
+
+    Matches HoltForecaster.fit row by row; returns a BatchFit of per-row arrays.
+    """
+    alpha, beta, phi = _grid(model)
+    rows = np.arange(len(z))
+    level_ = np.repeat(z[:, 1:2], len(alpha), axis=1)
+    trend = np.repeat(z[:, 1:2] - z[:, 0:1], len(alpha), axis=1)
+    sse = np.zeros_like(level_)
+
+    # One pass over time for every fit and parameter set; a fit stops at its length
+    for t in range(2, int(lengths.max())):
+        active = (t < lengths)[:, None]
+        pred = level_ + phi * trend
+        err = z[:, t:t + 1] - pred
+        sse = np.where(active, sse + err ** 2, sse)
+        level_ = np.where(active, pred + alpha * err, level_)
+        trend = np.where(active, phi * trend + beta * err, trend)
+
+    best = np.argmin(sse, axis=1)
+    return BatchFit(alpha[best], beta[best], phi[best], level_[rows, best], trend[rows, best],
+                    sse[rows, best] / np.maximum(lengths - 2, 1))
+
+
+def forecast_batch(fit, horizon, level):
+    """Matches HoltForecaster.forecast row by row; returns (mean, lower, upper) of shape (rows, horizon)."""
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(fit.phi[:, None] ** steps, axis=1)
+    z_mean = fit.level[:, None] + damped * fit.trend[:, None]
+    c = fit.alpha[:, None] + fit.beta[:, None] * damped[:, :-1]
+    variance = fit.sigma2[:, None] * (1 + np.concatenate([np.zeros((len(z_mean), 1)), np.cumsum(c ** 2, axis=1)],
+                                                         axis=1))
+    half_width = NormalDist().inv_cdf(0.5 + level / 2) * np.sqrt(variance)
+    return np.expm1(z_mean), np.expm1(z_mean - half_width), np.expm1(z_mean + half_width)
+
+
+def fitted_values(z, fit):
+    """One-step-ahead predictions of each fitted row over its history, on the original scale.
+
+    The first two points seed the level and trend and have no prediction (NaN).
+    """
+    pred = np.full(z.shape, np.nan)
+    level_, trend = z[:, 1], z[:, 1] - z[:, 0]
+    for t in range(2, z.shape[1]):
+        pred[:, t] = level_ + fit.phi * trend
+        err = z[:, t] - pred[:, t]
+        level_, trend = pred[:, t] + fit.alpha * err, fit.phi * trend + fit.beta * err
+    return np.expm1(pred)
+
+
+def fit_forecast_batch(z, lengths, model, horizon, level):
+    """Fits one model per row of z (log1p values) on its first `lengths` points and forecasts.
+
+    Matches HoltForecaster.fit/forecast row by row; returns (mean, lower, upper)
+    arrays of shape (rows, horizon) on the original scale.
+    """
+    return forecast_batch(fit_batch(z, lengths, model), horizon, level)
+
+
+def _fit_chunk(job):
+    z, lengths, model, horizon, level = job
+    return fit_forecast_batch(z, lengths, model, horizon, level)
+
+
+def rolling_origins(values):
+    """Returns (series index, origin) of every fit: origin is the number of training points.
+
+    Origins run up to the last observation, so every fit has at least one actual
+    to be scored against; later horizons past the end of a series are left unscored.
+    """
+    counts = np.sum(~np.isnan(values), axis=1)
+    series, origins = [], []
+    for pos, count in enumerate(counts):
+        for origin in range(MIN_TRAIN, int(count)):
+            series.append(pos)
+            origins.append(origin)
+    return np.array(series, dtype=int), np.array(origins, dtype=int)
+
+
+@timed()
+def run_backtest(models=None, horizon=3, level=0.95, jobs=1):
+    """Backtests the models over every series; returns one row per forecast scored.
+
+    Columns: model, kpi, series, origin_year (last training year), horizon,
+    actual, forecast, lower, upper.
+    """
+    keys, years, values = load_series()
+    series, origins = rolling_origins(values)
+    z = np.log1p(values[series])
+
+    # Actuals the forecasts are scored against, NaN past the end of a series
+    steps = origins[:, None] + np.arange(horizon)
+    inside = steps < values.shape[1]
+    actual = np.where(inside, values[series[:, None], np.minimum(steps, values.shape[1] - 1)], np.nan)
+
+    frames = []
+    for model in models or list(MODELS):
+        if jobs == 1 or len(z) <= CHUNK_ROWS:
+            mean, lower, upper = fit_forecast_batch(z, origins, model, horizon, level)
+        else:
+            chunks = [(z[start:start + CHUNK_ROWS], origins[start:start + CHUNK_ROWS], model, horizon, level)
+                      for start in range(0, len(z), CHUNK_ROWS)]
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                parts = list(pool.map(_fit_chunk, chunks))
+            mean, lower, upper = (np.concatenate(part) for part in zip(*parts))
+
+        frames.append(pd.DataFrame({
+            "model": model,
+            "kpi": np.repeat([keys[pos][0] for pos in series], horizon),
+            "series": np.repeat([keys[pos][1] for pos in series], horizon),
+            "origin_year": np.repeat(years[series, origins - 1], horizon),
+            "horizon": np.tile(np.arange(1, horizon + 1), len(series)),
+            "actual": actual.ravel(),
+            "forecast": mean.ravel(),
+            "lower": lower.ravel(),
+            "upper": upper.ravel(),
+        }))
+    forecasts = pd.concat(frames, ignore_index=True)
+    return forecasts[forecasts["actual"].notna()].reset_index(drop=True)
+
+
+def accuracy(forecasts, by=("model", "kpi", "series", "horizon")):
+    """MAE, MAPE (%, over nonzero actuals), interval coverage (%) and count, grouped by `by`."""
+    error = (forecasts["forecast"] - forecasts["actual"]).abs()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(forecasts["actual"] != 0, error / forecasts["actual"].abs() * 100, np.nan)
+    covered = (forecasts["actual"] >= forecasts["lower"]) & (forecasts["actual"] <= forecasts["upper"])
+    scored = forecasts[list(by)].assign(mae=error, mape=pct, coverage=covered * 100.0, n=1)
+    return scored.groupby(list(by), sort=False).agg(
+        {"mae": "mean", "mape": "mean", "coverage": "mean", "n": "sum"}).reset_index()
+
+
+def backtest_version():
+    return (dataset_version("merged_tsa"), dataset_version("deaths_history"))
+
+
+def backtest(horizon=3, level=0.95):
+    """Returns the backtest forecasts of every model for the current data, computed once per version."""
+    key = (backtest_version(), horizon, level)
+    with _lock:
+        forecasts = _results.get(key)
+        if forecasts is None:
+            # Only the latest data version is worth keeping around
+            _results.clear()
+            forecasts = _results[key] = run_backtest(horizon=horizon, level=level)
+        return forecasts
+
+
+def accuracy_table(kpi, series, horizon=3, level=0.95):
+    """Per-horizon accuracy of every model for one series, as shown next to its forecast table."""
+    forecasts = backtest(horizon, level)
+    rows = forecasts[(forecasts["kpi"] == kpi) & (forecasts["series"] == series)]
+    table = accuracy(rows, by=("model", "horizon"))
+    return table.rename(columns={"model": "Model", "horizon": "Years ahead", "mae": "MAE", "mape": "MAPE (%)",
+                                 "coverage": "Coverage (%)", "n": "Forecasts"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the forecast models with rolling origins.")
+    parser.add_argument("--horizon", type=int, default=3, help="years forecast from each origin")
+    parser.add_argument("--level", type=float, default=0.95, help="prediction interval coverage")
+    parser.add_argument("--model", action="append", choices=list(MODELS), help="model to test (default: all)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--output", help="write every scored forecast to this CSV")
+    args = parser.parse_args(argv)
+
+    forecasts = run_backtest(args.model, args.horizon, args.level, args.jobs)
+    summary = accuracy(forecasts, by=("model", "kpi", "horizon"))
+    with pd.option_context("display.width", 120, "display.max_rows", None):
+        print(summary.to_string(index=False, float_format="{:.2f}".format))
+    if args.output:
+        forecasts.to_csv(args.output, index=False)
+        print(f"{len(forecasts)} forecasts -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
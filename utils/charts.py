@@ -0,0 +1,189 @@
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from utils.spans import timed
+from utils.traces import line_figure, line_trace
+
+MOSTLY_USED_DRUGS = ["ATS_MDMA (tablet)", "ATS_Amphetamine (gram)", "Cannabis_Resin (gram)", "Cannabis_Herbal (gram)"]
+
+# Colors for each KPI, kept consistent across the trend charts
+KPI_COLORS = {"arrests": "blue", "offences": "red", "rehab": "green", "clinic": "orange"}
+
+
+@timed()
+def deaths_by_age_figure(df_1):
+    """Line chart of the wide Drug_related_deaths table, one trace per age group."""
+    years = [int(col) for col in df_1.columns if col != "Age_group"]
+
+    # One trace per age group, all handed to the figure at once
+    death_counts = df_1.drop(columns="Age_group").to_numpy(dtype=int)
+    fig1 = line_figure(line_trace(years, counts, mode='lines+markers', name=age_group)
+                       for age_group, counts in zip(df_1["Age_group"], death_counts))
+
+    fig1.update_layout(# title="Number of Deaths by Age Group Over the Years",
+                       xaxis_title="Year", yaxis_title="Number of deaths",
+                       template="plotly_white", showlegend=True)
+    return fig1
+
+
+@timed()
+def drug_price_figure(data, plot_option):
+    """Retail price trends for all drugs or only the commonly used ones."""
+    # sort_values returns a copy, so the shared cached frame stays untouched
+    df = data.sort_values(by="Year")
+    df["Year"] = df["Year"].astype(int)
+    drug_options = list(df.columns[1:])
+
+    if plot_option == "All types of drugs":
+        drugs = drug_options
+    elif plot_option == "Commonly used drugs":
+        drugs = [drug for drug in MOSTLY_USED_DRUGS if drug in df.columns]
+    else:
+        drugs = []
+
+    fig2 = line_figure(line_trace(df["Year"], df[drug], mode='lines+markers', name=drug) for drug in drugs)
+
+    fig2.update_layout(# title="Drug Price Trends Over Time",
+                       xaxis_title="Year", yaxis_title="Price (€)",
+                       template="plotly_white", showlegend=True)
+    return fig2
+
+
+@timed()
+def kpi_trend_figure(cube, region_selected, selected_kpis):
+    """KPI trends of the KPI cube for one region, one trace per selected KPI."""
+    # A trace for each selected KPI, sliced straight out of the cube and added in one batch.
+    traces = []
+    for kpi in selected_kpis:
+        years, values = cube.series(region_selected, kpi)
+        traces.append(line_trace(
+            years,
+            values,
+            mode='lines+markers',
+            name=kpi.capitalize(),
+            line=dict(color=KPI_COLORS.get(kpi, "black"))
+        ))
+    fig = line_figure(traces)
+
+    # Update layout for clarity.
+    fig.update_layout(
+        title=f"KPI Trends for {region_selected}",
+        xaxis_title="Year",
+        yaxis_title="Count",
+        template="plotly_white"
+    )
+    return fig
+
+
+@timed()
+def kpi_forecast_figure(cube, kpi_selected, region_selected, forecast=None):
+    """Actuals, predictions and the confidence band of an offences/arrests forecast.
+
+    forecast, a (years, mean, lower, upper) tuple, replaces the cube's predictions.
+    """
+    kpi_column = kpi_selected.lower()
+
+    # Plot actual values
+    years, actuals = cube.series(region_selected, kpi_column, "actual")
+    traces = [line_trace(years, actuals, mode='lines+markers', name='Actual', line=dict(color='blue'))]
+
+    # Plot predictions
+    if forecast is not None:
+        years, predictions, lower, upper = forecast
+    else:
+        years, predictions = cube.series(region_selected, kpi_column, "prediction")
+        _, lower = cube.series(region_selected, kpi_column, "lower")
+        _, upper = cube.series(region_selected, kpi_column, "upper")
+    traces.append(line_trace(years, predictions, mode='lines+markers', name='Prediction', line=dict(color='red', dash='dash')))
+
+    # Plot confidence intervals, only when they pair up with the predicted years
+    if len(years) and len(lower) == len(years) and len(upper) == len(years):
+        traces.append(line_trace(
+            years, lower,
+            mode='lines', name='Lower Bound', line=dict(color='red', dash='dot'), showlegend=False))
+        traces.append(line_trace(
+            years, upper,
+            mode='lines', name='Upper Bound', line=dict(color='red', dash='dot'),
+            fill='tonexty', fillcolor='rgba(255, 0, 0, 0.2)', showlegend=False))
+
+    fig1 = line_figure(traces)
+
+    fig1.update_layout(title=f"{kpi_selected} Forecast - {region_selected}",
+                    xaxis_title="Year", yaxis_title=f"{kpi_selected} Count",
+                    template="plotly_white", showlegend=True)
+    return fig1
+
+
+@timed()
+def deaths_forecast_figure(deaths_forecast_df, deaths_history_df, age_selected):
+    """Historical and predicted drug-related deaths for one age group."""
+    deaths_forecast_filtered = deaths_forecast_df[deaths_forecast_df["age_group"] == age_selected]
+    deaths_history_filtered = deaths_history_df[deaths_history_df["age_group"] == age_selected]
+
+    # Plot actual deaths
+    traces = [line_trace(deaths_history_filtered['year'], deaths_history_filtered['deaths'],
+                         mode='lines+markers', name='Actual Deaths', line=dict(color='blue'))]
+
+    # Plot predicted deaths
+    traces.append(line_trace(deaths_forecast_filtered['year'], deaths_forecast_filtered['forecast'],
+                             mode='lines+markers', name='Predicted Deaths', line=dict(color='red', dash='dash')))
+
+    # Plot confidence intervals
+    if 'lower' in deaths_forecast_filtered.columns and 'upper' in deaths_forecast_filtered.columns:
+        traces.append(line_trace(
+            deaths_forecast_filtered['year'], deaths_forecast_filtered['lower'],
+            mode='lines', name='Lower Bound', line=dict(color='red', dash='dot'), showlegend=False))
+        traces.append(line_trace(
+            deaths_forecast_filtered['year'], deaths_forecast_filtered['upper'],
+            mode='lines', name='Upper Bound', line=dict(color='red', dash='dot'),
+            fill='tonexty', fillcolor='rgba(255, 0, 0, 0.2)', showlegend=False))
+
+    fig2 = line_figure(traces)
+
+    fig2.update_layout(title=f"Drug-Related Deaths Forecast - {age_selected}",
+                    xaxis_title="Year", yaxis_title="Deaths Count",
+                    template="plotly_white", showlegend=True)
+    return fig2
+
+
+@timed()
+def deaths_pie_figure(deaths_forecast_df, year=2025):
+    """Share of predicted deaths by age group for one forecast year."""
+    deaths_year = deaths_forecast_df[deaths_forecast_df["year"].dt.year == year]
+
+    fig_pie = go.Figure(data=[go.Pie(labels=deaths_year["age_group"],
+                                    values=deaths_year["forecast"],
+                                    hole=0.4)])
+
+    fig_pie.update_layout(title=f"Proportion of Predicted Drug-Related Deaths by Age Group ({year})")
+    return fig_pie
+
+
+@timed()
+def scenario_figure(cube, bands, region_selected):
+    """History and simulated 50%/90% bands of every scenario KPI for one region, one panel per KPI."""
+    kpis = list(dict.fromkeys(bands["kpi"]))
+    fig = make_subplots(rows=2, cols=2, subplot_titles=[kpi.capitalize() for kpi in kpis])
+    region_bands = bands[bands["region"] == region_selected]
+
+    for pos, kpi in enumerate(kpis):
+        row, col = pos // 2 + 1, pos % 2 + 1
+        color = KPI_COLORS.get(kpi, "black")
+        years, actuals = cube.series(region_selected, kpi)
+        kpi_bands = region_bands[region_bands["kpi"] == kpi]
+
+        traces = [line_trace(years, actuals, mode='lines+markers', name='Actual', line=dict(color=color),
+                             showlegend=False)]
+        # Outer (5-95%) and inner (25-75%) bands, each filled up to its lower edge
+        for lower, upper, opacity in (("p5", "p95", 0.15), ("p25", "p75", 0.3)):
+            traces.append(line_trace(kpi_bands["year"], kpi_bands[lower], mode='lines', line=dict(width=0),
+                                     showlegend=False, hoverinfo='skip'))
+            traces.append(line_trace(kpi_bands["year"], kpi_bands[upper], mode='lines', line=dict(width=0),
+                                     fill='tonexty', fillcolor=f'rgba(128, 128, 128, {opacity})',
+                                     showlegend=False, hoverinfo='skip'))
+        traces.append(line_trace(kpi_bands["year"], kpi_bands["p50"], mode='lines+markers', name='Median',
+                                 line=dict(color=color, dash='dash'), showlegend=False))
+        fig.add_traces(traces, rows=row, cols=col)
+
+    fig.update_layout(title=f"Scenario Simulation - {region_selected}", template="plotly_white", height=600)
+    return fig
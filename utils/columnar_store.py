@@ -0,0 +1,112 @@
+"""Builds the typed Arrow IPC copies of the dashboard datasets.
+
+Usage: python -m utils.columnar_store [dataset ...]
+"""
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.data_loader import DATASETS, STORE_DIR, file_digest, resolve_path, store_path
+from utils.regions import to_categorical
+
+# Per-dataset schema: columns to drop, explicit column types, and the type of
+# every remaining column. "year" is a datetime where the dashboard treats it as a
+# date axis and a small integer where it is used as a lookup key. "region" stores
+# the canonical region Categorical, so every dataset shares the same codes.
+SCHEMAS = {
+    "deaths": {
+        "columns": {"Age_group": "category"},
+        "default": "float32",
+    },
+    "drug_prices": {
+        "columns": {"Year": "int16"},
+        "default": "float32",
+    },
+    "drug_usage_by_regions": {
+        "drop": ["Unnamed: 0"],
+        "columns": {"year": "int16"},
+        "default": "float32",
+    },
+    "merged_tsa": {
+        "drop": ["Unnamed: 0"],
+        "columns": {"year": "int16", "region": "region"},
+        "default": "float32",
+    },
+    "offences_forecast": {
+        "columns": {"year": "datetime64[ns]", "type": "category", "region": "region"},
+        "default": "float32",
+    },
+    "arrests_forecast": {
+        "columns": {"year": "datetime64[ns]", "type": "category", "region": "region"},
+        "default": "float32",
+    },
+    "deaths_forecast": {
+        # The CSV repeats the age_group header, which pandas reads as age_group.1
+        "drop": ["age_group.1"],
+        "columns": {"year": "datetime64[ns]", "age_group": "category"},
+        "default": "float32",
+    },
+    "deaths_history": {
+        "drop": ["Unnamed: 0"],
+        "columns": {"year": "datetime64[ns]", "age_group": "category"},
+        "default": "float32",
+    },
+}
+
+
+def apply_schema(df, schema):
+    """Returns a copy of df with the schema's columns dropped and types applied."""
+    df = df.drop(columns=[col for col in schema.get("drop", []) if col in df.columns])
+    dtypes = {col: schema["columns"].get(col, schema["default"]) for col in df.columns}
+    for col, dtype in dtypes.items():
+        if dtype.startswith("datetime64") and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            # Bare years such as 2006 become 2006-01-01, matching read_csv(parse_dates=...)
+            df[col] = pd.to_datetime(df[col].astype(str), format="mixed")
+        elif dtype == "region":
+            df[col] = to_categorical(df[col])
+    return df.astype({col: dtype for col, dtype in dtypes.items() if dtype != "region"})
+
+
+def build_dataset(name):
+    """Converts one CSV dataset to an uncompressed Arrow IPC file and returns its manifest entry."""
+    csv_path, read_kwargs = DATASETS[name]
+    df = apply_schema(pd.read_csv(resolve_path(csv_path), **read_kwargs), SCHEMAS[name])
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Memory mapping only avoids copies for uncompressed record batches
+    with pa.OSFile(resolve_path(store_path(name)), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    return {
+        "source": csv_path,
+        "source_sha1": file_digest(csv_path),
+        "rows": table.num_rows,
+        "schema": {field.name: str(field.type) for field in table.schema},
+    }
+
+
+def build_store(names=None):
+    """Rebuilds the columnar copies of the given datasets (all by default)."""
+    os.makedirs(resolve_path(STORE_DIR), exist_ok=True)
+    manifest_path = resolve_path(f"{STORE_DIR}/manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as file:
+            manifest = json.load(file)
+
+    for name in names or SCHEMAS:
+        manifest[name] = build_dataset(name)
+        print(f"{name}: {manifest[name]['rows']} rows -> {store_path(name)}")
+
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True, ensure_ascii=False)
+        file.write("\n")
+    return manifest
+
+
+if __name__ == "__main__":
+    build_store(sys.argv[1:])
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from utils.spans import span
+
+# Every dataset the dashboard reads, with the arguments it is parsed with
+DATASETS = {
+    "deaths": ("data/clean/Drug_related_deaths.csv", {}),
+    "drug_prices": ("data/clean/Retail_drug_prices.csv", {}),
+    "drug_usage_by_regions": ("data/clean/Reported_drug_usage_by_regions.csv", {}),
+    "merged_tsa": ("data/merged_TSA.csv", {}),
+    "offences_forecast": ("data/clean/offences_forecast.csv", {"parse_dates": ["year"]}),
+    "arrests_forecast": ("data/clean/arrests_forecast.csv", {"parse_dates": ["year"]}),
+    "deaths_forecast": ("data/clean/deaths_forecast.csv", {"parse_dates": ["year"]}),
+    "deaths_history": ("data/clean/death_df.csv", {"parse_dates": ["year"]}),
+    "national_forecast": ("data/clean/national_forecast.csv", {"parse_dates": ["year"]}),
+}
+
+# Typed columnar copies of DATASETS, built by utils/columnar_store.py
+STORE_DIR = "data/store"
+
+# Paths are resolved against the repository root so the cache works from any cwd
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Process-wide cache shared by every Streamlit session: path -> (stamp, digest, frame)
+_cache = {}
+_cache_lock = threading.Lock()
+_path_locks = {}
+_digests = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def resolve_path(path):
+    """Returns an absolute path for a repository-relative data file."""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(ROOT_DIR, path)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _file_digest(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _lock_for(path):
+    with _cache_lock:
+        return _path_locks.setdefault(path, threading.Lock())
+
+
+def _cached_load(path, options, reader):
+    """Runs reader(path) once per file version and returns the shared result.
+
+    Entries are keyed on the file path and reader options plus the file's
+    mtime/size. When either changes the content hash is recomputed, and the
+    entry is re-read only if the bytes differ.
+    """
+    key = (path, options)
+    stamp = _file_stamp(path)
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            _stats["hits"] += 1
+            return entry[2]
+
+    # Parse outside the global lock so different files load concurrently
+    with _lock_for(path):
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is not None and entry[0] == stamp:
+                _stats["hits"] += 1
+                return entry[2]
+
+        digest = file_digest(path)
+        if entry is not None and entry[1] == digest:
+            # Touched but not modified: keep the parsed frame, refresh the stamp
+            with _cache_lock:
+                _cache[key] = (stamp, digest, entry[2])
+                _stats["hits"] += 1
+            return entry[2]
+
+        with span("parse", file=os.path.basename(path)):
+            df = reader(path)
+        with _cache_lock:
+            if entry is not None:
+                _stats["evictions"] += 1
+            _cache[key] = (stamp, digest, df)
+            _stats["misses"] += 1
+        return df
+
+
+def _csv_options(read_kwargs):
+    return ("csv",) + tuple(sorted((k, repr(v)) for k, v in read_kwargs.items()))
+
+
+def load_csv(path, **read_kwargs):
+    """Loads a CSV once per process and returns the shared, read-only DataFrame."""
+    return _cached_load(resolve_path(path), _csv_options(read_kwargs),
+                        lambda p: pd.read_csv(p, **read_kwargs))
+
+
+def read_arrow(path):
+    """Reads an uncompressed Arrow IPC file through a memory map.
+
+    Numeric columns without nulls are handed to pandas without copying, so the
+    pages stay shared with the OS page cache instead of each worker's heap.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def load_arrow(path):
+    """Loads an Arrow IPC file once per process and returns the shared, read-only DataFrame."""
+    return _cached_load(resolve_path(path), ("arrow",), read_arrow)
+
+
+def store_path(name):
+    """Returns the repository-relative path of a dataset's columnar copy."""
+    return f"{STORE_DIR}/{name}.arrow"
+
+
+def file_digest(path):
+    """Returns the content hash of a file, recomputed only when its mtime/size changes."""
+    path = resolve_path(path)
+    stamp = _file_stamp(path)
+    with _cache_lock:
+        entry = _digests.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+    digest = _file_digest(path)
+    with _cache_lock:
+        _digests[path] = (stamp, digest)
+    return digest
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _store_manifest():
+    path = resolve_path(f"{STORE_DIR}/manifest.json")
+    if not os.path.exists(path):
+        return {}
+    return _cached_load(path, ("json",), _read_json)
+
+
+def _source_for(name):
+    """Returns (path, options, reader) for a dataset, preferring an up-to-date columnar copy."""
+    csv_path, read_kwargs = DATASETS[name]
+    csv_path = resolve_path(csv_path)
+    arrow_path = resolve_path(store_path(name))
+    # The manifest records the CSV each columnar file was built from, so a CSV
+    # edited after the last store build falls back to being parsed directly
+    source = _store_manifest().get(name, {}).get("source_sha1")
+    if source is not None and os.path.exists(arrow_path) and source == file_digest(csv_path):
+        return arrow_path, ("arrow",), read_arrow
+    return csv_path, _csv_options(read_kwargs), lambda p: pd.read_csv(p, **read_kwargs)
+
+
+def load_dataset(name):
+    """Loads one of the named datasets in DATASETS through the shared cache."""
+    with span("load_dataset", dataset=name):
+        return _cached_load(*_source_for(name))
+
+
+def dataset_version(name):
+    """Returns the content hash of a named dataset, loading it if needed."""
+    path, options, reader = _source_for(name)
+    _cached_load(path, options, reader)
+    with _cache_lock:
+        return _cache[(path, options)][1]
+
+
+def cache_stats():
+    """Returns hit/miss/eviction counters and the number of cached entries."""
+    with _cache_lock:
+        return dict(_stats, entries=len(_cache))
+
+
+def clear_cache():
+    """Drops every cached frame and resets the counters."""
+    with _cache_lock:
+        _cache.clear()
+        _digests.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,128 @@
+"""Opt-in sidebar showing where the time of a dashboard rerun goes.
+
+Open the dashboard with ?debug=1 (or set DASHBOARD_DEBUG=1) to trace every rerun
+and draw its spans as a waterfall in the sidebar, with a button to profile the
+next rerun and downloads of the spans as JSON Lines. Setting DASHBOARD_SPANS_LOG
+to a file path appends the spans of every rerun of every session to that file,
+with or without the panel.
+
+Panels declared with @traced_fragment(page) are traced on their own reruns too,
+which skip the page-level trace; their waterfall is drawn inside the panel.
+"""
+import functools
+import os
+from contextlib import ExitStack, contextmanager
+
+import streamlit as st
+
+from utils.spans import PROFILERS, append_jsonl, current_trace, profiled, span, trace
+
+SPANS_LOG = os.environ.get("DASHBOARD_SPANS_LOG")
+
+
+def debug_enabled():
+    return os.environ.get("DASHBOARD_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+
+def waterfall_figure(current):
+    """Horizontal bars of every span, offset by its start, nested spans indented."""
+    import plotly.graph_objects as go
+
+    spans = [span for span in current.spans if span.duration is not None]
+    labels = [f"{pos}. " + " " * span.depth + span.name for pos, span in enumerate(spans)]
+    hover = [", ".join(f"{key}={value}" for key, value in span.attrs.items()) for span in spans]
+    fig = go.Figure(go.Bar(
+        y=labels,
+        x=[span.duration * 1000 for span in spans],
+        base=[span.start * 1000 for span in spans],
+        orientation="h",
+        customdata=hover,
+        hovertemplate="%{y}<br>%{base:.1f} ms + %{x:.1f} ms<br>%{customdata}<extra></extra>",
+    ))
+    fig.update_layout(
+        height=120 + 18 * len(spans),
+        margin=dict(l=0, r=0, t=10, b=30),
+        xaxis_title="ms since rerun start",
+        yaxis=dict(autorange="reversed", automargin=True),
+    )
+    return fig
+
+
+def render_debug_panel(current, report=None):
+    with st.sidebar.expander("Performance", expanded=True):
+        st.caption(f"{current.label}: {current.duration * 1000:.0f} ms, {len(current.spans)} spans")
+        if current.spans:
+            st.plotly_chart(waterfall_figure(current), use_container_width=True)
+        st.download_button("Download spans (JSONL)", current.to_jsonl(),
+                           file_name=f"spans-{current.run_id}.jsonl", mime="application/jsonl")
+
+        engine = st.selectbox("Profiler", PROFILERS, key="_debug_profiler")
+        if st.button("Profile next rerun"):
+            st.session_state["_debug_profile_next"] = engine
+            st.rerun()
+
+        if report is not None:
+            st.caption(f"Profile of this rerun ({report['engine']})")
+            st.code(report["text"], language=None)
+            if "pstats" in report:
+                st.download_button("Download profile (pstats)", report["pstats"],
+                                   file_name=f"profile-{current.run_id}.pstats")
+            if "html" in report:
+                st.download_button("Download profile (HTML)", report["html"],
+                                   file_name=f"profile-{current.run_id}.html", mime="text/html")
+
+
+def render_fragment_panel(current):
+    # A fragment rerun cannot write to the sidebar, so its spans are shown in the panel
+    with st.expander(f"Performance ({current.label})"):
+        st.caption(f"{current.label}: {current.duration * 1000:.0f} ms, {len(current.spans)} spans")
+        if current.spans:
+            st.plotly_chart(waterfall_figure(current), use_container_width=True)
+        st.download_button("Download spans (JSONL)", current.to_jsonl(), key=f"_debug_spans_{current.label}",
+                           file_name=f"spans-{current.run_id}.jsonl", mime="application/jsonl")
+
+
+@contextmanager
+def traced_rerun(label, fragment=False):
+    """Traces the enclosed rerun when debugging or span logging is on, then reports it.
+
+    A fragment's rerun is reported inside the fragment, and leaves profiling to full reruns.
+    """
+    debug = debug_enabled()
+    if not debug and not SPANS_LOG:
+        yield
+        return
+
+    engine = st.session_state.pop("_debug_profile_next", None) if debug and not fragment else None
+    with ExitStack() as stack:
+        current = stack.enter_context(trace(label))
+        report = stack.enter_context(profiled(engine)) if engine else None
+        yield
+    if SPANS_LOG:
+        append_jsonl(current, SPANS_LOG)
+    if debug:
+        if fragment:
+            render_fragment_panel(current)
+        else:
+            render_debug_panel(current, report)
+
+
+def traced_fragment(page):
+    """Like @st.fragment, with the fragment's own reruns traced as "<page>:<function name>".
+
+    In a full rerun the panel runs inside the page's trace, and is recorded
+    there as one span.
+    """
+    def decorator(func):
+        label = f"{page}:{func.__name__}"
+
+        @st.fragment
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace() is not None:
+                with span("fragment", panel=func.__name__):
+                    return func(*args, **kwargs)
+            with traced_rerun(label, fragment=True):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
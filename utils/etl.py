@@ -0,0 +1,253 @@
+"""Incremental pipeline that turns data/raw into data/clean.
+
+Each clean output is produced by a declared stage with its raw inputs. A stage
+reruns only when the content hash of one of its inputs (or a recorded output)
+has changed since the last run, and stages without dependencies on each other
+run in parallel worker processes.
+
+Usage: python -m utils.etl [--force] [--jobs N] [stage ...]
+"""
+import argparse
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASETS, file_digest, resolve_path
+from utils.helpers import melting_data
+from utils.regions import to_finnish
+
+STATE_PATH = "data/etl_state.json"
+
+Stage = namedtuple("Stage", ["name", "inputs", "outputs", "transform"])
+
+def clean_drug_crimes(inputs, outputs):
+    df = pd.read_csv(inputs[0], encoding='utf-8-sig')
+    df = df.reindex(sorted(df.columns), axis=1)
+    df = df.drop(columns=['MA1 MANNER-SUOMI', 'MA2 AHVENANMAA'])
+
+    # Deleting the region code
+    df.columns = ['KOKO MAA'] + [col.split()[1] for col in df.columns if col[0] == 'M'] + ['year']
+    df.to_csv(outputs[0], encoding='utf-8')
+
+    with open(outputs[1], 'w', encoding='utf-8') as f:
+        for region in df.columns:
+            if region not in ('year', 'KOKO MAA'):
+                f.write(f"{region}\n")
+
+
+def _sotkanet_pivot(path):
+    # Sotkanet exports are headerless, ';'-separated rows of
+    # indicator;id;area;area code;sex;year;value;value
+    data = pd.read_csv(path, sep=';', header=None)
+    data = data[[2, 5, 6]]
+    data.columns = ['Area', 'Year', 'value']
+    # Nullable integers keep the counts integral around years a region is missing
+    data['value'] = data['value'].astype('Int64')
+    # Columns keep the order of the English area names, renamed to Finnish
+    pivot = data.pivot(index='Year', columns='Area', values='value')
+    pivot.columns = to_finnish(pivot.columns)
+    return pivot.reset_index()
+
+
+def clean_rehabilitation(inputs, outputs):
+    df = _sotkanet_pivot(inputs[0])
+    # Regions sorted by their Finnish name, with Year last; Åland has no centres listed
+    regions = sorted(name for name in df.columns[1:] if name != 'Ahvenanmaa')
+    df[regions + ['Year']].to_csv(outputs[0], index=False)
+
+
+def clean_youth_clinic(inputs, outputs):
+    _sotkanet_pivot(inputs[0]).to_csv(outputs[0], index=False)
+
+
+def clean_drug_prices(inputs, outputs):
+    data = pd.read_csv(inputs[0])
+    data['Drug'] = data['Drug'].str.strip()
+    df = data.set_index('Drug').transpose().reset_index()
+    df = df.rename(columns={'index': 'Year'})
+    df.columns.name = None
+
+    # Cocaine_Crack (gram) is almost entirely missing
+    df = df.drop(columns=['Cocaine_Crack (gram)'])
+    df = df.astype({col: float for col in df.columns[1:]})
+    df.to_csv(outputs[0], index=False)
+
+
+def _read_deaths(path):
+    # The Statistics Finland export has a title line above the header and
+    # unit/source footnotes below the age groups
+    df = pd.read_csv(path, skiprows=1, encoding='utf-8-sig')
+    df = df.rename(columns={df.columns[0]: 'age_group'})
+    return df[df[df.columns[1]].notna()]
+
+
+def clean_deaths(inputs, outputs):
+    df = _read_deaths(inputs[0])
+    df['age_group'] = df['age_group'].replace({'- 24': '15-24', '55 -': '55 above'})
+    df = df.rename(columns={'age_group': 'Age_group'})
+    df = df.astype({col: int for col in df.columns[1:]})
+    df.to_csv(outputs[0], index=False)
+
+
+def clean_deaths_history(inputs, outputs):
+    df = _read_deaths(inputs[0])
+    df = df.melt(id_vars=['age_group'], var_name='year', value_name='deaths')
+    df['year'] = df['year'].astype(int)
+    df['deaths'] = df['deaths'].astype(float)
+    df.to_csv(outputs[0])
+
+
+def clean_unemployment(inputs, outputs):
+    df = pd.read_csv(inputs[0], encoding='utf-8-sig')
+
+    # Deleting the region code
+    df.columns = ['Year', 'WHOLE COUNTRY'] + [col.split(' ', 1)[1] for col in df.columns if col.startswith('MK')]
+    df = df.replace('.', np.nan)
+    df = df.astype({col: float for col in df.columns[1:]})
+
+    # Regions with missing years are imputed with the whole country rate
+    for region in ['Kainuu', 'Central Ostrobothnia', 'Åland']:
+        df[region] = df[region].fillna(df['WHOLE COUNTRY'])
+    df.to_csv(outputs[0], encoding='utf-8')
+
+    melting_data(df, 'unemployment_rate').to_csv(outputs[1], encoding='utf-8')
+
+
+def _strip_region_code(path):
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    df['region'] = df['region'].str.replace(r'^MK\d+\s+', '', regex=True)
+    return df
+
+
+def clean_foreign_born(inputs, outputs):
+    _strip_region_code(inputs[0]).to_csv(outputs[0], encoding='utf-8')
+
+
+def clean_foreign_born_shares(inputs, outputs):
+    for source, target in zip(inputs, outputs):
+        _strip_region_code(source).to_csv(target, encoding='utf-8', index=False)
+
+
+STAGES = [
+    Stage("drug_crimes", ["data/raw/Reported_drug_crimes_by_regions.csv"],
+          ["data/clean/Reported_drug_usage_by_regions.csv", "data/region_names.txt"], clean_drug_crimes),
+    Stage("rehabilitation", ["data/raw/Rehabilitation.csv"],
+          ["data/clean/Rehabilitation_data_by_regions.csv"], clean_rehabilitation),
+    Stage("youth_clinic", ["data/raw/Youth_clinic.csv"],
+          ["data/clean/Youth_Clinical_data_by_regions.csv"], clean_youth_clinic),
+    Stage("drug_prices", ["data/raw/Retail_drug_prices(Retail).csv"],
+          ["data/clean/Retail_drug_prices.csv"], clean_drug_prices),
+    Stage("deaths", ["data/raw/Drug_related_Deaths.csv"],
+          ["data/clean/Drug_related_deaths.csv"], clean_deaths),
+    Stage("deaths_history", ["data/raw/Drug_related_Deaths.csv"],
+          ["data/clean/death_df.csv"], clean_deaths_history),
+    Stage("unemployment", ["data/raw/Unemployment_rate.csv"],
+          ["data/clean/Unemployment_rate_by_regions.csv", "data/clean/melted/Unemployment_rate.csv"],
+          clean_unemployment),
+    Stage("foreign_born", ["data/raw/Foreign_born_population_by_region.csv"],
+          ["data/clean/Foreign_born_population_by_region.csv"], clean_foreign_born),
+    Stage("foreign_born_shares",
+          ["data/raw/Percentage_of_foreign_born_population.csv", "data/raw/Proportion_of_foreign_born_population.csv"],
+          ["data/clean/Percentage_of_foreign_born_population.csv", "data/clean/Proportion_of_foreign_born_population.csv"],
+          clean_foreign_born_shares),
+]
+
+
+def _hashes(paths):
+    return {path: file_digest(path) if os.path.exists(resolve_path(path)) else None for path in paths}
+
+
+def load_state():
+    path = resolve_path(STATE_PATH)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_state(state):
+    with open(resolve_path(STATE_PATH), "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2, sort_keys=True, ensure_ascii=False)
+        file.write("\n")
+
+
+def is_stale(stage, state):
+    """A stage is stale when an input or output hash differs from its last recorded run."""
+    recorded = state.get(stage.name)
+    if recorded is None:
+        return True
+    return (_hashes(stage.inputs) != recorded["inputs"]
+            or _hashes(stage.outputs) != recorded["outputs"])
+
+
+def stage_levels(stages):
+    """Groups stages into levels; every stage depends only on outputs of earlier levels."""
+    producer = {output: stage.name for stage in stages for output in stage.outputs}
+    deps = {stage.name: {producer[i] for i in stage.inputs if i in producer} for stage in stages}
+    by_name = {stage.name: stage for stage in stages}
+
+    levels, done = [], set()
+    while len(done) < len(stages):
+        level = [name for name in deps if name not in done and deps[name] <= done]
+        if not level:
+            raise ValueError(f"Cyclic stage dependencies among {sorted(set(deps) - done)}")
+        levels.append([by_name[name] for name in level])
+        done.update(level)
+    return levels
+
+
+def _run_stage(stage):
+    stage.transform([resolve_path(p) for p in stage.inputs], [resolve_path(p) for p in stage.outputs])
+    return stage.name
+
+
+def run_pipeline(names=None, force=False, jobs=None):
+    """Runs the stale stages (or the named ones) and returns the names that ran."""
+    state = load_state()
+    selected = [stage for stage in STAGES if not names or stage.name in names]
+    ran = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for level in stage_levels(selected):
+            # An upstream rebuild changes this level's input hashes, so staleness
+            # is decided only once the previous level has finished
+            stale = [stage for stage in level if force or is_stale(stage, state)]
+            for name in pool.map(_run_stage, stale):
+                print(f"{name}: rebuilt")
+                ran.append(name)
+            for stage in stale:
+                state[stage.name] = {"inputs": _hashes(stage.inputs), "outputs": _hashes(stage.outputs)}
+
+    save_state(state)
+
+    # Refresh the columnar copies of any dashboard dataset whose CSV was rewritten
+    rebuilt = {output for stage in STAGES if stage.name in ran for output in stage.outputs}
+    datasets = [name for name, (path, _) in DATASETS.items() if path in rebuilt]
+    if datasets:
+        from utils.columnar_store import build_store
+        build_store(datasets)
+    return ran
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild data/clean from data/raw.")
+    parser.add_argument("stages", nargs="*", help="stage names to consider (default: all)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if inputs are unchanged")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - {stage.name for stage in STAGES}
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    ran = run_pipeline(args.stages, force=args.force, jobs=args.jobs)
+    if not ran:
+        print("Everything up to date.")
+
+
+if __name__ == "__main__":
+    main()
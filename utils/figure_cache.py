@@ -0,0 +1,92 @@
+"""Process-wide LRU cache of serialized plotly figures, shared by every session.
+
+A figure is keyed by its chart id, the widget selections it was built for and
+the versions of the datasets it reads, and stored as its plotly JSON. A repeat
+view, by any user, rebuilds the Figure from that JSON without validation instead
+of filtering data and adding traces again. Entries are evicted least recently
+used first once their total size exceeds MAX_BYTES.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+
+from utils.data_loader import dataset_version
+from utils.spans import span
+
+MAX_BYTES = 64 * 1024 * 1024
+
+# (chart id, selections, dataset versions) -> (figure JSON, its size in bytes),
+# least recently used first
+_cache = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+_max_bytes = MAX_BYTES
+
+
+def _store(key, spec):
+    # Sized once as the UTF-8 JSON, the bytes it would take on the wire
+    size = len(spec.encode("utf-8"))
+    with _lock:
+        if key in _cache:
+            _stats["bytes"] -= _cache.pop(key)[1]
+        _cache[key] = (spec, size)
+        _stats["bytes"] += size
+        # Evict from the cold end, but always keep the entry just added
+        _evict(keep=1)
+
+
+def _evict(keep):
+    while _stats["bytes"] > _max_bytes and len(_cache) > keep:
+        _, (_, size) = _cache.popitem(last=False)
+        _stats["bytes"] -= size
+        _stats["evictions"] += 1
+
+
+def cached_figure(chart_id, selections, datasets, build):
+    """Returns the figure for chart_id and the selections, calling build() only on a miss.
+
+    selections must be hashable and, with the versions of the named datasets,
+    identify the figure completely; build takes no arguments and returns a Figure.
+    """
+    key = (chart_id, tuple(selections), tuple(dataset_version(name) for name in datasets))
+    with _lock:
+        entry = _cache.get(key)
+        spec = None if entry is None else entry[0]
+        if spec is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+        else:
+            _stats["misses"] += 1
+
+    with span("figure", chart=chart_id, hit=spec is not None):
+        if spec is None:
+            # Built outside the lock; two sessions missing at once just both build
+            spec = build().to_json()
+            _store(key, spec)
+
+        # The JSON was produced by a validated Figure, so it is not validated again
+        return go.Figure(json.loads(spec), _validate=False)
+
+
+def set_max_bytes(max_bytes):
+    """Changes the size bound, evicting down to it right away."""
+    global _max_bytes
+    with _lock:
+        _max_bytes = max_bytes
+        _evict(keep=0)
+
+
+def cache_stats():
+    """Returns hit/miss/eviction counters, the cached bytes and the number of entries."""
+    with _lock:
+        return dict(_stats, entries=len(_cache), max_bytes=_max_bytes)
+
+
+def clear_cache():
+    """Drops every cached figure and resets the counters."""
+    with _lock:
+        _cache.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,246 @@
+"""Batch forecasting engine for the regional KPI and age-group death forecasts.
+
+Fits one damped-trend exponential smoothing model per (region, KPI) series of
+merged_TSA.csv and per age group of death_df.csv, fanning the fits out over a
+process pool, and writes the forecast CSVs the Prediction page reads.
+
+Fitted models are kept in the registry (utils/model_registry.py), so a rerun only
+refits series whose history changed; each entry also stores the series' forecast
+as written to the CSVs, which the Prediction page reads back.
+
+Usage: python -m utils.forecasting [--horizon 3] [--level 0.95] [--jobs N] [--refit] [--reconcile METHOD]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASETS, load_dataset, resolve_path
+from utils.kpi_cube import REGION_KPIS
+from utils.model_registry import fit_or_update, load_entry, save_forecast
+
+# Smoothing parameter grid searched for every series
+ALPHAS = np.linspace(0.05, 1.0, 20)
+BETA_RATIOS = np.linspace(0.0, 1.0, 11)
+PHIS = np.array([0.8, 0.9, 0.98, 1.0])
+
+
+class HoltForecaster:
+    """Damped additive-trend exponential smoothing fitted on log1p of a series.
+
+    Fitting evaluates the whole smoothing-parameter grid at once with NumPy;
+    prediction intervals come from the model's analytic h-step variance.
+    """
+
+    def __init__(self):
+        self.alpha = self.beta = self.phi = None
+        self.level = self.trend = None
+        self.sigma2 = None
+        self.n_obs = 0
+        self.sse = 0.0
+
+    @staticmethod
+    def _filter(y, alpha, beta, phi, level, trend):
+        sse = np.zeros(np.broadcast(alpha, beta, phi).shape)
+        for value in y:
+            pred = level + phi * trend
+            err = value - pred
+            sse = sse + err ** 2
+            level = pred + alpha * err
+            trend = phi * trend + beta * err
+        return sse, level, trend
+
+    def fit(self, y):
+        """Fits the series, choosing the parameters with the lowest one-step SSE."""
+        z = np.log1p(np.asarray(y, dtype=float))
+        if len(z) < 3:
+            raise ValueError("At least three observations are needed to fit a trend")
+
+        alpha, ratio, phi = np.meshgrid(ALPHAS, BETA_RATIOS, PHIS, indexing="ij")
+        alpha, phi = alpha.ravel(), phi.ravel()
+        beta = alpha * ratio.ravel()
+        sse, level, trend = self._filter(z[2:], alpha, beta, phi, z[1], z[1] - z[0])
+
+        best = int(np.argmin(sse))
+        self.alpha, self.beta, self.phi = float(alpha[best]), float(beta[best]), float(phi[best])
+        self.level, self.trend = float(level[best]), float(trend[best])
+        self.sse = float(sse[best])
+        self.n_obs = len(z)
+        self.sigma2 = self.sse / max(self.n_obs - 2, 1)
+        return self
+
+    def update(self, y_new):
+        """Warm-starts from the fitted state, filtering new observations with fixed parameters."""
+        z = np.log1p(np.asarray(y_new, dtype=float))
+        sse, level, trend = self._filter(z, self.alpha, self.beta, self.phi, self.level, self.trend)
+        self.level, self.trend = float(level), float(trend)
+        self.sse += float(sse)
+        self.n_obs += len(z)
+        self.sigma2 = self.sse / max(self.n_obs - 2, 1)
+        return self
+
+    def forecast(self, horizon, level=0.95):
+        """Returns (mean, lower, upper) arrays for the next `horizon` steps."""
+        steps = np.arange(1, horizon + 1)
+        damped = np.cumsum(self.phi ** steps)
+        z_mean = self.level + damped * self.trend
+
+        # Var(h) = sigma2 * (1 + sum_{j<h} c_j^2) with c_j = alpha + beta * (phi + ... + phi^j)
+        c = self.alpha + self.beta * damped[:-1]
+        variance = self.sigma2 * (1 + np.concatenate([[0.0], np.cumsum(c ** 2)]))
+        half_width = NormalDist().inv_cdf(0.5 + level / 2) * np.sqrt(variance)
+
+        return np.expm1(z_mean), np.expm1(z_mean - half_width), np.expm1(z_mean + half_width)
+
+
+def _fit_job(job):
+    key, years, values, horizon, level, refit = job
+    model, _ = fit_or_update(key, years, values, HoltForecaster, refit=refit)
+    mean, lower, upper = model.forecast(horizon, level)
+    return key, years[-1] + np.arange(1, horizon + 1), mean, lower, upper
+
+
+def stored_forecast(key):
+    """The forecast last published for a series, read from its registry entry on first use.
+
+    This is the forecast written to the CSVs, reconciled and with the run's horizon
+    and level. Returns (years, mean, lower, upper), or None if none was stored.
+    """
+    entry = load_entry(key)
+    return None if entry is None else entry.get("forecast")
+
+
+def region_jobs(df, kpi, horizon, level, refit=False):
+    """Builds one fit job per region of merged_TSA.csv for a KPI."""
+    jobs = []
+    for region in df["region"].unique():
+        series = df[df["region"] == region].sort_values("year")
+        jobs.append(((kpi, region), series["year"].to_numpy(dtype=int),
+                     series[kpi].to_numpy(dtype=float), horizon, level, refit))
+    return jobs
+
+
+def age_group_jobs(df, horizon, level, refit=False):
+    """Builds one fit job per age group of death_df.csv."""
+    jobs = []
+    for age_group in df["age_group"].unique():
+        series = df[df["age_group"] == age_group].sort_values("year")
+        jobs.append((("deaths", age_group), series["year"].dt.year.to_numpy(),
+                     series["deaths"].to_numpy(dtype=float), horizon, level, refit))
+    return jobs
+
+
+def run_fits(jobs, max_workers=None):
+    """Fits every job in a process pool and returns {key: (years, mean, lower, upper)}."""
+    chunksize = max(1, len(jobs) // (4 * (max_workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return {key: rest for key, *rest in pool.map(_fit_job, jobs, chunksize=chunksize)}
+
+
+def _forecast_dates(years):
+    # Predictions are stamped at the end of their year, actuals at the start
+    return pd.to_datetime([f"{year}-12-31" for year in years])
+
+
+def region_forecast_frame(df, kpi, results):
+    """Returns the Actual + Prediction rows in the offences/arrests_forecast.csv schema."""
+    frames = []
+    for region in df["region"].unique():
+        actuals = df[df["region"] == region].sort_values("year")
+        frames.append(pd.DataFrame({
+            "year": pd.to_datetime(actuals["year"].astype(int).astype(str), format="%Y"),
+            kpi: actuals[kpi].to_numpy(dtype=float),
+            "type": "Actual",
+            f"{kpi}_lower": np.nan,
+            f"{kpi}_upper": np.nan,
+            "region": region,
+        }))
+        years, mean, lower, upper = results[(kpi, region)]
+        frames.append(pd.DataFrame({
+            "year": _forecast_dates(years),
+            kpi: mean,
+            "type": "Prediction",
+            f"{kpi}_lower": lower,
+            f"{kpi}_upper": upper,
+            "region": region,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def deaths_forecast_frame(df, results):
+    """Returns the prediction rows in the deaths_forecast.csv schema."""
+    frames = []
+    for age_group in df["age_group"].unique():
+        years, mean, lower, upper = results[("deaths", age_group)]
+        frames.append(pd.DataFrame({
+            "year": _forecast_dates(years),
+            "forecast": mean,
+            "age_group": age_group,
+            "lower": lower,
+            "upper": upper,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_forecasts(horizon=3, level=0.95, max_workers=None, refit=False, reconcile="mint_shrink"):
+    """Fits every series and writes the forecast CSVs; returns their dataset names.
+
+    Unchanged series reuse their stored model and series that only gained new
+    years are warm-started, unless refit is set. With a reconcile method (see
+    utils/reconciliation.py), the regional forecasts are made to add up to a
+    national forecast, written to national_forecast.csv. Every series' final
+    forecast is also stored in its registry entry.
+    """
+    merged = load_dataset("merged_tsa")
+    history = load_dataset("deaths_history")
+
+    jobs = [job for kpi in REGION_KPIS for job in region_jobs(merged, kpi, horizon, level, refit)]
+    jobs += age_group_jobs(history, horizon, level, refit)
+    results = run_fits(jobs, max_workers)
+
+    if reconcile:
+        from utils.reconciliation import NATIONAL_FORECAST, reconcile_results
+        national = reconcile_results(results, reconcile, horizon, level)
+        national.to_csv(resolve_path(NATIONAL_FORECAST), index=False, date_format="%Y-%m-%d")
+        print(f"national forecast ({reconcile}): {len(national)} rows -> {NATIONAL_FORECAST}")
+
+    # The page reads a series' forecast from the registry, so it gets what the CSVs get
+    for key, forecast in results.items():
+        save_forecast(key, *forecast)
+
+    outputs = {name: region_forecast_frame(merged, kpi, results) for kpi, name in REGION_KPIS.items()}
+    outputs["deaths_forecast"] = deaths_forecast_frame(history, results)
+    for name, frame in outputs.items():
+        path = DATASETS[name][0]
+        frame.to_csv(resolve_path(path), index=False, date_format="%Y-%m-%d")
+        print(f"{name}: {len(frame)} rows -> {path}")
+    return list(outputs)
+
+
+def main(argv=None):
+    from utils.reconciliation import METHODS
+
+    parser = argparse.ArgumentParser(description="Regenerate the forecast CSVs.")
+    parser.add_argument("--horizon", type=int, default=3, help="years to forecast past the last actual")
+    parser.add_argument("--level", type=float, default=0.95, help="prediction interval coverage")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--refit", action="store_true", help="refit every series from scratch instead of reusing stored models")
+    parser.add_argument("--reconcile", choices=METHODS + ["none"], default="mint_shrink",
+                        help="how the regional forecasts are made to add up to the national one")
+    args = parser.parse_args(argv)
+
+    names = run_forecasts(args.horizon, args.level, args.jobs, refit=args.refit,
+                          reconcile=None if args.reconcile == "none" else args.reconcile)
+
+    from utils.columnar_store import build_store
+    build_store(names)
+
+
+if __name__ == "__main__":
+    # Run the imported module, so the models the registry pickles belong to
+    # utils.forecasting rather than to __main__, which the app cannot unpickle
+    from utils.forecasting import main as forecasting_main
+    forecasting_main()
@@ -0,0 +1,67 @@
+import os
+import threading
+
+import geopandas as gpd
+
+from utils.data_loader import resolve_path
+from utils.spans import span
+
+GEOJSON_PATH = "data/map/fi.json"
+
+# Simplification tolerances in degrees, finest first (0 keeps the source polygons)
+TOLERANCES = (0.0, 0.002, 0.01, 0.03)
+
+# Zoom level every map in the dashboard is rendered at
+DEFAULT_ZOOM = 5.4
+
+# path -> (mtime/size stamp, {tolerance: GeoDataFrame})
+_levels = {}
+_lock = threading.Lock()
+
+
+def simplify_geometry(geo_data, tolerance):
+    """Returns geo_data simplified by tolerance, in the units of its CRS."""
+    # Coverage simplification keeps shared borders identical between neighbouring
+    # regions; older geopandas only offers per-polygon topology preservation
+    if hasattr(geo_data.geometry, "simplify_coverage"):
+        simplified = geo_data.geometry.simplify_coverage(tolerance)
+    else:
+        simplified = geo_data.geometry.simplify(tolerance, preserve_topology=True)
+    return geo_data.set_geometry(simplified)
+
+
+def _load_levels(path):
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        entry = _levels.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        with span("read_file", file=os.path.basename(path)):
+            geo_data = gpd.read_file(path)
+        with span("simplify", levels=len(TOLERANCES)):
+            levels = {tol: geo_data if tol == 0 else simplify_geometry(geo_data, tol) for tol in TOLERANCES}
+        _levels[path] = (stamp, levels)
+        return levels
+
+
+def tolerance_for_zoom(zoom):
+    """Returns the coarsest tolerance that stays below half a screen pixel at the zoom."""
+    # A 256 px web-mercator tile spans 360 / 2**zoom degrees of longitude
+    half_pixel = 360.0 / (256 * 2 ** zoom) / 2
+    return max(tol for tol in TOLERANCES if tol <= half_pixel)
+
+
+def load_geometry(tolerance=0.0, path=GEOJSON_PATH):
+    """Returns the Finland regions simplified at one of the precomputed TOLERANCES."""
+    levels = _load_levels(resolve_path(path))
+    if tolerance not in levels:
+        raise ValueError(f"tolerance must be one of {TOLERANCES}, got {tolerance}")
+    # Callers add columns to the frame, so hand out a copy of the cached one
+    return levels[tolerance].copy()
+
+
+def geometry_for_zoom(zoom=DEFAULT_ZOOM, path=GEOJSON_PATH):
+    """Returns the Finland regions at the detail level suited to a folium zoom."""
+    return load_geometry(tolerance_for_zoom(zoom), path)
@@ -0,0 +1,477 @@
+"""Downloads the source tables into data/raw, adding only the years it lacks.
+
+`fetch` requests every configured table concurrently: the Statistics Finland
+PxWeb tables 12d9 (drug-related deaths) and 13ex (reported drug crimes) as
+JSON-stat, and the Sotkanet indicators as CSV. All requests share one pooled
+HTTP session and carry the ETag / Last-Modified of the previous download, so a
+table the server reports unchanged (304) is not downloaded again. Responses are
+streamed to a file next to the raw store and merged from there: years already
+in a raw file are left as they are, new years are appended in the file's own
+layout. Run `python -m utils.etl` afterwards to rebuild data/clean.
+
+`mock` serves the same tables from a raw directory, in the formats and with the
+validators of the real APIs, so fetching can be exercised offline.
+
+Usage: python -m utils.ingest fetch [--base-url URL] [--raw-dir DIR] [table ...]
+       python -m utils.ingest mock [--port 8766] [--raw-dir DIR] [--extra-years N]
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.data_loader import resolve_path
+
+RAW_DIR = "data/raw"
+STATE_PATH = "data/ingest_state.json"
+
+# Source -> base URL of its API; overridden as a whole when fetching from a mock
+SOURCES = {"pxweb": "https://pxdata.stat.fi", "sotkanet": "https://sotkanet.fi"}
+
+# Parallel downloads, which is also the size of the connection pool
+CONCURRENCY = 4
+CHUNK_SIZE = 1 << 16
+TIMEOUT = 60
+
+# First year requested from Sotkanet; its API wants the years listed
+SOTKANET_FIRST_YEAR = 1990
+
+# layout is how the raw file is arranged: "year_columns" (a label column and one
+# column per year, with title and note rows around), "year_rows" (a year column
+# and one column per label) or "sotkanet" (one ';'-separated row per area and year).
+# year_dim and by_dim name the JSON-stat dimensions that become years and labels.
+Table = namedtuple("Table", ["name", "source", "path", "query", "raw", "layout", "year_dim", "by_dim"])
+
+
+def _pxweb_query(**selections):
+    # Years are always requested in full; only missing ones are merged
+    query = [{"code": "Vuosi", "selection": {"filter": "all", "values": ["*"]}}]
+    query += [{"code": code, "selection": {"filter": "item", "values": values}}
+              for code, values in selections.items()]
+    return {"query": query, "response": {"format": "json-stat2"}}
+
+
+def _sotkanet_query(indicator):
+    years = range(SOTKANET_FIRST_YEAR, date.today().year + 1)
+    return [("indicator", indicator), ("genders", "total")] + [("years", year) for year in years]
+
+
+TABLES = [
+    Table("deaths", "pxweb", "/PxWeb/api/v1/en/StatFin/ksyyt/statfin_ksyyt_pxt_12d9.px",
+          _pxweb_query(Sukupuoli=["SSS"], Tiedot=["kuolleet"]),
+          "Drug_related_Deaths.csv", "year_columns", "Vuosi", "Ikä"),
+    Table("drug_crimes", "pxweb", "/PxWeb/api/v1/fi/StatFin/rpk/statfin_rpk_pxt_13ex.px",
+          _pxweb_query(Rikosryhma=["SSS_2001"], Tiedot=["rikokset_lkm"]),
+          "Reported_drug_crimes_by_regions.csv", "year_rows", "Vuosi", "Alue"),
+    Table("rehabilitation", "sotkanet", "/rest/1.1/csv", _sotkanet_query(2148),
+          "Rehabilitation.csv", "sotkanet", None, None),
+    Table("youth_clinic", "sotkanet", "/rest/1.1/csv", _sotkanet_query(2120),
+          "Youth_clinic.csv", "sotkanet", None, None),
+]
+TABLES_BY_NAME = {table.name: table for table in TABLES}
+
+
+def load_state(path=STATE_PATH):
+    path = resolve_path(path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_state(state, path=STATE_PATH):
+    with open(resolve_path(path), "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2, sort_keys=True, ensure_ascii=False)
+        file.write("\n")
+
+
+# Reading the downloaded tables
+
+def _number(value):
+    # Counts are written without a decimal point, missing values as empty cells
+    if pd.isna(value):
+        return ""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def read_jsonstat(path, year_dim, by_dim):
+    """Reads a JSON-stat 2.0 dataset into a year x label frame.
+
+    Every dimension other than year_dim and by_dim must have a single category.
+    """
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+
+    labels = []
+    for dim in data["id"]:
+        category = data["dimension"][dim]["category"]
+        index = category.get("index")
+        codes = sorted(index, key=index.get) if isinstance(index, dict) else index or list(category["label"])
+        labels.append([category.get("label", {}).get(code, code) for code in codes])
+
+    values = data["value"]
+    if isinstance(values, dict):
+        # Sparse form: position -> value
+        dense = [None] * len(pd.MultiIndex.from_product(labels))
+        for pos, value in values.items():
+            dense[int(pos)] = value
+        values = dense
+
+    series = pd.Series(values, index=pd.MultiIndex.from_product(labels, names=data["id"]), dtype=float)
+    others = [dim for dim in data["id"] if dim not in (year_dim, by_dim)]
+    if any(len(series.index.unique(dim)) > 1 for dim in others):
+        raise ValueError(f"{path}: dimensions {others} must be narrowed to one category")
+    frame = series.droplevel(others).unstack(by_dim)
+    frame.index = frame.index.astype(int)
+    return frame
+
+
+def read_sotkanet(path):
+    """Returns the lines of a Sotkanet CSV download that hold data, with their area and year."""
+    rows = []
+    with open(path, encoding="utf-8-sig") as file:
+        for line in file:
+            line = line.rstrip("\r\n")
+            fields = next(csv.reader([line], delimiter=";"), [])
+            # Skips the header and blank lines
+            if len(fields) > 5 and fields[5].isdigit():
+                rows.append((fields[2], int(fields[5]), line))
+    return rows
+
+
+# Merging into the raw files; existing lines are never rewritten
+
+def _read_lines(path):
+    with open(path, encoding="utf-8-sig") as file:
+        return file.read().splitlines()
+
+
+def _write_lines(path, lines):
+    # The raw files are Excel exports with a byte order mark
+    with open(path, "w", encoding="utf-8-sig", newline="") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def merge_year_columns(path, frame):
+    """Appends a column per new year to a label x year table; returns the years added."""
+    lines = _read_lines(path)
+    rows = list(csv.reader(lines))
+    # The header is the first row with an empty label cell followed by years
+    header = next(pos for pos, row in enumerate(rows) if len(row) > 1 and not row[0] and row[1].isdigit())
+    have = {int(cell) for cell in rows[header][1:] if cell}
+    new = [year for year in sorted(frame.index) if year not in have]
+    if not new:
+        return []
+
+    for pos, row in enumerate(rows):
+        if pos == header:
+            cells = [f'"{year}"' for year in new]
+        elif row and pos > header and row[0] in frame.columns:
+            cells = [_number(frame.at[year, row[0]]) for year in new]
+        else:
+            # Title, note and unknown rows keep their shape
+            cells = [""] * len(new)
+        lines[pos] += "," + ",".join(cells)
+    _write_lines(path, lines)
+    return new
+
+
+def merge_year_rows(path, frame):
+    """Appends a row per new year to a year x label table; returns the years added."""
+    lines = _read_lines(path)
+    columns = next(csv.reader(lines[:1]))
+    have = {int(row[0]) for row in csv.reader(lines[1:]) if row and row[0].isdigit()}
+    new = [year for year in sorted(frame.index) if year not in have]
+    for year in new:
+        cells = [_number(frame.at[year, label]) if label in frame.columns else "" for label in columns[1:]]
+        lines.append(",".join([str(year)] + cells))
+    if new:
+        _write_lines(path, lines)
+    return new
+
+
+def merge_sotkanet(path, rows):
+    """Appends the download's lines for new years and known areas; returns the years added."""
+    existing = read_sotkanet(path)
+    areas = {area for area, _, _ in existing}
+    have = {year for _, year, _ in existing}
+    added = [(year, line) for area, year, line in rows if area in areas and year not in have]
+    if not added:
+        return []
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+    with open(path, "a", encoding="utf-8", newline="") as file:
+        if text and not text.endswith("\n"):
+            file.write("\n")
+        file.write("".join(line + "\n" for _, line in added))
+    return sorted({year for year, _ in added})
+
+
+def merge_download(table, download, raw_path):
+    if table.layout == "sotkanet":
+        return merge_sotkanet(raw_path, read_sotkanet(download))
+    frame = read_jsonstat(download, table.year_dim, table.by_dim)
+    if table.layout == "year_columns":
+        return merge_year_columns(raw_path, frame)
+    return merge_year_rows(raw_path, frame)
+
+
+# Fetching
+
+def make_session(pool_size=CONCURRENCY):
+    """One keep-alive session for all downloads, with a connection pool per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(SOURCES), pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _download(session, table, url, validators, part_path):
+    # Runs in a worker thread; returns the new validators, or None when unchanged
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    if table.source == "pxweb":
+        response = session.post(url, json=table.query, headers=headers, stream=True, timeout=TIMEOUT)
+    else:
+        response = session.get(url, params=table.query, headers=headers, stream=True, timeout=TIMEOUT)
+    with response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        with open(part_path, "wb") as file:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                file.write(chunk)
+        return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+
+async def _fetch_table(session, semaphore, table, base_url, raw_dir, state):
+    raw_path = os.path.join(raw_dir, table.raw)
+    url = (base_url or SOURCES[table.source]).rstrip("/") + table.path
+    part_path = raw_path + ".part"
+    # Validators only apply to a raw file that still holds what they describe
+    validators = state.get(table.name, {}) if os.path.exists(raw_path) else {}
+
+    async with semaphore:
+        fresh = await asyncio.to_thread(_download, session, table, url, validators, part_path)
+    if fresh is None:
+        return table.name, None
+    try:
+        added = merge_download(table, part_path, raw_path)
+    finally:
+        os.remove(part_path)
+    state[table.name] = fresh
+    return table.name, added
+
+
+async def fetch_tables(tables, base_url=None, raw_dir=RAW_DIR, state=None, concurrency=CONCURRENCY):
+    """Fetches the tables concurrently; returns {name: years added}, None for unchanged tables.
+
+    state holds each table's validators and is updated in place for the tables downloaded.
+    """
+    state = {} if state is None else state
+    semaphore = asyncio.Semaphore(concurrency)
+    with make_session(concurrency) as session:
+        results = await asyncio.gather(*(
+            _fetch_table(session, semaphore, table, base_url, resolve_path(raw_dir), state) for table in tables))
+    return dict(results)
+
+
+def fetch(names=None, base_url=None, raw_dir=RAW_DIR, state_path=STATE_PATH, concurrency=CONCURRENCY):
+    """Fetches the named tables (default: all) and records their validators."""
+    tables = [table for table in TABLES if not names or table.name in names]
+    state = load_state(state_path)
+    results = asyncio.run(fetch_tables(tables, base_url, raw_dir, state, concurrency))
+    save_state(state, state_path)
+    return results
+
+
+# Mock server
+
+def _jsonstat(frame, table):
+    # year x label frame -> JSON-stat 2.0, with the other queried dimensions as single categories
+    dims = {table.year_dim: [str(year) for year in frame.index], table.by_dim: [str(label) for label in frame.columns]}
+    for item in table.query["query"]:
+        if item["code"] != table.year_dim:
+            dims[item["code"]] = item["selection"]["values"]
+    ids = list(dims)
+    values = frame.to_numpy().ravel()
+    return {
+        "class": "dataset",
+        "version": "2.0",
+        "id": ids,
+        "size": [len(codes) for codes in dims.values()],
+        "dimension": {dim: {"label": dim, "category": {
+            "index": {code: pos for pos, code in enumerate(codes)},
+            "label": {code: code for code in codes},
+        }} for dim, codes in dims.items()},
+        "value": [None if pd.isna(value) else float(value) for value in values],
+    }
+
+
+def _raw_frame(table, raw_path):
+    # The raw file read back as a year x label frame
+    if table.layout == "year_columns":
+        rows = list(csv.reader(_read_lines(raw_path)))
+        header = next(pos for pos, row in enumerate(rows) if len(row) > 1 and not row[0] and row[1].isdigit())
+        years = [int(cell) for cell in rows[header][1:] if cell]
+        data = {row[0]: pd.to_numeric(pd.Series(row[1:len(years) + 1]), errors="coerce").to_numpy()
+                for row in rows[header + 1:] if row and any(cell.isdigit() for cell in row[1:])}
+        return pd.DataFrame(data, index=years)
+    frame = pd.read_csv(raw_path, encoding="utf-8-sig", index_col=0)
+    frame.index = frame.index.astype(int)
+    return frame
+
+
+def mock_body(table, raw_dir=RAW_DIR, extra_years=0):
+    """Response body the mock serves for a table: its raw file, plus extra_years copies of the last year."""
+    raw_path = os.path.join(resolve_path(raw_dir), table.raw)
+    if table.layout == "sotkanet":
+        rows = read_sotkanet(raw_path)
+        last = max(year for _, year, _ in rows)
+        lines = [line for _, _, line in rows]
+        for extra in range(1, extra_years + 1):
+            lines += [re.sub(rf";{last};", f";{last + extra};", line, count=1)
+                      for _, year, line in rows if year == last]
+        return ("\n".join(lines) + "\n").encode("utf-8"), "text/csv; charset=utf-8"
+
+    frame = _raw_frame(table, raw_path)
+    last = frame.index.max()
+    for extra in range(1, extra_years + 1):
+        frame.loc[last + extra] = frame.loc[last]
+    return json.dumps(_jsonstat(frame, table)).encode("utf-8"), "application/json; charset=utf-8"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Answers the PxWeb and Sotkanet requests of TABLES from a raw directory."""
+
+    raw_dir = RAW_DIR
+    extra_years = 0
+    last_modified = formatdate(usegmt=True)
+    _bodies = {}
+    _lock = threading.Lock()
+
+    def _table(self, method):
+        url = urlparse(self.path)
+        if method == "POST":
+            return next((t for t in TABLES if t.source == "pxweb" and t.path == url.path), None)
+        indicator = parse_qs(url.query).get("indicator", [None])[0]
+        return next((t for t in TABLES if t.source == "sotkanet" and t.path == url.path
+                     and str(dict(t.query)["indicator"]) == indicator), None)
+
+    def _respond(self, method):
+        if method == "POST":
+            # The query is read but not applied; the mock always answers with the full table
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        table = self._table(method)
+        if table is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        with self._lock:
+            if table.name not in self._bodies:
+                self._bodies[table.name] = mock_body(table, self.raw_dir, self.extra_years)
+            body, content_type = self._bodies[table.name]
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def mock_server(port=8766, host="127.0.0.1", raw_dir=RAW_DIR, extra_years=0):
+    """Returns a mock PxWeb/Sotkanet server (not yet started) for the tables in raw_dir."""
+    handler = type("Handler", (MockHandler,), {
+        "raw_dir": raw_dir, "extra_years": extra_years, "_bodies": {}, "_lock": threading.Lock()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch the source tables into data/raw, or serve a mock of their APIs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = commands.add_parser("fetch", help="download new years of the source tables")
+    fetch_parser.add_argument("tables", nargs="*", help="table names to fetch (default: all)")
+    fetch_parser.add_argument("--base-url", default=None, help="fetch every table from this server instead")
+    fetch_parser.add_argument("--raw-dir", default=RAW_DIR, help=f"raw store to update (default: {RAW_DIR})")
+    fetch_parser.add_argument("--state", default=STATE_PATH, help=f"validator file (default: {STATE_PATH})")
+    fetch_parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="parallel downloads")
+
+    mock_parser = commands.add_parser("mock", help="serve the tables from a raw directory")
+    mock_parser.add_argument("--port", type=int, default=8766)
+    mock_parser.add_argument("--raw-dir", default=RAW_DIR, help=f"tables to serve (default: {RAW_DIR})")
+    mock_parser.add_argument("--extra-years", type=int, default=0,
+                             help="append this many copies of each table's last year")
+    args = parser.parse_args(argv)
+
+    if args.command == "mock":
+        server = mock_server(args.port, raw_dir=args.raw_dir, extra_years=args.extra_years)
+        print(f"Serving mock PxWeb and Sotkanet APIs on http://127.0.0.1:{args.port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    unknown = set(args.tables) - set(TABLES_BY_NAME)
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    results = fetch(args.tables, args.base_url, args.raw_dir, args.state, args.concurrency)
+    for name, added in results.items():
+        if added is None:
+            print(f"{name}: unchanged")
+        elif added:
+            print(f"{name}: added {', '.join(map(str, added))}")
+        else:
+            print(f"{name}: no new years")
+    print(f"Fetched {len(results)} table(s) in {time.perf_counter() - start:.1f}s")
+    if any(results.values()):
+        print("Run python -m utils.etl to rebuild data/clean.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Dense region x year x KPI x series cube of every regional fact the dashboard shows.
+
+The cube is built once per data version from merged_TSA.csv, the offences and
+arrests forecasts and the reported drug usage table. Charts, tables and maps then
+slice it by label (dict lookups into a NumPy array) instead of filtering the
+DataFrames with boolean masks on every rerun.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import load_dataset, dataset_version
+from utils.region_matrix import RegionYearMatrix
+from utils.regions import FINNISH_NAMES, REGIONS, region_code, region_codes
+from utils.spans import timed
+
+# KPI columns of merged_TSA.csv; the CSV also carries its old index as "Unnamed: 0"
+MERGED_KPIS = ["arrests", "rehab", "clinic", "population", "unemployment_rate", "forign_count", "offences"]
+
+# KPIs of merged_TSA.csv forecast per region, and the dataset each is written to
+REGION_KPIS = {"offences": "offences_forecast", "arrests": "arrests_forecast"}
+
+# Series axis: observed values, then the forecast with its interval bounds
+SERIES = ["actual", "prediction", "lower", "upper"]
+
+# Datasets the cube is built from; a new version of any of them rebuilds it
+CUBE_DATASETS = ["merged_tsa", "drug_usage_by_regions", *REGION_KPIS.values()]
+
+# Scale of the per-capita view, and the unit merged_TSA counts population in
+PER_CAPITA = 100_000
+POPULATION_UNIT = 1_000
+
+_cubes = {}
+_lock = threading.Lock()
+
+
+class KPICube:
+    """Region x year x KPI x series array with label lookups on every axis.
+
+    Regions follow the canonical region table, so a region's row is its region
+    code. Missing facts are NaN.
+    """
+
+    def __init__(self, years, kpis, values):
+        self.regions = list(FINNISH_NAMES)
+        self.years = np.asarray(years)
+        self.kpis = list(kpis)
+        self.series_types = list(SERIES)
+        self.values = values
+        self._year_pos = {int(year): pos for pos, year in enumerate(self.years)}
+        self._kpi_pos = {kpi: pos for pos, kpi in enumerate(self.kpis)}
+        self._series_pos = {name: pos for pos, name in enumerate(SERIES)}
+        self._views = {}
+        self._views_lock = threading.Lock()
+
+    def _region_index(self, region):
+        if region is None:
+            return slice(None)
+        code = region_code(region)
+        if code < 0:
+            raise KeyError(f"Unknown region {region!r}")
+        return code
+
+    def _index(self, positions, label, axis):
+        if label is None:
+            return slice(None)
+        try:
+            return positions[int(label) if axis == "year" else label]
+        except KeyError:
+            raise KeyError(f"Unknown {axis} {label!r}") from None
+
+    def get(self, region=None, year=None, kpi=None, series="actual"):
+        """Returns the values at the given labels; None keeps the whole axis (a view, not a copy)."""
+        return self.values[self._region_index(region),
+                           self._index(self._year_pos, year, "year"),
+                           self._index(self._kpi_pos, kpi, "KPI"),
+                           self._index(self._series_pos, series, "series")]
+
+    def series(self, region, kpi, series="actual"):
+        """Returns (years, values) of one region's KPI series, limited to the years it has."""
+        values = self.get(region, kpi=kpi, series=series)
+        present = ~np.isnan(values)
+        return self.years[present], values[present]
+
+    def regions_with(self, kpi, series="actual"):
+        """Regions with at least one value of the KPI series, in region code order."""
+        present = ~np.isnan(self.get(kpi=kpi, series=series)).all(axis=1)
+        return [region for region, has in zip(self.regions, present) if has]
+
+    def years_with(self, kpi, series="actual"):
+        """Years with at least one region's value of the KPI series."""
+        present = ~np.isnan(self.get(kpi=kpi, series=series)).all(axis=0)
+        return [int(year) for year in self.years[present]]
+
+    def matrix(self, kpi, geometry_names, series="actual"):
+        """Region x year matrix of one KPI series, rows aligned to geometry_names.
+
+        Only the years the KPI has values for are kept; geometry names that are not
+        regions get an all-NaN row.
+        """
+        values = self.get(kpi=kpi, series=series)
+        years = ~np.isnan(values).all(axis=0)
+        # An all-NaN trailing row serves the unknown names (code -1)
+        table = np.vstack([values[:, years], np.full((1, years.sum()), np.nan)])
+        return RegionYearMatrix(geometry_names, self.years[years], table[region_codes(geometry_names)])
+
+    def table(self, region, kpi, forecast=None):
+        """Actual and predicted rows of one region's KPI with the interval bounds, by year.
+
+        Columns are year, region, type, <kpi>, <kpi>_lower and <kpi>_upper, as in the
+        forecast CSVs. forecast, a (years, mean, lower, upper) tuple, replaces the
+        cube's predictions.
+        """
+        if forecast is not None:
+            years, actuals = self.series(region, kpi)
+            forecast_years, mean, lower, upper = forecast
+            no_bounds = np.full(len(years), np.nan)
+            return pd.DataFrame({
+                "year": np.concatenate([years, forecast_years]),
+                "region": self.regions[self._region_index(region)],
+                "type": ["Actual"] * len(years) + ["Prediction"] * len(forecast_years),
+                kpi: np.concatenate([actuals, mean]),
+                f"{kpi}_lower": np.concatenate([no_bounds, lower]),
+                f"{kpi}_upper": np.concatenate([no_bounds, upper]),
+            })
+
+        block = self.get(region, kpi=kpi, series=None)
+        actual, predicted = ~np.isnan(block[:, 0]), ~np.isnan(block[:, 1])
+        # A year with a forecast shows as a prediction, as the forecast CSVs list them
+        rows = actual | predicted
+        return pd.DataFrame({
+            "year": self.years[rows],
+            "region": self.regions[self._region_index(region)],
+            "type": np.where(predicted[rows], "Prediction", "Actual"),
+            kpi: np.where(predicted, block[:, 1], block[:, 0])[rows],
+            f"{kpi}_lower": block[rows, 2],
+            f"{kpi}_upper": block[rows, 3],
+        })
+
+    def view(self, name):
+        """Returns a derived cube, computed on first use and kept with this cube.
+
+        "change": difference from the previous year of the same series (predictions
+        are compared with the previous year's actual where that year has no forecast).
+        "per_capita": values per 100 000 inhabitants of the year's population.
+        """
+        with self._views_lock:
+            cube = self._views.get(name)
+            if cube is None:
+                cube = self._views[name] = KPICube(self.years, self.kpis, _VIEWS[name](self))
+            return cube
+
+
+def _change_view(cube):
+    values = cube.values
+    change = np.full_like(values, np.nan)
+    change[:, 1:] = values[:, 1:] - values[:, :-1]
+    # The first forecast year follows an actual, not a prediction
+    previous_actual = np.repeat(values[:, :-1, :, :1], 3, axis=3)
+    first_forecast = np.isnan(change[:, 1:, :, 1:])
+    change[:, 1:, :, 1:][first_forecast] = (values[:, 1:, :, 1:] - previous_actual)[first_forecast]
+    return change
+
+
+def _per_capita_view(cube):
+    # Forecast years have no population yet; they use the latest known one
+    population = pd.DataFrame(cube.get(kpi="population")).T.ffill().T.to_numpy()
+    return cube.values / (population[:, :, None, None] * POPULATION_UNIT) * PER_CAPITA
+
+
+_VIEWS = {"change": _change_view, "per_capita": _per_capita_view}
+
+
+@timed()
+def build_kpi_cube(merged, drug_usage, forecasts):
+    """Builds the cube from merged_TSA, the wide drug usage table and {kpi: forecast frame}."""
+    kpis = MERGED_KPIS + ["drug_usage"]
+    kpi_pos = {kpi: pos for pos, kpi in enumerate(kpis)}
+
+    forecast_years = {kpi: df["year"].dt.year.to_numpy() for kpi, df in forecasts.items()}
+    years = np.unique(np.concatenate([merged["year"].to_numpy(), drug_usage["year"].to_numpy(),
+                                      *forecast_years.values()]).astype(int))
+    values = np.full((len(REGIONS), len(years), len(kpis), len(SERIES)), np.nan)
+
+    # merged_TSA: every KPI column of a row lands in one scatter
+    codes = region_codes(merged["region"])
+    year_pos = np.searchsorted(years, merged["year"].to_numpy())
+    known = codes >= 0
+    values[codes[known, None], year_pos[known, None], np.arange(len(MERGED_KPIS)), 0] = \
+        merged.loc[known, MERGED_KPIS].to_numpy(dtype=float)
+
+    # Reported drug usage is wide, one column per region
+    codes = region_codes(drug_usage.columns)
+    region_columns = np.flatnonzero(codes >= 0)
+    year_pos = np.searchsorted(years, drug_usage["year"].to_numpy())
+    values[codes[region_columns, None], year_pos, kpi_pos["drug_usage"], 0] = \
+        drug_usage.iloc[:, region_columns].to_numpy(dtype=float).T
+
+    # Forecast frames contribute their prediction rows; their actual rows repeat merged_TSA
+    for kpi, df in forecasts.items():
+        rows = (df["type"] == "Prediction").to_numpy()
+        codes = region_codes(df["region"])[rows]
+        year_pos = np.searchsorted(years, forecast_years[kpi][rows])
+        columns = [kpi, f"{kpi}_lower", f"{kpi}_upper"]
+        values[codes[:, None], year_pos[:, None], kpi_pos[kpi], [1, 2, 3]] = \
+            df.loc[rows, columns].to_numpy(dtype=float)
+
+    return KPICube(years, kpis, values)
+
+
+def cube_version():
+    """Key that changes whenever the cube is rebuilt, for caches of things derived from it."""
+    return tuple(dataset_version(name) for name in CUBE_DATASETS)
+
+
+def kpi_cube():
+    """Returns the cube for the current data, rebuilt only when a source dataset changes."""
+    key = cube_version()
+    with _lock:
+        cube = _cubes.get(key)
+        if cube is None:
+            # Only the latest data version is worth keeping around
+            _cubes.clear()
+            forecasts = {kpi: load_dataset(name) for kpi, name in REGION_KPIS.items()}
+            cube = _cubes[key] = build_kpi_cube(load_dataset("merged_tsa"),
+                                                load_dataset("drug_usage_by_regions"), forecasts)
+        return cube
+
@@ -1,34 +1,36 @@
-import pandas as pd
-import geopandas as gpd
+import threading
+from collections import OrderedDict
+
 import folium
 import branca
-from streamlit_folium import folium_static
-
-from utils.helpers import map_english_regions
-
-def find_high_increase_regions(df, kpi_column):
-    """Finds regions where predictions in 2025 are higher than actuals in 2024 and sorts them by increase."""
-    actuals_2024 = df[(df['year'].dt.year == 2023) & (df['type'] == 'Actual')].set_index('region')[kpi_column]
-    predictions_2025 = df[(df['year'].dt.year == 2025) & (df['type'] == 'Prediction')].set_index('region')[kpi_column]
-
-    increase_df = (predictions_2025 - actuals_2024).dropna()
-    high_regions = increase_df[increase_df > 0].sort_values(ascending=False).reset_index()
 
-    return high_regions
+from utils.kpi_cube import cube_version
+from utils.ranking import change_ranking
+from utils.regions import region_codes, to_finnish
+from utils.geometry import DEFAULT_ZOOM, geometry_for_zoom
+from utils.spans import timed
 
+# Rendered map pages kept per data version, most recently used last
+MAX_MAPS = 32
+_html_cache = OrderedDict()
+_lock = threading.Lock()
 
-def create_highrisk_map():
+@timed()
+def create_highrisk_map(base_year=2023, target_year=2025, measure="abs"):
     # Load GeoJSON data
-    geo_data = gpd.read_file("data/map/fi.json")
-    geo_data['name'] = geo_data['name'].apply(map_english_regions)
+    geo_data = geometry_for_zoom(DEFAULT_ZOOM)
+    geo_data['region_code'] = region_codes(geo_data['name'])
+    geo_data['name'] = to_finnish(geo_data['name'])
 
-    arrests_df = pd.read_csv("data/clean/arrests_forecast.csv", parse_dates=['year'])
-    high_arrests_regions = find_high_increase_regions(arrests_df, 'arrests')
+    high_arrests_regions = change_ranking().top_rising('arrests', base_year, target_year, measure=measure)
+    # Join on the integer region codes rather than the name strings
+    high_arrests_regions['region_code'] = region_codes(high_arrests_regions['region'])
+    high_arrests_regions = high_arrests_regions.drop(columns='region')
 
-    merged = geo_data.merge(high_arrests_regions, left_on="name", right_on="region", how="left")
+    merged = geo_data.merge(high_arrests_regions, on="region_code", how="left")
 
     # Creating a choropleth map
-    m = folium.Map(location=[64.0, 26.0], zoom_start=5.4)
+    m = folium.Map(location=[64.0, 26.0], zoom_start=DEFAULT_ZOOM)
     
     colormap = branca.colormap.LinearColormap(
         vmin=merged["arrests"].min(),  # Minimum arrests in the data
@@ -85,3 +87,24 @@ def create_highrisk_map():
     colormap.add_to(m)
 
     return m
+
+
+def highrisk_map_html(base_year=2023, target_year=2025, measure="abs"):
+    """Returns the high-risk map rendered to a standalone HTML page, built once per selection."""
+    key = (cube_version(), base_year, target_year, measure)
+    with _lock:
+        html = _html_cache.get(key)
+        if html is not None:
+            _html_cache.move_to_end(key)
+            return html
+
+    # The same page folium_static renders on every call
+    html = folium.Figure().add_child(create_highrisk_map(base_year, target_year, measure)).render()
+    with _lock:
+        # Maps of an older data version are never asked for again
+        for old in [old for old in _html_cache if old[0] != key[0]]:
+            del _html_cache[old]
+        _html_cache[key] = html
+        while len(_html_cache) > MAX_MAPS:
+            _html_cache.popitem(last=False)
+    return html
@@ -1,52 +1,22 @@
-import pandas as pd
-import geopandas as gpd
 import folium
 import branca
-from streamlit_folium import folium_static
 
-from utils.helpers import map_finnish_regions
+from utils.kpi_cube import kpi_cube
+from utils.geometry import DEFAULT_ZOOM, geometry_for_zoom
+from utils.spans import timed
 
+@timed()
 def create_folium_map(year):
     # Load GeoJSON data
-    geo_data = gpd.read_file("./data/map/fi.json")
+    geo_data = geometry_for_zoom(DEFAULT_ZOOM)
 
-    # Load the CSV data
-    df = pd.read_csv("./data/clean/Reported_drug_usage_by_regions.csv")
-    df.drop(columns=['Unnamed: 0', 'KOKO MAA'], inplace=True)
-
-    # Unpivot the dataframe
-    df_melted = pd.melt(df, id_vars=['year'], 
-                        value_vars=[
-                            "Uusimaa",
-                            "Varsinais-Suomi",
-                            "Satakunta",
-                            "Kanta-Häme",
-                            "Pirkanmaa",
-                            "Päijät-Häme",
-                            "Kymenlaakso",
-                            "Etelä-Karjala",
-                            "Etelä-Savo",
-                            "Pohjois-Savo",
-                            "Pohjois-Karjala",
-                            "Keski-Suomi",
-                            "Etelä-Pohjanmaa",
-                            "Pohjanmaa",
-                            "Keski-Pohjanmaa",
-                            "Pohjois-Pohjanmaa",
-                            "Kainuu",
-                            "Lappi",
-                            "Ahvenanmaa"
-                        ],
-                        var_name='region', value_name='value')
-
-    df_melted['region_en'] = df_melted['region'].apply(map_finnish_regions)
-
-    merged = geo_data.merge(df_melted, left_on="name", right_on="region_en", how="left")
-
-    year_data = merged[merged['year'] == year]
+    # Slice the year out of the KPI cube's region x year matrix; its rows follow
+    # the geometry order, so the values are filled in without a merge
+    matrix = kpi_cube().matrix("drug_usage", geo_data["name"])
+    year_data = geo_data.assign(value=matrix.year_values(year))
 
     # Creating a choropleth map
-    m = folium.Map(location=[64.0, 26.0], zoom_start=5.4)
+    m = folium.Map(location=[64.0, 26.0], zoom_start=DEFAULT_ZOOM)
     
     colormap = branca.colormap.LinearColormap(
         vmin=year_data["value"].min(),  # Minimum value in the data
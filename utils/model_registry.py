@@ -0,0 +1,143 @@
+"""On-disk registry of fitted forecasters, keyed by series identity and training data.
+
+When a series only gained new points at its end, the stored model is warm-started
+with those points instead of being refitted; any other change to the history
+triggers a full refit. Next to its model, an entry holds the forecast published
+for the series in the last run, after any reconciliation. Entries are loaded
+lazily and kept in a small in-process LRU.
+"""
+import copy
+import hashlib
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.data_loader import resolve_path
+
+REGISTRY_DIR = "data/models"
+
+# Full refit after this many warm-started points, so parameters track the data
+MAX_WARM_STARTS = 3
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+_MAX_LOADED = 128
+
+
+def data_hash(years, values):
+    """Returns a hash of a series' training data."""
+    sha = hashlib.sha1()
+    sha.update(np.asarray(years, dtype=np.int64).tobytes())
+    sha.update(np.asarray(values, dtype=np.float64).tobytes())
+    return sha.hexdigest()
+
+
+def model_path(key):
+    """Returns the artifact path for a series key such as ("offences", "Uusimaa")."""
+    slug = re.sub(r"[^\w]+", "_", "__".join(map(str, key))).strip("_")
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(resolve_path(REGISTRY_DIR), f"{slug}-{digest}.pkl")
+
+
+def _read_entry(key):
+    path = model_path(key)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def load_entry(key):
+    """Returns the stored entry for a series, reading it from disk at most once."""
+    with _loaded_lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            return _loaded[key]
+
+    entry = _read_entry(key)
+    if entry is not None:
+        _remember(key, entry)
+    return entry
+
+
+def _remember(key, entry):
+    with _loaded_lock:
+        _loaded[key] = entry
+        _loaded.move_to_end(key)
+        while len(_loaded) > _MAX_LOADED:
+            _loaded.popitem(last=False)
+
+
+def save_entry(key, entry):
+    path = model_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so concurrent readers never see a partial pickle
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    _remember(key, entry)
+
+
+def fit_or_update(key, years, values, factory, refit=False):
+    """Returns a fitted model for the series, reusing or warm-starting a stored one.
+
+    factory() builds an unfitted model exposing fit(values) and update(new_values).
+    With refit, the stored model is replaced by a fresh fit. The returned status
+    is "cached", "updated" or "fitted".
+    """
+    years = np.asarray(years, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    digest = data_hash(years, values)
+
+    entry = None if refit else load_entry(key)
+    if entry is not None and entry["data_hash"] == digest:
+        return entry["model"], "cached"
+
+    n_old = 0 if entry is None else len(entry["years"])
+    appended = (entry is not None
+                and 0 < n_old < len(years)
+                and np.array_equal(entry["years"], years[:n_old])
+                and np.array_equal(entry["values"], values[:n_old])
+                and entry["warm_starts"] + len(years) - n_old <= MAX_WARM_STARTS)
+
+    if appended:
+        # The stored model is shared through the LRU, so the update works on a copy
+        # that only replaces it once it has been saved
+        model = copy.deepcopy(entry["model"]).update(values[n_old:])
+        warm_starts, status = entry["warm_starts"] + len(years) - n_old, "updated"
+    else:
+        model = factory().fit(values)
+        warm_starts, status = 0, "fitted"
+
+    save_entry(key, {
+        "key": key,
+        "years": years,
+        "values": values,
+        "data_hash": digest,
+        "warm_starts": warm_starts,
+        "model": model,
+    })
+    return model, status
+
+
+def save_forecast(key, years, mean, lower, upper):
+    """Stores the forecast published for a series in its entry, next to the model it came from."""
+    # Read from disk: the entry was just written by the worker process that fitted it
+    entry = _read_entry(key)
+    forecast = (np.asarray(years, dtype=np.int64),
+                *(np.asarray(array, dtype=np.float64) for array in (mean, lower, upper)))
+    sha = hashlib.sha1()
+    for array in forecast:
+        sha.update(array.tobytes())
+    save_entry(key, dict(entry, forecast=forecast, forecast_hash=sha.hexdigest()))
+
+
+def forecast_version(key):
+    """Returns a hash of a series' stored forecast, or None if none was stored."""
+    entry = load_entry(key)
+    return None if entry is None else entry.get("forecast_hash")
@@ -0,0 +1,127 @@
+"""Precomputed region change rankings over every KPI and pair of years.
+
+One vectorized pass over the KPI cube computes, for every region, KPI and
+(base year, target year) pair, how much the KPI changes: in absolute terms, in
+percent, and per 100 000 inhabitants. The regions are sorted once per pair, so
+"top-N rising regions for KPI X between years A and B" is a slice of the table.
+
+A year's value is its actual value where there is one, and the forecast otherwise,
+so an actual base year can be compared with a forecast target year.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.kpi_cube import cube_version, kpi_cube
+from utils.spans import timed
+
+# Change measures, with the labels the dashboard shows for them
+MEASURE_LABELS = {"abs": "Absolute", "pct": "Percent", "per_capita": "Per 100 000 inhabitants"}
+MEASURES = list(MEASURE_LABELS)
+
+_rankings = {}
+_lock = threading.Lock()
+
+
+class ChangeRanking:
+    """Change of every KPI between every pair of years, with regions presorted per pair."""
+
+    def __init__(self, regions, years, kpis, changes, order):
+        self.regions = list(regions)
+        self.years = np.asarray(years)
+        self.kpis = list(kpis)
+        # measure x region x base year x target year x KPI
+        self.changes = changes
+        # Region positions by decreasing change, NaN last, per (measure, base, target, KPI)
+        self.order = order
+        self._year_pos = {int(year): pos for pos, year in enumerate(self.years)}
+        self._kpi_pos = {kpi: pos for pos, kpi in enumerate(self.kpis)}
+        self._measure_pos = {measure: pos for pos, measure in enumerate(MEASURES)}
+
+    def _positions(self, kpi, base_year, target_year, measure):
+        if int(base_year) >= int(target_year):
+            raise ValueError(f"Base year {base_year} must come before target year {target_year}")
+        try:
+            return (self._measure_pos[measure], self._year_pos[int(base_year)],
+                    self._year_pos[int(target_year)], self._kpi_pos[kpi])
+        except KeyError as err:
+            raise ValueError(f"No ranking for {err.args[0]!r}") from None
+
+    def changes_between(self, kpi, base_year, target_year, measure="abs"):
+        """Returns every region's change of the KPI as a Series, NaN where a year is missing."""
+        m, b, t, k = self._positions(kpi, base_year, target_year, measure)
+        return pd.Series(self.changes[m, :, b, t, k], index=pd.Index(self.regions, name="region"), name=kpi)
+
+    def top_rising(self, kpi, base_year, target_year, n=None, measure="abs"):
+        """Returns the regions whose KPI rises between the years, largest increase first.
+
+        The frame has a region column and a column named after the KPI holding the change;
+        n limits it to the top n regions.
+        """
+        m, b, t, k = self._positions(kpi, base_year, target_year, measure)
+        order = self.order[m, :, b, t, k]
+        changes = self.changes[m, order, b, t, k]
+        # Sorted descending with NaN last, so the rising regions are a prefix
+        rising = int(np.count_nonzero(changes > 0))
+        if n is not None:
+            rising = min(rising, n)
+        return pd.DataFrame({
+            "region": [self.regions[pos] for pos in order[:rising]],
+            kpi: changes[:rising],
+        })
+
+    def to_frame(self):
+        """Long table of every defined change: measure, kpi, base_year, target_year, region, change, rank."""
+        m, r, b, t, k = np.nonzero(~np.isnan(self.changes))
+        keep = b < t
+        m, r, b, t, k = m[keep], r[keep], b[keep], t[keep], k[keep]
+        # Rank of a region is its position in the presorted order of its pair
+        ranks = np.empty_like(self.order)
+        np.put_along_axis(ranks, self.order, np.arange(len(self.regions))[None, :, None, None, None], axis=1)
+        return pd.DataFrame({
+            "measure": np.array(MEASURES)[m],
+            "kpi": np.array(self.kpis)[k],
+            "base_year": self.years[b],
+            "target_year": self.years[t],
+            "region": np.array(self.regions)[r],
+            "change": self.changes[m, r, b, t, k],
+            "rank": ranks[m, r, b, t, k] + 1,
+        })
+
+
+def _levels(cube):
+    # Actual value where there is one, the forecast otherwise; region x year x KPI
+    actual, prediction = cube.get(series="actual"), cube.get(series="prediction")
+    return np.where(np.isnan(actual), prediction, actual)
+
+
+@timed()
+def build_change_ranking(cube):
+    """Computes the changes and region order for every measure, KPI and pair of years."""
+    levels = _levels(cube)
+    per_capita = _levels(cube.view("per_capita"))
+
+    # [region, base, target, KPI] = value at target - value at base
+    base = levels[:, :, None, :]
+    absolute = levels[:, None, :, :] - base
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.where(base != 0, absolute / base * 100, np.nan)
+    per_capita = per_capita[:, None, :, :] - per_capita[:, :, None, :]
+    changes = np.stack([absolute, percent, per_capita])
+
+    # Sort regions by decreasing change once, NaN last
+    order = np.argsort(np.where(np.isnan(changes), np.inf, -changes), axis=1, kind="stable")
+    return ChangeRanking(cube.regions, cube.years, cube.kpis, changes, order.astype(np.int8))
+
+
+def change_ranking():
+    """Returns the ranking table for the current data, rebuilt only when the KPI cube is."""
+    key = cube_version()
+    with _lock:
+        ranking = _rankings.get(key)
+        if ranking is None:
+            # Only the latest data version is worth keeping around
+            _rankings.clear()
+            ranking = _rankings[key] = build_change_ranking(kpi_cube())
+        return ranking
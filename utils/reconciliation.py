@@ -0,0 +1,363 @@
+"""Coherent forecasts across the region hierarchy.
+
+The regional offences and arrests forecasts are fitted independently, so they
+do not add up to a national figure. This stage forecasts every node of the
+hierarchy (KOKO MAA, the regions, and for offences an "Other" node for
+Ahvenanmaa and offences not assigned to a region, which closes the gap to the
+KOKO MAA column of Reported_drug_usage_by_regions.csv) and maps the base
+forecasts to coherent ones, y~ = S G y^, with G from one of METHODS:
+
+    bottom_up    the regions' own forecasts, summed upwards
+    ols          G = (S'S)^-1 S'
+    mint_shrink  G = (S'W^-1 S)^-1 S'W^-1, W the shrunk covariance of the
+                 one-step in-sample errors (Schäfer-Strimmer shrinkage towards
+                 the diagonal)
+
+A hierarchy is any set of leaf paths from the top, so a municipality level is
+one more element per path. The summing matrix S is kept as its nonzero
+(node, leaf) pairs; all horizons are reconciled in one matrix product and the
+interval bounds are rescaled by the reconciled forecast variance,
+diag(S G Sigma_h G'S'), with Sigma_h built from the base intervals and the
+shrunk error correlation.
+
+python -m utils.forecasting runs this stage on its regional forecasts and
+writes the national rows to national_forecast.csv. This module's command line
+prints how the national and regional forecasts compare, or with --write
+reconciles the forecasts already in the offences/arrests CSVs, taken as the
+regions' base forecasts, and writes them back with national_forecast.csv.
+
+Usage: python -m utils.reconciliation [--method mint_shrink] [--horizon 3] [--level 0.95] [--write [--force]]
+"""
+import argparse
+import os
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.backtest import fit_batch, fitted_values, forecast_batch
+from utils.data_loader import DATASETS, load_dataset, resolve_path
+from utils.kpi_cube import REGION_KPIS
+from utils.spans import timed
+
+METHODS = ["bottom_up", "ols", "mint_shrink"]
+DEFAULT_METHOD = "mint_shrink"
+
+# Forecasts of the nodes above and beside the regions, written by utils.forecasting
+NATIONAL_FORECAST = DATASETS["national_forecast"][0]
+
+TOP = "KOKO MAA"
+OTHER = "Other"
+
+# KPIs with a published national total, as (dataset, column); the rest are
+# totalled from their regions
+NATIONAL_TOTALS = {"offences": ("drug_usage_by_regions", TOP)}
+
+# nodes: paths from the top, aggregates before the leaves they cover;
+# leaves: node positions of the bottom level; pairs: (node, leaf number) of
+# every nonzero of the summing matrix S
+Hierarchy = namedtuple("Hierarchy", ["nodes", "leaves", "pairs"])
+
+
+def build_hierarchy(paths):
+    """Builds the hierarchy of the given leaf paths, e.g. [("KOKO MAA", "Uusimaa"), ...]."""
+    paths = [tuple(path) for path in paths]
+    prefixes = {}
+    for path in paths:
+        for depth in range(1, len(path) + 1):
+            prefixes.setdefault(path[:depth], len(prefixes))
+    # Shallower nodes first, in the order they were first seen
+    nodes = sorted(prefixes, key=lambda node: (len(node), prefixes[node]))
+    position = {node: pos for pos, node in enumerate(nodes)}
+
+    pairs = [(position[path[:depth]], leaf) for leaf, path in enumerate(paths) for depth in range(1, len(path) + 1)]
+    return Hierarchy(nodes, np.array([position[path] for path in paths]), np.array(pairs).T)
+
+
+def node_names(hierarchy):
+    return [node[-1] for node in hierarchy.nodes]
+
+
+def aggregate(hierarchy, bottom):
+    """S @ bottom: every node's values from the leaves' (leaf, ...) values."""
+    out = np.zeros((len(hierarchy.nodes),) + bottom.shape[1:])
+    np.add.at(out, hierarchy.pairs[0], bottom[hierarchy.pairs[1]])
+    return out
+
+
+def summing_matrix(hierarchy):
+    """The dense (node, leaf) summing matrix S."""
+    matrix = np.zeros((len(hierarchy.nodes), len(hierarchy.leaves)))
+    matrix[hierarchy.pairs[0], hierarchy.pairs[1]] = 1.0
+    return matrix
+
+
+def shrinkage_estimate(errors):
+    """Schäfer-Strimmer shrinkage of the (time, node) errors' correlation towards the identity.
+
+    Returns (sd, scaled, shrinkage): the shrunk correlation is
+    shrinkage * I + (1 - shrinkage) * scaled'scaled / len(scaled), and W, the
+    shrunk covariance, is that scaled by sd on both sides.
+    """
+    errors = errors[~np.isnan(errors).any(axis=1)]
+    n = len(errors)
+    sd = np.sqrt(np.maximum(np.mean(errors ** 2, axis=0), 1e-12))
+    scaled = errors / sd
+    correlation = scaled.T @ scaled / n
+
+    # Estimated variance of each sample correlation, off the diagonal only
+    variance = (scaled.T ** 2 @ scaled ** 2 - correlation ** 2 * n) / (n * (n - 1))
+    np.fill_diagonal(variance, 0.0)
+    np.fill_diagonal(correlation, 0.0)
+    denominator = np.sum(correlation ** 2)
+    shrinkage = 1.0 if denominator == 0 else float(np.clip(variance.sum() / denominator, 0.0, 1.0))
+    return sd, scaled, shrinkage
+
+
+def reconciliation_matrix(hierarchy, method, estimate=None):
+    """G, mapping base forecasts of every node to coherent leaf forecasts.
+
+    mint_shrink needs the errors' shrinkage_estimate().
+    """
+    summing = summing_matrix(hierarchy)
+    if method == "bottom_up":
+        g = np.zeros(summing.T.shape)
+        g[np.arange(len(hierarchy.leaves)), hierarchy.leaves] = 1.0
+        return g
+    if method == "ols":
+        return np.linalg.solve(summing.T @ summing, summing.T)
+    if method == "mint_shrink":
+        # W^-1 S with W = D (l I + c U U') D, U the scaled errors (node, year):
+        # by the Woodbury identity only a (year, year) system is solved, so
+        # adding nodes never costs a node x node solve
+        sd, scaled, shrinkage = estimate
+        # Unshrunk, W is singular whenever there are fewer years than nodes
+        shrinkage = max(shrinkage, 1e-6)
+        u = scaled.T
+        weighted = summing / sd[:, None]
+        c = (1 - shrinkage) / len(scaled)
+        if c > 0:
+            inner = np.linalg.solve(shrinkage / c * np.eye(u.shape[1]) + u.T @ u, u.T @ weighted)
+            weighted = (weighted - u @ inner) / shrinkage
+        weighted = weighted / sd[:, None]
+        return np.linalg.solve(summing.T @ weighted, weighted.T)
+    raise ValueError(f"Unknown reconciliation method {method!r}; expected one of {METHODS}")
+
+
+@timed()
+def reconcile(hierarchy, mean, lower, upper, errors, method=DEFAULT_METHOD, level=0.95):
+    """Reconciles (node, horizon) base forecasts and interval bounds of every node at once.
+
+    errors are the (time, node) one-step in-sample errors, used for W and for
+    the correlation of the base forecast errors. Returns (mean, lower, upper).
+    """
+    estimate = shrinkage_estimate(errors)
+    _, scaled_errors, shrinkage = estimate
+    g = reconciliation_matrix(hierarchy, method, estimate)
+    coherent = aggregate(hierarchy, g @ mean)
+
+    # Base forecast sd per node and horizon from the interval width; with the
+    # shrunk error correlation R, Var(S G e_h) = diag(B R B') for B = S G D_h.
+    # R is the identity plus a term of rank <= the number of years, so this
+    # takes (horizon, node, node) x (node, year) products rather than node^3 ones
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    sd = (upper - lower) / (2 * z)
+    scaled = aggregate(hierarchy, g)[None, :, :] * sd.T[:, None, :]
+    low_rank = scaled @ scaled_errors.T
+    coherent_sd = np.sqrt(shrinkage * np.sum(scaled ** 2, axis=-1)
+                          + (1 - shrinkage) * np.sum(low_rank ** 2, axis=-1) / len(scaled_errors)).T
+
+    # Each interval keeps its own (log-scale) asymmetry around the new mean
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(sd > 0, coherent_sd / sd, 1.0)
+    coherent_lower = np.maximum(coherent - (mean - lower) * ratio, 0.0)
+    coherent_upper = coherent + (upper - mean) * ratio
+    return coherent, coherent_lower, coherent_upper
+
+
+def kpi_hierarchy(kpi):
+    """Returns (hierarchy, years, node values) of one KPI: KOKO MAA over the merged_TSA regions.
+
+    Where the KPI has a published national total, an Other leaf holds what the
+    regions do not cover, so the top node matches that total.
+    """
+    merged = load_dataset("merged_tsa")
+    table = merged.pivot_table(index="region", columns="year", values=kpi, observed=True)
+    table = table.dropna(axis=1).astype(float)
+    regions = [str(region) for region in table.index]
+    years = table.columns.to_numpy(dtype=int)
+    bottom = table.to_numpy()
+
+    paths = [(TOP, region) for region in regions]
+    if kpi in NATIONAL_TOTALS:
+        dataset, column = NATIONAL_TOTALS[kpi]
+        national = load_dataset(dataset).set_index("year")[column].astype(float)
+        other = national.reindex(years).to_numpy() - bottom.sum(axis=0)
+        paths.append((TOP, OTHER))
+        bottom = np.vstack([bottom, np.maximum(np.nan_to_num(other), 0.0)])
+
+    hierarchy = build_hierarchy(paths)
+    return hierarchy, years, aggregate(hierarchy, bottom)
+
+
+def base_forecasts(values, horizon=3, level=0.95):
+    """Fits every node's series in one batch; returns (mean, lower, upper, errors).
+
+    The forecasts match HoltForecaster fitted afresh on each node; errors are
+    the (time, node) one-step in-sample errors on the original scale.
+    """
+    z = np.log1p(values)
+    fit = fit_batch(z, np.full(len(z), z.shape[1]))
+    mean, lower, upper = forecast_batch(fit, horizon, level)
+    return mean, lower, upper, (fitted_values(z, fit) - values).T
+
+
+def reconcile_kpi(kpi, method=DEFAULT_METHOD, horizon=3, level=0.95, base=None):
+    """Actuals and coherent forecasts of every node of a KPI's hierarchy, in the forecast CSV layout.
+
+    base optionally maps region names to (years, mean, lower, upper) forecasts
+    made elsewhere (the forecasting run's), used instead of the batch fit's for
+    those nodes. Rows carry the node's depth (0 for KOKO MAA).
+    """
+    hierarchy, years, values = kpi_hierarchy(kpi)
+    mean, lower, upper, errors = base_forecasts(values, horizon, level)
+    names = node_names(hierarchy)
+    for pos, name in enumerate(names):
+        if base and name in base:
+            _, mean[pos], lower[pos], upper[pos] = base[name]
+
+    mean, lower, upper = reconcile(hierarchy, mean, lower, upper, errors, method, level)
+    depths = [len(node) - 1 for node in hierarchy.nodes]
+    horizon_years = years[-1] + np.arange(1, horizon + 1)
+    actual = pd.DataFrame({
+        "year": np.tile(pd.to_datetime(years.astype(str), format="%Y"), len(names)),
+        kpi: values.ravel(),
+        "type": "Actual",
+        f"{kpi}_lower": np.nan,
+        f"{kpi}_upper": np.nan,
+        "region": np.repeat(names, len(years)),
+        "depth": np.repeat(depths, len(years)),
+    })
+    prediction = pd.DataFrame({
+        # Predictions are stamped at the end of their year, as in the forecast CSVs
+        "year": np.tile(pd.to_datetime([f"{year}-12-31" for year in horizon_years]), len(names)),
+        kpi: mean.ravel(),
+        "type": "Prediction",
+        f"{kpi}_lower": lower.ravel(),
+        f"{kpi}_upper": upper.ravel(),
+        "region": np.repeat(names, horizon),
+        "depth": np.repeat(depths, horizon),
+    })
+    return pd.concat([actual, prediction], ignore_index=True)
+
+
+def reconcile_results(results, method=DEFAULT_METHOD, horizon=3, level=0.95):
+    """Reconciles a forecasting run's regional results in place.
+
+    results is run_fits()'s {(kpi, region): (years, mean, lower, upper)}; the
+    regional forecasts are replaced by coherent ones. Returns the rows of the
+    nodes above and beside the regions (KOKO MAA, Other) as written to
+    NATIONAL_FORECAST.
+    """
+    frames = []
+    for kpi in REGION_KPIS:
+        base = {region: forecast for (key_kpi, region), forecast in results.items() if key_kpi == kpi}
+        frame = reconcile_kpi(kpi, method, horizon, level, base)
+
+        predictions = frame[(frame["type"] == "Prediction") & frame["region"].isin(base)]
+        for region, rows in predictions.groupby("region", sort=False):
+            results[(kpi, region)] = (results[(kpi, region)][0], rows[kpi].to_numpy(),
+                                      rows[f"{kpi}_lower"].to_numpy(), rows[f"{kpi}_upper"].to_numpy())
+
+        nodes = frame[~frame["region"].isin(base)]
+        frames.append(pd.DataFrame({
+            "year": nodes["year"],
+            "kpi": kpi,
+            "node": nodes["region"],
+            "value": nodes[kpi],
+            "type": nodes["type"],
+            "lower": nodes[f"{kpi}_lower"],
+            "upper": nodes[f"{kpi}_upper"],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def reconcile_forecast_csvs(method=DEFAULT_METHOD, level=0.95):
+    """Reconciles the regional predictions of the offences/arrests CSVs in place.
+
+    The CSVs' predictions are the regions' base forecasts; they are rewritten with
+    the coherent ones and the national rows go to NATIONAL_FORECAST. Returns the
+    names of the datasets written.
+    """
+    frames, results = {}, {}
+    for kpi, name in REGION_KPIS.items():
+        # Read as written rather than from the float32 columnar copy
+        frame = frames[name] = pd.read_csv(resolve_path(DATASETS[name][0]), **DATASETS[name][1])
+        predictions = frame[frame["type"] == "Prediction"]
+        for region, rows in predictions.groupby("region", sort=False):
+            results[(kpi, region)] = (rows["year"].dt.year.to_numpy(), rows[kpi].to_numpy(dtype=float),
+                                      rows[f"{kpi}_lower"].to_numpy(dtype=float),
+                                      rows[f"{kpi}_upper"].to_numpy(dtype=float))
+
+    horizon = len(next(iter(results.values()))[0])
+    national = reconcile_results(results, method, horizon, level)
+    national.to_csv(resolve_path(NATIONAL_FORECAST), index=False, date_format="%Y-%m-%d")
+
+    # Each region's prediction rows are rewritten in the order they were read
+    for (kpi, region), (_, mean, lower, upper) in results.items():
+        frame = frames[REGION_KPIS[kpi]]
+        rows = (frame["type"] == "Prediction") & (frame["region"] == region)
+        frame.loc[rows, [kpi, f"{kpi}_lower", f"{kpi}_upper"]] = np.column_stack([mean, lower, upper])
+    for name, frame in frames.items():
+        frame.to_csv(resolve_path(DATASETS[name][0]), index=False, date_format="%Y-%m-%d")
+    return list(frames)
+
+
+def national_forecast(kpi):
+    """Returns the stored national (KOKO MAA) forecast of a KPI in the regional table's columns."""
+    national = load_dataset("national_forecast")
+    rows = national[(national["kpi"] == kpi) & (national["node"] == TOP) & (national["type"] == "Prediction")]
+    return pd.DataFrame({
+        "year": rows["year"].dt.year.to_numpy(),
+        kpi: rows["value"].to_numpy(),
+        f"{kpi}_lower": rows["lower"].to_numpy(),
+        f"{kpi}_upper": rows["upper"].to_numpy(),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile the regional forecasts with the national total.")
+    parser.add_argument("--method", choices=METHODS, default=DEFAULT_METHOD, help="reconciliation method")
+    parser.add_argument("--horizon", type=int, default=3, help="years to forecast past the last actual")
+    parser.add_argument("--level", type=float, default=0.95, help="prediction interval coverage")
+    parser.add_argument("--write", action="store_true",
+                        help="reconcile the forecast CSVs in place and write national_forecast.csv")
+    parser.add_argument("--force", action="store_true", help="with --write, even if national_forecast.csv exists")
+    args = parser.parse_args(argv)
+
+    if args.write:
+        # Reconciling forecasts that already are reconciled would move them again
+        if os.path.exists(resolve_path(NATIONAL_FORECAST)) and not args.force:
+            parser.error(f"{NATIONAL_FORECAST} exists, so the forecast CSVs are already reconciled; "
+                         "regenerate them with python -m utils.forecasting or pass --force")
+        names = reconcile_forecast_csvs(args.method, args.level)
+        print(f"reconciled ({args.method}): {', '.join(names)}; national rows -> {NATIONAL_FORECAST}")
+
+        from utils.columnar_store import build_store
+        build_store(names)
+        return
+
+    for kpi in REGION_KPIS:
+        frame = reconcile_kpi(kpi, args.method, args.horizon, args.level)
+        frame = frame[frame["type"] == "Prediction"]
+        national = frame[frame["depth"] == 0]
+        regions = frame[frame["depth"] == 1].groupby("year")[kpi].sum()
+        print(f"{kpi} ({args.method}):")
+        for (_, row), region_total in zip(national.iterrows(), regions):
+            print(f"  {row['year'].year}  {TOP} {row[kpi]:9.1f} "
+                  f"[{row[f'{kpi}_lower']:9.1f}, {row[f'{kpi}_upper']:9.1f}]  regions {region_total:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import numpy as np
+
+
+class RegionYearMatrix:
+    """Dense region x year array whose row order follows the map geometry."""
+
+    def __init__(self, regions, years, values):
+        self.regions = list(regions)
+        self.years = np.asarray(years)
+        self.values = values
+        self._year_pos = {int(year): pos for pos, year in enumerate(self.years)}
+
+    def year_values(self, year):
+        """Returns one value per region for the year, in geometry order."""
+        try:
+            return self.values[:, self._year_pos[int(year)]]
+        except KeyError:
+            raise ValueError(f"No data for year {year}") from None
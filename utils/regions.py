@@ -0,0 +1,93 @@
+"""Canonical dimension of the Finnish regions (maakunnat).
+
+Every dataset spells the regions differently: Finnish names in the crime and
+Sotkanet tables, Statistics Finland's English names in the unemployment table,
+and the map geometry's own English names. All of them resolve here, in one
+vectorized lookup, to a single pandas Categorical whose integer codes are the
+row positions of REGIONS.
+"""
+import numpy as np
+import pandas as pd
+
+# (maakunta code, Finnish name, English name used by the map geometry, alternate spellings)
+REGIONS = [
+    ("MK01", "Uusimaa", "Uusimaa", ["Nyland"]),
+    ("MK02", "Varsinais-Suomi", "Finland Proper", ["Southwest Finland", "Egentliga Finland"]),
+    ("MK04", "Satakunta", "Satakunta", []),
+    ("MK05", "Kanta-Häme", "Tavastia Proper", ["Egentliga Tavastland"]),
+    ("MK06", "Pirkanmaa", "Pirkanmaa", ["Birkaland"]),
+    ("MK07", "Päijät-Häme", "Päijät-Häme", ["Päijänne Tavastia", "Päijänne Tavastland"]),
+    ("MK08", "Kymenlaakso", "Kymenlaakso", ["Kymmenedalen"]),
+    ("MK09", "Etelä-Karjala", "South Karelia", ["Södra Karelen"]),
+    ("MK10", "Etelä-Savo", "Southern Savonia", ["South Savo", "Södra Savolax"]),
+    ("MK11", "Pohjois-Savo", "Northern Savonia", ["North Savo", "Norra Savolax"]),
+    ("MK12", "Pohjois-Karjala", "North Karelia", ["Norra Karelen"]),
+    ("MK13", "Keski-Suomi", "Central Finland", ["Mellersta Finland"]),
+    ("MK14", "Etelä-Pohjanmaa", "Southern Ostrobothnia", ["South Ostrobothnia", "Södra Österbotten"]),
+    ("MK15", "Pohjanmaa", "Ostrobothnia", ["Österbotten"]),
+    ("MK16", "Keski-Pohjanmaa", "Central Ostrobothnia", ["Mellersta Österbotten"]),
+    ("MK17", "Pohjois-Pohjanmaa", "Northern Ostrobothnia", ["North Ostrobothnia", "Norra Österbotten"]),
+    ("MK18", "Kainuu", "Kainuu", ["Kajanaland"]),
+    ("MK19", "Lappi", "Lapland", ["Lappland"]),
+    ("MK21", "Ahvenanmaa", "Åland", ["Aland"]),
+]
+
+CODES = [row[0] for row in REGIONS]
+FINNISH_NAMES = [row[1] for row in REGIONS]
+ENGLISH_NAMES = [row[2] for row in REGIONS]
+
+# Finnish names in maakunta-code order; a column of this dtype stores region
+# positions as its integer codes, so joins and groupbys work on those codes
+REGION_DTYPE = pd.CategoricalDtype(FINNISH_NAMES)
+
+# Every accepted spelling (names and codes) -> row position in REGIONS
+_aliases = {}
+for _pos, (_code, _finnish, _english, _others) in enumerate(REGIONS):
+    for _name in [_code, _finnish, _english, *_others]:
+        _aliases[_name] = _pos
+        _aliases[_name.casefold()] = _pos
+_ALIAS_INDEX = pd.Index(list(_aliases))
+_ALIAS_POS = np.array(list(_aliases.values()), dtype=np.int8)
+
+
+def region_code(value):
+    """Returns the integer region code of a single region name of any spelling; -1 if unknown."""
+    pos = _aliases.get(value)
+    if pos is None:
+        pos = _aliases.get(str(value).strip().casefold(), -1)
+    return pos
+
+
+def region_codes(values):
+    """Returns the integer region codes of any spelling of region names; -1 if unknown."""
+    if getattr(values, "dtype", None) == REGION_DTYPE:
+        # Already canonical: the categorical codes are the answer
+        return np.asarray(pd.Categorical(values).codes)
+    values = pd.Index(pd.Series(values, dtype=object).astype(str).str.strip())
+    found = _ALIAS_INDEX.get_indexer(values)
+    missing = found < 0
+    if missing.any():
+        # Retry case-insensitively only for the names that missed
+        found[missing] = _ALIAS_INDEX.get_indexer(values[missing].str.casefold())
+    return np.where(found >= 0, _ALIAS_POS.take(found), -1)
+
+
+def to_categorical(values):
+    """Resolves region names to a Categorical of REGION_DTYPE (NaN for unknown names)."""
+    return pd.Categorical.from_codes(region_codes(values), dtype=REGION_DTYPE)
+
+
+def to_finnish(values):
+    """Returns the Finnish names for any spelling of region names, None if unknown."""
+    return _take(FINNISH_NAMES, region_codes(values))
+
+
+def to_english(values):
+    """Returns the map geometry's English names for any spelling, None if unknown."""
+    return _take(ENGLISH_NAMES, region_codes(values))
+
+
+def _take(names, codes):
+    names = np.array(names + [None], dtype=object)
+    # Code -1 lands on the trailing None
+    return names.take(codes)
@@ -0,0 +1,232 @@
+"""What-if scenarios for the regional KPIs, simulated from the merged_TSA.csv covariates.
+
+Each KPI (arrests, offences, rehab, clinic) gets one panel regression on log1p
+of its value: a fixed effect per region plus shared coefficients on the
+unemployment rate, log foreign residents and log population, with AR(1)
+residuals. A scenario sets each region's covariates from the last observed year
+on, and the simulator draws sample paths of every KPI for every region at once:
+coefficient draws carry the parameter uncertainty, AR(1) noise the year-to-year
+variation.
+
+Everything that does not depend on the scenario (coefficient draws, intercepts
+and AR noise) is drawn once per data version and reused, so a scenario costs a
+single matrix product over (KPI, region, year, path) plus the quantiles.
+
+Usage: python -m utils.scenarios [--region Uusimaa] [--unemployment 0.5] [--foreign 3] [--population 0] [--paths 4000]
+"""
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import dataset_version, load_dataset
+from utils.spans import timed
+
+KPIS = ["arrests", "offences", "rehab", "clinic"]
+
+# Covariates a scenario sets, and how a yearly change of each is applied:
+# "add" in the covariate's own units, "pct" as a compound percentage
+COVARIATES = ["unemployment_rate", "forign_count", "population"]
+CHANGE_KINDS = {"unemployment_rate": "add", "forign_count": "pct", "population": "pct"}
+
+# Quantiles of the simulated paths returned as bands, and their column names
+QUANTILES = np.array([0.05, 0.25, 0.5, 0.75, 0.95])
+BAND_COLUMNS = ["p5", "p25", "p50", "p75", "p95"]
+
+PATHS = 4000
+HORIZON = 5
+SEED = 2024
+
+# Per KPI arrays are stacked on the last axis in KPIS order; regions are in
+# `regions` order. coef: (kpi, region effects + covariates), chol: Cholesky
+# factor of each coefficient covariance, last_resid: (region, kpi)
+ScenarioModel = namedtuple("ScenarioModel", [
+    "regions", "last_year", "last_covariates", "coef", "chol", "rho", "sigma", "last_resid"])
+
+_models = {}
+_draws = {}
+_lock = threading.Lock()
+
+
+def _design(covariates):
+    # Counts enter in logs, so a percentage change has the same effect everywhere
+    return np.column_stack([covariates[:, 0], np.log(covariates[:, 1]), np.log(covariates[:, 2])])
+
+
+def fit_scenario_model(merged):
+    """Fits the panel regression and residual AR(1) of every KPI on the merged_TSA frame."""
+    merged = merged.sort_values(["region", "year"])
+    regions = list(pd.unique(merged["region"].astype(str)))
+    region_pos = pd.Categorical(merged["region"].astype(str), categories=regions).codes
+    x = np.column_stack([np.eye(len(regions))[region_pos], _design(merged[COVARIATES].to_numpy(dtype=float))])
+
+    # Row of each region's last year
+    last = np.flatnonzero(np.append(region_pos[1:] != region_pos[:-1], True))
+    n_coef = x.shape[1]
+    coef = np.zeros((len(KPIS), n_coef))
+    chol = np.zeros((len(KPIS), n_coef, n_coef))
+    rho, sigma = np.zeros(len(KPIS)), np.zeros(len(KPIS))
+    last_resid = np.zeros((len(regions), len(KPIS)))
+
+    for k, kpi in enumerate(KPIS):
+        z = np.log1p(merged[kpi].to_numpy(dtype=float))
+        observed = ~np.isnan(z)
+        coef[k], *_ = np.linalg.lstsq(x[observed], z[observed], rcond=None)
+        resid = np.where(observed, z - x @ coef[k], np.nan)
+        s2 = np.nansum(resid ** 2) / max(observed.sum() - n_coef, 1)
+        cov = s2 * np.linalg.pinv(x[observed].T @ x[observed])
+        # Jitter keeps the factorization stable for nearly collinear covariates
+        chol[k] = np.linalg.cholesky(cov + 1e-12 * np.eye(n_coef))
+
+        # Pooled AR(1) over consecutive years within each region
+        same_region = region_pos[1:] == region_pos[:-1]
+        pairs = same_region & ~np.isnan(resid[1:]) & ~np.isnan(resid[:-1])
+        prev, curr = resid[:-1][pairs], resid[1:][pairs]
+        rho[k] = np.clip(prev @ curr / (prev @ prev), -0.95, 0.95)
+        sigma[k] = np.sqrt(np.mean((curr - rho[k] * prev) ** 2))
+
+        # A region whose last year is missing starts from its expected residual
+        last_resid[:, k] = np.nan_to_num(resid[last])
+
+    return ScenarioModel(regions, int(merged["year"].max()), merged[COVARIATES].to_numpy(dtype=float)[last],
+                         coef, chol, rho, sigma, last_resid)
+
+
+def scenario_model():
+    """Returns the scenario model for the current merged_TSA data, fitted once per version."""
+    version = dataset_version("merged_tsa")
+    with _lock:
+        model = _models.get(version)
+        if model is None:
+            _models.clear()
+            model = _models[version] = fit_scenario_model(load_dataset("merged_tsa"))
+        return model
+
+
+def draw_paths(model, paths=PATHS, horizon=HORIZON, seed=SEED):
+    """Draws the scenario-independent part of the sample paths.
+
+    Returns (base, slopes): base (kpi, region, year, path) holds each path's
+    region intercept plus AR(1) noise, slopes (kpi, covariate, path) its
+    covariate coefficients. Paths are the last axis, so the quantiles later
+    sort contiguous rows.
+    """
+    rng = np.random.default_rng(seed)
+    n_regions = len(model.regions)
+
+    # Coefficient draws from each KPI's sampling distribution
+    coef = model.coef[:, :, None] + model.chol @ rng.standard_normal((len(KPIS), model.coef.shape[1], paths))
+
+    # AR(1) noise: e_h = rho^h e_0 + sum_{j<=h} rho^(h-j) sigma eps_j, with the
+    # sum as one lower-triangular matrix product per KPI
+    steps = np.arange(1, horizon + 1)
+    lags = steps[:, None] - steps[None, :]
+    weights = np.where(lags >= 0, model.rho[:, None, None] ** np.maximum(lags, 0), 0.0)
+    eps = rng.standard_normal((len(KPIS), n_regions, horizon, paths)) * model.sigma[:, None, None, None]
+    noise = weights[:, None] @ eps
+    noise += (model.rho[:, None] ** steps)[:, None, :, None] * model.last_resid.T[:, :, None, None]
+
+    return coef[:, :n_regions, None, :] + noise, coef[:, n_regions:, :]
+
+
+def cached_draws(model, paths=PATHS, horizon=HORIZON, seed=SEED):
+    """draw_paths() once per data version, reused by every scenario (common random numbers)."""
+    key = (dataset_version("merged_tsa"), paths, horizon, seed)
+    with _lock:
+        draws = _draws.get(key)
+        if draws is None:
+            if len(_draws) >= 4:
+                _draws.clear()
+            draws = _draws[key] = draw_paths(model, paths, horizon, seed)
+        return draws
+
+
+def scenario_covariates(model, changes=None, horizon=HORIZON):
+    """Covariate trajectories (region, year, covariate) from yearly changes per region.
+
+    changes maps a region to {covariate: yearly change}, in percentage points
+    for the unemployment rate and percent for the counts. Covariates not given
+    stay at their last observed value.
+    """
+    steps = np.arange(1, horizon + 1)
+    trajectories = np.repeat(model.last_covariates[:, None, :], horizon, axis=1)
+    for region, region_changes in (changes or {}).items():
+        r = model.regions.index(region)
+        for c, covariate in enumerate(COVARIATES):
+            change = region_changes.get(covariate, 0.0)
+            if CHANGE_KINDS[covariate] == "add":
+                trajectories[r, :, c] += change * steps
+            else:
+                trajectories[r, :, c] *= (1 + change / 100) ** steps
+    # The unemployment rate stays a rate and counts stay positive
+    trajectories[:, :, 0] = np.clip(trajectories[:, :, 0], 0.0, 100.0)
+    trajectories[:, :, 1:] = np.maximum(trajectories[:, :, 1:], 1.0)
+    return trajectories
+
+
+@timed()
+def simulate(changes=None, paths=PATHS, horizon=HORIZON, seed=SEED):
+    """Quantile bands of every KPI for every region under a scenario.
+
+    Returns one row per (region, year, kpi) with the BAND_COLUMNS quantiles.
+    """
+    model = scenario_model()
+    base, slopes = cached_draws(model, paths, horizon, seed)
+    x = _design(scenario_covariates(model, changes, horizon).reshape(-1, len(COVARIATES)))
+
+    n_kpis, n_regions = len(KPIS), len(model.regions)
+    z = base.reshape(n_kpis, n_regions * horizon, paths) + x @ slopes
+
+    # Quantiles by sorting each (kpi, region, year) row of paths in place and
+    # interpolating linearly, as np.quantile does
+    z.sort(axis=-1)
+    pos = QUANTILES * (paths - 1)
+    below = np.floor(pos).astype(int)
+    above = np.minimum(below + 1, paths - 1)
+    quantiles = z[..., below] * (1 - (pos - below)) + z[..., above] * (pos - below)
+    # expm1 is increasing, so only the quantiles are taken back from the log scale
+    bands = np.maximum(np.expm1(quantiles), 0.0).reshape(n_kpis, n_regions, horizon, len(QUANTILES))
+    bands = bands.transpose(1, 2, 0, 3).reshape(-1, len(QUANTILES))
+
+    regions, years, kpis = np.meshgrid(np.arange(n_regions), model.last_year + np.arange(1, horizon + 1),
+                                       np.arange(n_kpis), indexing="ij")
+    table = pd.DataFrame({
+        "region": np.array(model.regions)[regions.ravel()],
+        "year": years.ravel(),
+        "kpi": np.array(KPIS)[kpis.ravel()],
+    })
+    for name, band in zip(BAND_COLUMNS, bands.T):
+        table[name] = band
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate KPI bands for a covariate scenario.")
+    parser.add_argument("--region", default="Uusimaa", help="region the changes apply to and bands are printed for")
+    parser.add_argument("--unemployment", type=float, default=0.0, help="yearly change of the unemployment rate (points)")
+    parser.add_argument("--foreign", type=float, default=0.0, help="yearly change of foreign residents (%%)")
+    parser.add_argument("--population", type=float, default=0.0, help="yearly change of the population (%%)")
+    parser.add_argument("--paths", type=int, default=PATHS, help="sample paths per region")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="years simulated")
+    args = parser.parse_args(argv)
+
+    changes = {args.region: {"unemployment_rate": args.unemployment, "forign_count": args.foreign,
+                             "population": args.population}}
+    model = scenario_model()
+    cached_draws(model, args.paths, args.horizon)
+
+    started = time.perf_counter()
+    bands = simulate(changes, args.paths, args.horizon)
+    elapsed = time.perf_counter() - started
+
+    region_bands = bands[bands["region"] == args.region].drop(columns="region")
+    with pd.option_context("display.width", 120, "display.max_rows", None):
+        print(region_bands.to_string(index=False, float_format="{:.0f}".format))
+    print(f"{args.paths} paths x {len(model.regions)} regions x {args.horizon} years in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Builds a static, read-only snapshot of the dashboard.
+
+Every selection the Monitoring and Prediction pages offer is rendered ahead of
+time: plotly figures as JSON, tables as JSON records and folium maps as HTML,
+next to an index.html that picks the pre-rendered file for the reader's choice.
+The site needs nothing but a plain file server.
+
+Views render in parallel worker processes. A view is skipped when the hash of
+the data files it depends on and of the code that renders it matches the one
+recorded in the site's manifest. Forecasts come from the model registry where
+it has one for the series, as on the Prediction page.
+
+Usage: python -m utils.snapshot [--output site] [--jobs N] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import folium
+import plotly
+from plotly.offline import get_plotlyjs_version
+
+from utils.data_loader import DATASETS, file_digest, load_dataset, resolve_path
+from utils.geometry import GEOJSON_PATH
+from utils.kpi_cube import kpi_cube
+from utils.model_registry import model_path
+from utils.ranking import MEASURE_LABELS, MEASURES, change_ranking
+from utils.regions import CODES, region_code
+
+OUTPUT_DIR = "site"
+MANIFEST = "manifest.json"
+
+# Choices of the Monitoring and Prediction page widgets
+PRICE_OPTIONS = ["All types of drugs", "Commonly used drugs"]
+TREND_KPIS = ["arrests", "offences", "rehab", "clinic"]
+FORECAST_KPIS = ["Offences", "Arrests"]
+PIE_YEAR = 2025
+
+# Modules whose code shapes the rendered views; editing one re-renders every view
+RENDER_MODULES = ["utils/snapshot.py", "utils/charts.py", "utils/traces.py", "utils/kpi_cube.py",
+                  "utils/region_matrix.py", "utils/regions.py", "utils/ranking.py", "utils/forecasting.py",
+                  "utils/map_risk.py", "utils/map_utils.py", "utils/animated_map.py", "utils/geometry.py"]
+
+# One pre-rendered file: its path in the site, the files it is rendered from, and
+# a module-level render function (so it can be sent to a worker) with its arguments
+View = namedtuple("View", ["path", "sources", "render", "args"])
+
+
+def slug(label):
+    """File-name-safe form of a widget label."""
+    return "_".join(re.findall(r"[A-Za-z0-9]+", label))
+
+
+def _region_slug(region):
+    return CODES[region_code(region)]
+
+
+def _data(*names):
+    return [DATASETS[name][0] for name in names]
+
+
+def _registry(key):
+    # The series' registry entry, when it has one, overrides the forecast CSV
+    path = model_path(key)
+    return [path] if os.path.exists(path) else []
+
+
+# ---- Render functions, run in the worker processes ----
+
+def render_deaths_by_age():
+    from utils.charts import deaths_by_age_figure
+    return deaths_by_age_figure(load_dataset("deaths")).to_json()
+
+
+def render_drug_prices(plot_option):
+    from utils.charts import drug_price_figure
+    return drug_price_figure(load_dataset("drug_prices"), plot_option).to_json()
+
+
+def render_kpi_trends(region, kpis):
+    from utils.charts import kpi_trend_figure
+    return kpi_trend_figure(kpi_cube(), region, list(kpis)).to_json()
+
+
+def render_kpi_forecast(kpi_selected, region):
+    from utils.charts import kpi_forecast_figure
+    from utils.forecasting import stored_forecast
+    forecast = stored_forecast((kpi_selected.lower(), region))
+    return kpi_forecast_figure(kpi_cube(), kpi_selected, region, forecast).to_json()
+
+
+def render_forecast_table(kpi, region):
+    from utils.forecasting import stored_forecast
+    return kpi_cube().table(region, kpi, stored_forecast((kpi, region))).to_json(orient="records")
+
+
+def render_deaths_forecast(age_group):
+    from utils.charts import deaths_forecast_figure
+    return deaths_forecast_figure(load_dataset("deaths_forecast"), load_dataset("deaths_history"),
+                                  age_group).to_json()
+
+
+def render_deaths_pie(year):
+    from utils.charts import deaths_pie_figure
+    return deaths_pie_figure(load_dataset("deaths_forecast"), year).to_json()
+
+
+def render_ranking(base_year, target_year, measure):
+    ranking = change_ranking()
+    tables = {kpi: json.loads(ranking.top_rising(kpi, base_year, target_year, measure=measure)
+                              .to_json(orient="records"))
+              for kpi in ("offences", "arrests")}
+    return json.dumps(tables)
+
+
+def render_highrisk_map(base_year, target_year, measure):
+    from utils.map_risk import create_highrisk_map
+    return create_highrisk_map(base_year, target_year, measure).get_root().render()
+
+
+def render_drug_usage_map(year):
+    from utils.map_utils import create_folium_map
+    return create_folium_map(year).get_root().render()
+
+
+def render_animated_map():
+    from utils.animated_map import build_animated_map
+    return build_animated_map()
+
+
+# ---- Views ----
+
+def snapshot_options():
+    """Every choice the static site offers, also embedded in its index page."""
+    cube = kpi_cube()
+    trend_regions = sorted(cube.regions_with("offences"))
+    forecast_regions = ["Uusimaa"] + sorted(set(cube.regions_with("offences", "prediction")) - {"Uusimaa"})
+    age_groups = [str(age) for age in load_dataset("deaths_forecast")["age_group"].unique()]
+    return {
+        "price_options": [{"label": option, "slug": slug(option)} for option in PRICE_OPTIONS],
+        "trend_regions": [{"label": region, "slug": _region_slug(region)} for region in trend_regions],
+        "trend_kpis": TREND_KPIS,
+        "forecast_kpis": FORECAST_KPIS,
+        "forecast_regions": [{"label": region, "slug": _region_slug(region)} for region in forecast_regions],
+        "age_groups": [{"label": age, "slug": slug(age)} for age in age_groups],
+        "base_years": cube.years_with("offences"),
+        "target_years": cube.years_with("offences", "prediction"),
+        "measures": [{"label": MEASURE_LABELS[measure], "slug": measure} for measure in MEASURES],
+        "map_years": [int(year) for year in load_dataset("drug_usage_by_regions")["year"]],
+        "pie_year": PIE_YEAR,
+    }
+
+
+def snapshot_views(options):
+    """Lists every view of the site for the given options."""
+    views = [
+        View("figures/deaths_by_age.json", _data("deaths"), render_deaths_by_age, ()),
+        View("maps/animated.html", _data("merged_tsa") + [GEOJSON_PATH], render_animated_map, ()),
+        View(f"figures/deaths_pie/{PIE_YEAR}.json", _data("deaths_forecast"), render_deaths_pie, (PIE_YEAR,)),
+    ]
+    for option in options["price_options"]:
+        views.append(View(f"figures/drug_prices/{option['slug']}.json", _data("drug_prices"),
+                          render_drug_prices, (option["label"],)))
+
+    # Every non-empty KPI selection, named by its KPIs in the multiselect's order
+    kpi_sets = [kpis for size in range(1, len(TREND_KPIS) + 1) for kpis in combinations(TREND_KPIS, size)]
+    for region in options["trend_regions"]:
+        for kpis in kpi_sets:
+            views.append(View(f"figures/kpi_trends/{region['slug']}/{'-'.join(kpis)}.json", _data("merged_tsa"),
+                              render_kpi_trends, (region["label"], kpis)))
+
+    for kpi_selected in FORECAST_KPIS:
+        kpi = kpi_selected.lower()
+        sources = _data("merged_tsa", f"{kpi}_forecast")
+        for region in options["forecast_regions"]:
+            region_sources = sources + _registry((kpi, region["label"]))
+            views.append(View(f"figures/kpi_forecast/{kpi}/{region['slug']}.json", region_sources,
+                              render_kpi_forecast, (kpi_selected, region["label"])))
+            views.append(View(f"tables/kpi_forecast/{kpi}/{region['slug']}.json", region_sources,
+                              render_forecast_table, (kpi, region["label"])))
+
+    for age in options["age_groups"]:
+        views.append(View(f"figures/deaths_forecast/{age['slug']}.json", _data("deaths_forecast", "deaths_history"),
+                          render_deaths_forecast, (age["label"],)))
+
+    ranking_sources = _data("merged_tsa", "offences_forecast", "arrests_forecast")
+    for base_year in options["base_years"]:
+        for target_year in options["target_years"]:
+            for measure in MEASURES:
+                name = f"{base_year}-{target_year}-{measure}"
+                views.append(View(f"tables/ranking/{name}.json", ranking_sources,
+                                  render_ranking, (base_year, target_year, measure)))
+                views.append(View(f"maps/highrisk/{name}.html", ranking_sources + [GEOJSON_PATH],
+                                  render_highrisk_map, (base_year, target_year, measure)))
+
+    for year in options["map_years"]:
+        views.append(View(f"maps/drug_usage/{year}.html", _data("drug_usage_by_regions") + [GEOJSON_PATH],
+                          render_drug_usage_map, (year,)))
+    return views
+
+
+def code_version():
+    """Hash of the rendering code: the RENDER_MODULES sources and the plotly and folium versions."""
+    sources = {path: file_digest(path) for path in RENDER_MODULES}
+    return json.dumps([sources, plotly.__version__, folium.__version__])
+
+
+def view_hash(view, code=None):
+    """Hash of everything a view's output depends on: its render call, source files and code."""
+    sources = {path: file_digest(path) for path in sorted(view.sources)}
+    key = json.dumps([view.render.__name__, view.args, sources, code or code_version()],
+                     default=str, ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _write(output_dir, path, content):
+    target = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "w", encoding="utf-8") as file:
+        file.write(content)
+
+
+def _render_view(job):
+    output_dir, view = job
+    _write(output_dir, view.path, view.render(*view.args))
+    return view.path
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def build_snapshot(output_dir=OUTPUT_DIR, force=False, jobs=None):
+    """Renders the stale views into output_dir and returns (rendered, skipped) counts."""
+    output_dir = resolve_path(output_dir)
+    manifest = load_manifest(output_dir)
+    options = snapshot_options()
+    views = snapshot_views(options)
+
+    code = code_version()
+    hashes = {view.path: view_hash(view, code) for view in views}
+    stale = [view for view in views
+             if force or manifest.get(view.path) != hashes[view.path]
+             or not os.path.exists(os.path.join(output_dir, view.path))]
+
+    # Small views are batched so each worker round trip renders several
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for path in pool.map(_render_view, [(output_dir, view) for view in stale], chunksize=8):
+            manifest[path] = hashes[path]
+
+    # The index is cheap and lists the options, so it is always rewritten
+    _write(output_dir, "index.html", _INDEX
+           .replace("__OPTIONS__", json.dumps(options, ensure_ascii=False))
+           .replace("__PLOTLYJS__", get_plotlyjs_version()))
+    manifest = {path: manifest[path] for path in sorted(hashes) if path in manifest}
+    _write(output_dir, MANIFEST, json.dumps(manifest, indent=2) + "\n")
+    return len(stale), len(views) - len(stale)
+
+
+_INDEX = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8"/>
+<title>Drug Usage Monitoring and Prediction in Finland</title>
+<script src="https://cdn.plot.ly/plotly-__PLOTLYJS__.min.js"></script>
+<style>
+  body { font-family: Arial, sans-serif; margin: 0 auto; max-width: 1400px; padding: 0 16px; }
+  .row { display: flex; gap: 24px; }
+  .row > div { flex: 1; min-width: 0; }
+  .controls { display: flex; gap: 12px; flex-wrap: wrap; align-items: center; margin: 6px 0; }
+  iframe { border: none; width: 100%; }
+  table { border-collapse: collapse; font-size: 13px; margin-bottom: 12px; }
+  td, th { border-bottom: 1px solid #ddd; padding: 3px 8px; text-align: right; }
+  td:first-child, th:first-child { text-align: left; }
+</style>
+</head>
+<body>
+<h1>Monitoring Drug Usage in Finland</h1>
+<div class="row">
+  <div><h3>Number of deaths by Age Group</h3><div id="deaths-by-age"></div></div>
+  <div>
+    <h3>Drug Price Trends</h3>
+    <div class="controls"><select id="price-option"></select></div>
+    <div id="drug-prices"></div>
+  </div>
+</div>
+<h3>Trends by regions</h3>
+<div class="controls" id="trend-kpis"></div>
+<div class="row">
+  <div><iframe src="maps/animated.html" height="680"></iframe></div>
+  <div>
+    <div class="controls"><select id="trend-region"></select></div>
+    <div id="kpi-trends"></div>
+  </div>
+</div>
+<h3>Reported drug usage by region</h3>
+<div class="controls"><select id="map-year"></select></div>
+<iframe id="drug-usage-map" height="620"></iframe>
+
+<h1>Future Trends in Illegal Drug-Related KPIs in Finland</h1>
+<div class="row">
+  <div>
+    <h2>Offences and Arrests Forecast</h2>
+    <div class="controls"><select id="forecast-kpi"></select><select id="forecast-region"></select></div>
+    <div id="kpi-forecast"></div>
+    <h3>Forecast Data Table</h3>
+    <div id="forecast-table"></div>
+  </div>
+  <div>
+    <h2>Drug-Related Deaths Forecast</h2>
+    <div class="controls"><select id="age-group"></select></div>
+    <div id="deaths-forecast"></div>
+    <h3 id="pie-title"></h3>
+    <div id="deaths-pie"></div>
+  </div>
+</div>
+<div class="controls">
+  Compare from <select id="base-year"></select>
+  to forecast year <select id="target-year"></select>
+  change <select id="measure"></select>
+</div>
+<div class="row">
+  <div>
+    <h3 id="offences-title"></h3><div id="offences-ranking"></div>
+    <h3 id="arrests-title"></h3><div id="arrests-ranking"></div>
+  </div>
+  <div><h3 id="highrisk-title"></h3><iframe id="highrisk-map" height="620"></iframe></div>
+</div>
+<script>
+const options = __OPTIONS__;
+const $ = id => document.getElementById(id);
+
+async function fetchJson(path) {
+  return (await fetch(path)).json();
+}
+
+async function plot(id, path) {
+  const fig = await fetchJson(path);
+  Plotly.react($(id), fig.data, fig.layout, {responsive: true});
+}
+
+function fill(id, items, selected) {
+  for (const item of items) {
+    const value = typeof item === "object" ? item.slug : item;
+    const label = typeof item === "object" ? item.label : item;
+    $(id).add(new Option(label, value, false, value === selected));
+  }
+}
+
+function renderTable(id, rows) {
+  if (!rows.length) { $(id).textContent = "No regions."; return; }
+  const columns = Object.keys(rows[0]);
+  const cell = value => typeof value === "number" && !Number.isInteger(value) ? value.toFixed(2) : (value ?? "");
+  $(id).innerHTML = "<table><tr>" + columns.map(c => `<th>${c}</th>`).join("") + "</tr>" +
+    rows.map(row => "<tr>" + columns.map(c => `<td>${cell(row[c])}</td>`).join("") + "</tr>").join("") +
+    "</table>";
+}
+
+function trendKpis() {
+  const checked = options.trend_kpis.filter(kpi => $(`kpi-${kpi}`).checked);
+  return checked.length ? checked : ["arrests"];
+}
+
+const views = {
+  prices: () => plot("drug-prices", `figures/drug_prices/${$("price-option").value}.json`),
+  trends: () => plot("kpi-trends", `figures/kpi_trends/${$("trend-region").value}/${trendKpis().join("-")}.json`),
+  usageMap: () => { $("drug-usage-map").src = `maps/drug_usage/${$("map-year").value}.html`; },
+  forecast: async () => {
+    const path = `${$("forecast-kpi").value.toLowerCase()}/${$("forecast-region").value}.json`;
+    plot("kpi-forecast", `figures/kpi_forecast/${path}`);
+    renderTable("forecast-table", await fetchJson(`tables/kpi_forecast/${path}`));
+  },
+  deaths: () => plot("deaths-forecast", `figures/deaths_forecast/${$("age-group").value}.json`),
+  ranking: async () => {
+    const base = $("base-year").value, target = $("target-year").value;
+    const name = `${base}-${target}-${$("measure").value}`;
+    const tables = await fetchJson(`tables/ranking/${name}.json`);
+    $("offences-title").textContent = `Regions with High Increase in Offences (${target} vs ${base})`;
+    $("arrests-title").textContent = `Regions with High Increase in Arrests (${target} vs ${base})`;
+    $("highrisk-title").textContent = `High risk regions (${target})`;
+    renderTable("offences-ranking", tables.offences);
+    renderTable("arrests-ranking", tables.arrests);
+    $("highrisk-map").src = `maps/highrisk/${name}.html`;
+  },
+};
+
+fill("price-option", options.price_options, "Commonly_used_drugs");
+fill("trend-region", options.trend_regions);
+for (const kpi of options.trend_kpis) {
+  $("trend-kpis").insertAdjacentHTML("beforeend",
+    `<label><input type="checkbox" id="kpi-${kpi}" ${kpi === "arrests" ? "checked" : ""}/> ${kpi}</label>`);
+  $(`kpi-${kpi}`).onchange = views.trends;
+}
+fill("map-year", options.map_years, options.map_years[options.map_years.length - 1]);
+fill("forecast-kpi", options.forecast_kpis);
+fill("forecast-region", options.forecast_regions);
+fill("age-group", options.age_groups);
+fill("base-year", options.base_years, options.base_years[options.base_years.length - 1]);
+fill("target-year", options.target_years, options.target_years[Math.min(1, options.target_years.length - 1)]);
+fill("measure", options.measures);
+
+$("price-option").onchange = views.prices;
+$("trend-region").onchange = views.trends;
+$("map-year").onchange = views.usageMap;
+$("forecast-kpi").onchange = $("forecast-region").onchange = views.forecast;
+$("age-group").onchange = views.deaths;
+$("base-year").onchange = $("target-year").onchange = $("measure").onchange = views.ranking;
+
+$("pie-title").textContent = `Deaths Forecast Distribution by Age Group (${options.pie_year})`;
+plot("deaths-by-age", "figures/deaths_by_age.json");
+plot("deaths-pie", `figures/deaths_pie/${options.pie_year}.json`);
+Object.values(views).forEach(view => view());
+</script>
+</body>
+</html>
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render every dashboard view into a static site.")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="site directory (default: site)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render even if the data is unchanged")
+    args = parser.parse_args(argv)
+
+    rendered, skipped = build_snapshot(args.output, force=args.force, jobs=args.jobs)
+    print(f"Rendered {rendered} views, {skipped} up to date -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Named timing spans for the data loaders, chart builders and map builders.
+
+Code marks its slow steps with `with span("name", **attrs):` or the `@timed()`
+decorator. Spans are recorded only while a trace is active for the current
+thread, which the dashboard starts per rerun when the debug panel or the span
+log is switched on; otherwise a span costs one context variable lookup.
+
+A finished trace can be exported as JSON Lines, one span per line, and a rerun
+can be captured with cProfile (or pyinstrument, when it is installed).
+"""
+import cProfile
+import functools
+import importlib.util
+import io
+import json
+import marshal
+import os
+import pstats
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# start and duration are in seconds from the start of the trace; parent is the
+# position of the enclosing span in Trace.spans, or None at the top level
+Span = namedtuple("Span", ["name", "start", "duration", "depth", "parent", "attrs"])
+
+# Profilers available in this environment
+PROFILERS = ["cprofile"] + (["pyinstrument"] if importlib.util.find_spec("pyinstrument") else [])
+
+_current = ContextVar("trace", default=None)
+
+
+class Trace:
+    """Spans recorded during one run of something, in the order they started."""
+
+    def __init__(self, label):
+        self.label = label
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        self.origin = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._open = []
+
+    def _enter(self, name, attrs):
+        pos = len(self.spans)
+        parent = self._open[-1] if self._open else None
+        # Placeholder until the span ends, so spans stay in start order
+        self.spans.append(Span(name, time.perf_counter() - self.origin, None, len(self._open), parent, attrs))
+        self._open.append(pos)
+        return pos
+
+    def _exit(self, pos):
+        self._open.pop()
+        span = self.spans[pos]
+        self.spans[pos] = span._replace(duration=time.perf_counter() - self.origin - span.start)
+
+    def records(self):
+        """Returns the spans as JSON-ready dicts, times in milliseconds."""
+        return [{
+            "run_id": self.run_id,
+            "label": self.label,
+            "started_at": self.started_at,
+            "span": pos,
+            "name": span.name,
+            "start_ms": round(span.start * 1000, 3),
+            "duration_ms": None if span.duration is None else round(span.duration * 1000, 3),
+            "depth": span.depth,
+            "parent": span.parent,
+            "attrs": span.attrs,
+        } for pos, span in enumerate(self.spans)]
+
+    def to_jsonl(self):
+        return "".join(json.dumps(record, default=str) + "\n" for record in self.records())
+
+
+@contextmanager
+def trace(label):
+    """Records the spans of the enclosed code, on this thread, into the Trace it yields."""
+    current = Trace(label)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.origin
+        _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name, /, **attrs):
+    """Times the enclosed code as a span of the active trace, if there is one."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    pos = current._enter(name, attrs)
+    try:
+        yield
+    finally:
+        current._exit(pos)
+
+
+def timed(name=None):
+    """Decorator recording each call of the function as a span, named after it by default."""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def append_jsonl(current, path):
+    """Appends the spans of a finished trace to a JSON Lines file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(current.to_jsonl())
+
+
+@contextmanager
+def profiled(engine="cprofile", limit=40):
+    """Profiles the enclosed code; the dict it yields is filled in once the block ends.
+
+    "text" holds a report of the slowest calls; cProfile adds "pstats" (the raw
+    statistics, loadable with pstats.Stats) and pyinstrument adds "html".
+    """
+    report = {"engine": engine}
+    if engine == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield report
+        finally:
+            profiler.stop()
+            report["text"] = profiler.output_text()
+            report["html"] = profiler.output_html()
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        profiler.create_stats()
+        # The format pstats.Stats.dump_stats writes; taken first, as Stats() empties profiler.stats
+        report["pstats"] = marshal.dumps(profiler.stats)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        report["text"] = stream.getvalue()
@@ -0,0 +1,94 @@
+"""Line traces that stay responsive for long series.
+
+line_trace() builds a plain go.Scatter for the short yearly series the
+dashboard has today. Past GL_THRESHOLD points it switches to WebGL (go.Scattergl)
+and drops the markers. Past max_points it keeps a shape-preserving subset of
+the whole series: Largest-Triangle-Three-Buckets by default, or the minimum
+and maximum of each bucket.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+# Points per trace above which it is drawn with WebGL instead of SVG
+GL_THRESHOLD = 1000
+
+# Points per trace kept after downsampling
+MAX_POINTS = 2000
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps, first and last included."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_float(x), _as_float(y)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # The next bucket is represented by its mean; the last bucket's by the last point
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        # Keep the point spanning the largest triangle with the previous kept point
+        area = np.abs((x[a] - next_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax_indices(x, y, n_out):
+    """Indices of each bucket's minimum and maximum, in order, first and last included."""
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = _as_float(y)
+
+    # Equal-sized buckets, the last one padded with NaN so they reshape into rows
+    size = int(np.ceil(n / (n_out // 2)))
+    buckets = int(np.ceil(n / size))
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    kept = np.concatenate([[0, n - 1], offsets + np.nanargmin(rows, axis=1), offsets + np.nanargmax(rows, axis=1)])
+    return np.unique(kept)
+
+
+DOWNSAMPLERS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+
+def line_trace(x, y, max_points=MAX_POINTS, method="lttb", **trace_kwargs):
+    """Returns a Scatter (or, for long series, a downsampled Scattergl) of y over sorted x.
+
+    NaN values in y are left out of long series.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+
+    if len(x) <= GL_THRESHOLD:
+        return go.Scatter(x=x, y=y, **trace_kwargs)
+
+    finite = ~np.isnan(_as_float(y))
+    x, y = x[finite], y[finite]
+    if len(x) > max_points:
+        kept = DOWNSAMPLERS[method](x, y, max_points)
+        x, y = x[kept], y[kept]
+
+    # Markers on thousands of points only hide the line
+    mode = trace_kwargs.pop("mode", "lines").replace("+markers", "").replace("markers+", "")
+    return go.Scattergl(x=x, y=y, mode=mode, **trace_kwargs)
+
+
+def line_figure(traces, **layout):
+    """Builds a figure from all traces in one step, rather than one add_trace per trace."""
+    return go.Figure(data=list(traces), layout=layout or None)
@@ -0,0 +1,517 @@
+"""Mapbox Vector Tiles of the map geometry, and a local server for them.
+
+`build` cuts every geometry source into MVT tiles, one protobuf file per
+data/tiles/<source>/<z>/<x>/<y>.pbf, simplified to one tile unit at each zoom.
+Features carry only their name and an id (fid, the row of the source file), so
+a client downloads the polygons in its viewport once and colours them from a
+separate per-KPI values array indexed by fid. Switching year or KPI restyles the
+tiles already loaded and never re-sends geometry.
+
+`serve` answers /tiles/... with ETag and Cache-Control headers, /values/<kpi>.json
+with the region x year values of the KPI cube, and / with a Leaflet viewer.
+
+Usage: python -m utils.vector_tiles build [--min-zoom 3] [--max-zoom 10] [--force]
+       python -m utils.vector_tiles serve [--port 8765]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+import shapely
+from shapely.geometry import box
+from shapely.geometry.polygon import orient
+
+from utils.data_loader import file_digest, resolve_path
+from utils.geometry import GEOJSON_PATH
+
+TILES_DIR = "data/tiles"
+
+# Layer name -> GeoJSON file cut into tiles. Finer sources (municipality borders)
+# are added here; only "regions" has KPI values to colour it by.
+SOURCES = {"regions": GEOJSON_PATH}
+
+MIN_ZOOM = 3
+MAX_ZOOM = 10
+
+# Tile coordinate range, and how far past each edge geometry is kept so strokes
+# do not break at tile seams (both in tile units)
+EXTENT = 4096
+BUFFER = 64
+
+# Half the width of the web-mercator plane, in metres
+WORLD = 20037508.342789244
+
+TILE_CACHE_CONTROL = "public, max-age=86400"
+
+
+# ---- Protobuf encoding (vector_tile.proto, version 2) ----
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7F, n >> 7
+        if not n:
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def _key(number, wire_type):
+    return _varint(number << 3 | wire_type)
+
+
+def _varint_field(number, value):
+    return _key(number, 0) + _varint(value)
+
+
+def _bytes_field(number, payload):
+    return _key(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 31)
+
+
+def _value(value):
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode("utf-8"))
+    if isinstance(value, (int, np.integer)) and value >= 0:
+        return _varint_field(5, int(value))
+    return _key(3, 1) + struct.pack("<d", float(value))
+
+
+# Geometry command integers: MoveTo(1), LineTo(count), ClosePath(1)
+_MOVE_TO = 1 | 1 << 3
+_CLOSE_PATH = 7 | 1 << 3
+
+
+def _ring_commands(coords, cursor):
+    # A closed ring of integer tile coordinates; the closing point is implied by ClosePath
+    points = coords[:-1]
+    # Snapping to the grid can leave repeated points; drop them
+    points = points[np.any(points != np.roll(points, 1, axis=0), axis=1)]
+    if len(points) < 3:
+        return [], cursor
+    deltas = np.diff(np.vstack([cursor, points]), axis=0).ravel()
+    params = [_zigzag(int(d)) for d in deltas]
+    return [_MOVE_TO, *params[:2], 2 | (len(points) - 1) << 3, *params[2:], _CLOSE_PATH], points[-1]
+
+
+def _polygon_commands(geom):
+    commands, cursor = [], np.zeros(2, dtype=np.int64)
+    for polygon in shapely.get_parts(geom):
+        if polygon.geom_type != "Polygon":
+            continue
+        # Exterior rings have a positive (surveyor's formula) area in tile coordinates,
+        # holes a negative one
+        polygon = orient(polygon, sign=1.0)
+        exterior, cursor = _ring_commands(np.asarray(polygon.exterior.coords, dtype=np.int64), cursor)
+        if not exterior:
+            continue
+        commands += exterior
+        for interior in polygon.interiors:
+            hole, cursor = _ring_commands(np.asarray(interior.coords, dtype=np.int64), cursor)
+            commands += hole
+    return commands
+
+
+def encode_tile(layer_name, features):
+    """Encodes [(properties, polygon in tile coordinates)] as one MVT layer; b"" if nothing is left."""
+    keys, values, key_pos, value_pos = [], [], {}, {}
+    encoded = []
+    for properties, geom in features:
+        commands = _polygon_commands(geom)
+        if not commands:
+            continue
+        tags = []
+        for key, value in properties.items():
+            if key not in key_pos:
+                key_pos[key] = len(keys)
+                keys.append(key)
+            if (type(value), value) not in value_pos:
+                value_pos[(type(value), value)] = len(values)
+                values.append(_value(value))
+            tags += [key_pos[key], value_pos[(type(value), value)]]
+        # Feature: tags, type POLYGON (3), geometry
+        encoded.append(_packed_field(2, tags) + _varint_field(3, 3) + _packed_field(4, commands))
+
+    if not encoded:
+        return b""
+    layer = (_varint_field(15, 2) + _bytes_field(1, layer_name.encode("utf-8"))
+             + b"".join(_bytes_field(2, feature) for feature in encoded)
+             + b"".join(_bytes_field(3, key.encode("utf-8")) for key in keys)
+             + b"".join(_bytes_field(4, value) for value in values)
+             + _varint_field(5, EXTENT))
+    return _bytes_field(3, layer)
+
+
+# ---- Tiling ----
+
+def tile_size(zoom):
+    """Width of a tile at the zoom, in web-mercator metres."""
+    return 2 * WORLD / 2 ** zoom
+
+
+def tile_bounds(zoom, x, y):
+    """(minx, miny, maxx, maxy) of a tile in web-mercator metres."""
+    size = tile_size(zoom)
+    minx, maxy = -WORLD + x * size, WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds, zoom):
+    """Tile columns and rows covering web-mercator bounds at the zoom."""
+    size = tile_size(zoom)
+    minx, miny, maxx, maxy = bounds
+    return (range(int((minx + WORLD) // size), int((maxx + WORLD) // size) + 1),
+            range(int((WORLD - maxy) // size), int((WORLD - miny) // size) + 1))
+
+
+def cut_tile(geo_data, layer_name, zoom, x, y):
+    """Returns the encoded tile of a web-mercator GeoDataFrame with fid and name columns."""
+    minx, miny, maxx, maxy = tile_bounds(zoom, x, y)
+    scale = EXTENT / (maxx - minx)
+    pad = BUFFER / scale
+    clip = box(minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+    rows = geo_data.sindex.query(clip, predicate="intersects")
+    if not len(rows):
+        return b""
+    clipped = shapely.intersection(np.asarray(geo_data.geometry.values[rows]), clip)
+    # To tile units, y pointing down, snapped to the integer grid (which keeps polygons valid)
+    in_tile = shapely.transform(clipped, lambda c: np.column_stack([(c[:, 0] - minx) * scale,
+                                                                  (maxy - c[:, 1]) * scale]))
+    in_tile = shapely.set_precision(in_tile, grid_size=1.0)
+
+    subset = geo_data.iloc[rows]
+    features = [({"fid": int(fid), "name": str(name)}, geom)
+                for fid, name, geom in zip(subset["fid"], subset["name"], in_tile) if not geom.is_empty]
+    return encode_tile(layer_name, features)
+
+
+def source_dir(name):
+    return os.path.join(resolve_path(TILES_DIR), name)
+
+
+def load_metadata(name):
+    path = os.path.join(source_dir(name), "metadata.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def build_source(name, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, force=False):
+    """Cuts one source into tiles unless the existing set was built from the same file and zooms."""
+    import geopandas as gpd
+
+    from utils.geometry import simplify_geometry
+
+    path = SOURCES[name]
+    digest = file_digest(path)
+    etag = hashlib.sha1(f"{digest}:{min_zoom}:{max_zoom}:{EXTENT}:{BUFFER}".encode()).hexdigest()[:16]
+    metadata = load_metadata(name)
+    if not force and metadata is not None and metadata["etag"] == etag:
+        return metadata
+
+    geo_data = gpd.read_file(resolve_path(path))
+    geo_data["fid"] = np.arange(len(geo_data))
+    lonlat_bounds = [float(v) for v in geo_data.total_bounds]
+    geo_data = geo_data[["fid", "name", "geometry"]].to_crs(epsg=3857)
+
+    out_dir = source_dir(name)
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    tiles = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        # Detail finer than one tile unit is invisible at this zoom
+        level = simplify_geometry(geo_data, tile_size(zoom) / EXTENT)
+        xs, ys = tile_range(level.total_bounds, zoom)
+        for x in xs:
+            for y in ys:
+                data = cut_tile(level, name, zoom, x, y)
+                if not data:
+                    continue
+                tile_path = os.path.join(out_dir, str(zoom), str(x), f"{y}.pbf")
+                os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+                with open(tile_path, "wb") as file:
+                    file.write(data)
+                tiles += 1
+
+    metadata = {"etag": etag, "source": path, "source_sha1": digest, "minzoom": min_zoom,
+                "maxzoom": max_zoom, "bounds": lonlat_bounds, "features": len(geo_data), "tiles": tiles}
+    with open(os.path.join(out_dir, "metadata.json"), "w", encoding="utf-8") as file:
+        json.dump(metadata, file, indent=2)
+        file.write("\n")
+    return metadata
+
+
+# ---- Server ----
+
+_TILE_URL = re.compile(r"/tiles/(\w+)/(\d+)/(\d+)/(\d+)\.pbf")
+_VALUES_URL = re.compile(r"/values/(\w+)\.json")
+
+# (cube version, kpi) -> (etag, body)
+_values_cache = {}
+_values_lock = threading.Lock()
+
+
+def values_body(kpi):
+    """Returns (etag, JSON bytes) of a KPI's values for the regions layer, indexed by fid."""
+    from utils.animated_map import KPI_LABELS, kpi_payload
+    from utils.geometry import load_geometry
+    from utils.kpi_cube import cube_version, kpi_cube
+
+    if kpi not in KPI_LABELS:
+        raise KeyError(kpi)
+    key = (cube_version(), kpi)
+    with _values_lock:
+        entry = _values_cache.get(key)
+        if entry is None:
+            # fid is the row of the GeoJSON file, the order load_geometry keeps
+            names = list(load_geometry(0.0, SOURCES["regions"])["name"])
+            body = json.dumps(kpi_payload(kpi_cube(), names, kpi), separators=(",", ":")).encode("utf-8")
+            entry = _values_cache[key] = (hashlib.sha1(body).hexdigest()[:16], body)
+        return entry
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/":
+            self._viewer()
+            return
+        match = _TILE_URL.fullmatch(path)
+        if match:
+            self._tile(match.group(1), *(int(v) for v in match.groups()[1:]))
+            return
+        match = _VALUES_URL.fullmatch(path)
+        if match:
+            self._values(match.group(1))
+            return
+        self.send_error(404)
+
+    def _tile(self, source, zoom, x, y):
+        metadata = load_metadata(source) if source in SOURCES else None
+        if metadata is None or not metadata["minzoom"] <= zoom <= metadata["maxzoom"]:
+            self.send_error(404)
+            return
+        tile_path = os.path.join(source_dir(source), str(zoom), str(x), f"{y}.pbf")
+        # Tiles only change when the set is rebuilt, so one tag covers all of them
+        etag = f'"{metadata["etag"]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", etag=etag, cache_control=TILE_CACHE_CONTROL)
+            return
+        if not os.path.exists(tile_path):
+            # Inside the zoom range but nothing to draw
+            self._send(204, b"", etag=etag, cache_control=TILE_CACHE_CONTROL)
+            return
+        with open(tile_path, "rb") as file:
+            data = file.read()
+        self._send(200, data, "application/vnd.mapbox-vector-tile", etag, TILE_CACHE_CONTROL)
+
+    def _values(self, kpi):
+        try:
+            etag, body = values_body(kpi)
+        except KeyError:
+            self.send_error(404)
+            return
+        etag = f'"{etag}"'
+        # Values follow the data, so clients revalidate (a cheap 304) on every use
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", etag=etag, cache_control="no-cache")
+            return
+        self._send(200, body, "application/json", etag, "no-cache")
+
+    def _viewer(self):
+        from utils.animated_map import COLORS, KPI_LABELS
+
+        metadata = load_metadata("regions")
+        html = (_VIEWER
+                .replace("__METADATA__", json.dumps(metadata))
+                .replace("__KPIS__", json.dumps(KPI_LABELS))
+                .replace("__COLORS__", json.dumps(COLORS))
+                .replace("__GRADIENT__", ", ".join(COLORS)))
+        self._send(200, html.encode("utf-8"), "text/html; charset=utf-8", cache_control="no-cache")
+
+    def _send(self, status, body, content_type=None, etag=None, cache_control=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+        if cache_control:
+            self.send_header("Cache-Control", cache_control)
+        # The viewer may be embedded in pages served from another port
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765, host="127.0.0.1"):
+    """Builds any missing tile sets, then serves tiles, values and the viewer until interrupted."""
+    for name in SOURCES:
+        if load_metadata(name) is None:
+            build_source(name)
+    server = ThreadingHTTPServer((host, port), TileHandler)
+    print(f"Serving vector tiles on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+_VIEWER = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8"/>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.7.1/dist/leaflet.css"/>
+<script src="https://unpkg.com/leaflet@1.7.1/dist/leaflet.js"></script>
+<script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>
+<style>
+  body { margin: 0; font-family: Arial, sans-serif; }
+  #map { position: absolute; top: 40px; bottom: 0; width: 100%; }
+  .controls { font-size: 13px; padding: 8px; display: flex; gap: 10px; align-items: center; }
+  .controls input[type=range] { flex: 1; }
+  .legend { background: white; padding: 5px 8px; border-radius: 3px; font: 12px Arial, sans-serif; }
+  .legend .bar { width: 160px; height: 10px; background: linear-gradient(to right, __GRADIENT__); }
+</style>
+</head>
+<body>
+<div class="controls">
+  <select id="kpi"></select>
+  <input id="year" type="range" min="0" step="1" value="0"/>
+  <b id="year-label"></b>
+</div>
+<div id="map"></div>
+<script>
+const metadata = __METADATA__;
+const kpiLabels = __KPIS__;
+const rgb = __COLORS__.map(hex => [1, 3, 5].map(i => parseInt(hex.slice(i, i + 2), 16)));
+
+// KPI -> {years, values[year][fid], min, max}, fetched once per KPI
+const payloads = {};
+const kpiSelect = document.getElementById("kpi");
+const slider = document.getElementById("year");
+for (const [key, label] of Object.entries(kpiLabels)) {
+  kpiSelect.add(new Option(label, key, false, key === "offences"));
+}
+
+function colorFor(value, vmin, vmax) {
+  const t = vmax > vmin ? (value - vmin) / (vmax - vmin) * (rgb.length - 1) : 0;
+  const i = Math.min(Math.floor(t), rgb.length - 2);
+  const c = rgb[i].map((v, k) => Math.round(v + (rgb[i + 1][k] - v) * (t - i)));
+  return `rgb(${c[0]},${c[1]},${c[2]})`;
+}
+
+function current() {
+  const kpi = payloads[kpiSelect.value];
+  return kpi && {kpi, values: kpi.values[Math.min(+slider.value, kpi.years.length - 1)]};
+}
+
+function styleFor(fid) {
+  const state = current();
+  const value = state ? state.values[fid] : null;
+  return {fill: true, fillOpacity: value === null || value === undefined ? 0 : 0.6,
+          fillColor: value === null || value === undefined ? "transparent" : colorFor(value, state.kpi.min, state.kpi.max),
+          color: "black", weight: 1};
+}
+
+const [west, south, east, north] = metadata.bounds;
+const map = L.map("map", {minZoom: metadata.minzoom}).fitBounds([[south, west], [north, east]]);
+L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
+  attribution: "&copy; OpenStreetMap contributors"
+}).addTo(map);
+
+// Geometry comes from the tiles; colours are joined by fid in the browser
+const tiles = L.vectorGrid.protobuf("tiles/regions/{z}/{x}/{y}.pbf", {
+  maxNativeZoom: metadata.maxzoom,
+  rendererFactory: L.canvas.tile,
+  interactive: true,
+  getFeatureId: feature => feature.properties.fid,
+  vectorTileLayerStyles: {regions: properties => styleFor(properties.fid)},
+}).addTo(map);
+
+tiles.on("mouseover", e => {
+  const state = current();
+  const value = state ? state.values[e.layer.properties.fid] : null;
+  L.popup({closeButton: false}).setLatLng(e.latlng)
+    .setContent(`${e.layer.properties.name}: ${value === null || value === undefined ? "n/a" : value.toLocaleString()}`)
+    .openOn(map);
+});
+
+const legend = L.control({position: "bottomright"});
+legend.onAdd = () => L.DomUtil.create("div", "legend");
+legend.addTo(map);
+
+async function render() {
+  const key = kpiSelect.value;
+  if (!payloads[key]) {
+    payloads[key] = await (await fetch(`values/${key}.json`)).json();
+  }
+  const kpi = payloads[key];
+  slider.max = kpi.years.length - 1;
+  document.getElementById("year-label").textContent = kpi.years[Math.min(+slider.value, kpi.years.length - 1)];
+  // Restyle in place: no tile is requested again
+  for (let fid = 0; fid < metadata.features; fid++) {
+    tiles.setFeatureStyle(fid, styleFor(fid));
+  }
+  legend.getContainer().innerHTML =
+    `${kpi.label}<div class="bar"></div>${kpi.min.toLocaleString()} &ndash; ${kpi.max.toLocaleString()}`;
+}
+
+kpiSelect.onchange = render;
+slider.oninput = render;
+render();
+</script>
+</body>
+</html>
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and serve vector tiles of the map geometry.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="cut the geometry sources into tiles")
+    build.add_argument("sources", nargs="*", help="sources to build (default: all)")
+    build.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    build.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    build.add_argument("--force", action="store_true", help="rebuild even if the source is unchanged")
+    serve_parser = commands.add_parser("serve", help="serve tiles, KPI values and a viewer")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port, args.host)
+        return
+
+    unknown = set(args.sources) - set(SOURCES)
+    if unknown:
+        parser.error(f"unknown source(s): {', '.join(sorted(unknown))}")
+    for name in args.sources or SOURCES:
+        metadata = build_source(name, args.min_zoom, args.max_zoom, force=args.force)
+        print(f"{name}: {metadata['tiles']} tiles, zoom {metadata['minzoom']}-{metadata['maxzoom']}")
+
+
+if __name__ == "__main__":
+    main()